@@ -1,14 +1,16 @@
 use crate::closes::{
     calc_closes_long, calc_closes_short, calc_next_close_long, calc_next_close_short,
 };
+use crate::coin_major::CoinMajorHlcvs;
 use crate::constants::{CLOSE, HIGH, LONG, LOW, NO_POS, SHORT, VOLUME};
 use crate::entries::{
     calc_entries_long, calc_entries_short, calc_min_entry_qty, calc_next_entry_long,
     calc_next_entry_short,
 };
+use crate::forager::ForagerIndex;
 use crate::types::{
-    Analysis, BacktestParams, BotParams, BotParamsPair, EMABands, ExchangeParams, Fill, Order,
-    OrderBook, OrderType, Position, Positions, StateParams, TrailingPriceBundle,
+    Analysis, BacktestParams, BotParams, BotParamsPair, CoinSet, EMABands, ExchangeParams, Fill,
+    Order, OrderBook, OrderType, Position, Positions, StateParams, TrailingPriceBundle,
 };
 use crate::utils::{
     calc_auto_unstuck_allowance, calc_new_psize_pprice, calc_pnl_long, calc_pnl_short,
@@ -17,7 +19,10 @@ use crate::utils::{
 };
 use ndarray::{s, Array1, Array2, Array3, Array4, ArrayView3, Axis, Dim, ViewRepr};
 use std::cmp::Ordering;
-use std::collections::{HashMap, HashSet};
+use std::collections::HashMap;
+
+/// Minutes between checks of the early termination limits.
+const ABORT_CHECK_INTERVAL: usize = 60;
 
 #[derive(Clone, Default, Copy, Debug)]
 pub struct EmaAlphas {
@@ -31,48 +36,133 @@ pub struct Alphas {
     pub alphas_inv: [f64; 3],
 }
 
+/// EMAs of all coins, stored span by span: `long[z][idx]` is the long EMA of span `z` of coin
+/// `idx`. Each span is a contiguous vector, so a minute's update is one vectorisable loop per span.
 #[derive(Debug)]
 pub struct EMAs {
-    pub long: [f64; 3],
-    pub short: [f64; 3],
+    pub long: [Vec<f64>; 3],
+    pub short: [Vec<f64>; 3],
 }
 impl EMAs {
-    pub fn compute_bands(&self, pside: usize) -> EMABands {
-        let (upper, lower) = match pside {
-            LONG => (
-                *self
-                    .long
-                    .iter()
-                    .max_by(|a, b| a.partial_cmp(b).unwrap())
-                    .unwrap_or(&f64::MIN),
-                *self
-                    .long
-                    .iter()
-                    .min_by(|a, b| a.partial_cmp(b).unwrap())
-                    .unwrap_or(&f64::MAX),
-            ),
-            SHORT => (
-                *self
-                    .short
-                    .iter()
-                    .max_by(|a, b| a.partial_cmp(b).unwrap())
-                    .unwrap_or(&f64::MIN),
-                *self
-                    .short
-                    .iter()
-                    .min_by(|a, b| a.partial_cmp(b).unwrap())
-                    .unwrap_or(&f64::MAX),
-            ),
+    fn new(initial_closes: &[f64]) -> Self {
+        EMAs {
+            long: std::array::from_fn(|_| initial_closes.to_vec()),
+            short: std::array::from_fn(|_| initial_closes.to_vec()),
+        }
+    }
+
+    /// Folds one minute's close prices, one per coin, into every EMA.
+    #[inline]
+    fn update(&mut self, closes: &[f64], ema_alphas: &EmaAlphas) {
+        for z in 0..3 {
+            update_ema_span(
+                &mut self.long[z],
+                closes,
+                ema_alphas.long.alphas[z],
+                ema_alphas.long.alphas_inv[z],
+            );
+            update_ema_span(
+                &mut self.short[z],
+                closes,
+                ema_alphas.short.alphas[z],
+                ema_alphas.short.alphas_inv[z],
+            );
+        }
+    }
+
+    pub fn compute_bands(&self, idx: usize, pside: usize) -> EMABands {
+        let emas = match pside {
+            LONG => [self.long[0][idx], self.long[1][idx], self.long[2][idx]],
+            SHORT => [self.short[0][idx], self.short[1][idx], self.short[2][idx]],
             _ => panic!("Invalid pside"),
         };
+        let upper = *emas
+            .iter()
+            .max_by(|a, b| a.partial_cmp(b).unwrap())
+            .unwrap_or(&f64::MIN);
+        let lower = *emas
+            .iter()
+            .min_by(|a, b| a.partial_cmp(b).unwrap())
+            .unwrap_or(&f64::MAX);
         EMABands { upper, lower }
     }
 }
 
+/// `ema = close * alpha + ema * alpha_inv` over all coins. Written as a plain zip over two
+/// slices so the compiler vectorises it; the arithmetic is the same as one coin at a time.
+#[inline]
+fn update_ema_span(emas: &mut [f64], closes: &[f64], alpha: f64, alpha_inv: f64) {
+    for (ema, &close) in emas.iter_mut().zip(closes) {
+        *ema = close * alpha + *ema * alpha_inv;
+    }
+}
+
 #[derive(Debug, Default)]
 pub struct OpenOrdersNew {
-    pub long: HashMap<usize, OpenOrderBundleNew>,
-    pub short: HashMap<usize, OpenOrderBundleNew>,
+    pub long: SideOpenOrders,
+    pub short: SideOpenOrders,
+}
+
+/// Open orders for one side, one bundle per coin. A coin has orders iff it is in `keys`.
+/// Bundles of dropped coins are cleared in place so their buffers are reused.
+#[derive(Debug, Default)]
+pub struct SideOpenOrders {
+    bundles: Vec<OpenOrderBundleNew>,
+    keys: CoinSet,
+}
+
+impl SideOpenOrders {
+    fn new(n_coins: usize) -> Self {
+        SideOpenOrders {
+            bundles: (0..n_coins)
+                .map(|_| OpenOrderBundleNew::default())
+                .collect(),
+            keys: CoinSet::new(n_coins),
+        }
+    }
+
+    #[inline]
+    fn get(&self, idx: usize) -> Option<&OpenOrderBundleNew> {
+        if self.keys.contains(idx) {
+            Some(&self.bundles[idx])
+        } else {
+            None
+        }
+    }
+
+    #[inline]
+    fn get_mut(&mut self, idx: usize) -> Option<&mut OpenOrderBundleNew> {
+        if self.keys.contains(idx) {
+            Some(&mut self.bundles[idx])
+        } else {
+            None
+        }
+    }
+
+    /// Returns the orders for `idx`, adding an empty bundle if there is none.
+    #[inline]
+    fn entry(&mut self, idx: usize) -> &mut OpenOrderBundleNew {
+        self.keys.insert(idx);
+        &mut self.bundles[idx]
+    }
+
+    /// Drops the orders of every coin not in `actives`.
+    fn retain_in(&mut self, actives: &CoinSet) {
+        let bundles = &mut self.bundles;
+        self.keys.retain_in(actives, |idx| {
+            bundles[idx].entries.clear();
+            bundles[idx].closes.clear();
+        });
+    }
+}
+
+impl std::ops::Index<usize> for SideOpenOrders {
+    type Output = OpenOrderBundleNew;
+
+    #[inline]
+    fn index(&self, idx: usize) -> &OpenOrderBundleNew {
+        &self.bundles[idx]
+    }
 }
 
 #[derive(Debug, Default)]
@@ -81,22 +171,59 @@ pub struct OpenOrderBundleNew {
     pub closes: Vec<Order>,
 }
 
+impl OpenOrderBundleNew {
+    fn set_entry(&mut self, order: Order) {
+        self.entries.clear();
+        self.entries.push(order);
+    }
+
+    fn set_close(&mut self, order: Order) {
+        self.closes.clear();
+        self.closes.push(order);
+    }
+
+    /// Whether any order is a trailing or unstucking order, which are recalculated every minute.
+    fn has_trailing_or_unstuck(&self, pside: usize) -> bool {
+        match pside {
+            LONG => {
+                self.closes.iter().any(|order| {
+                    order.order_type == OrderType::CloseUnstuckLong
+                        || order.order_type == OrderType::CloseTrailingLong
+                }) || self.entries.iter().any(|order| {
+                    order.order_type == OrderType::EntryTrailingNormalLong
+                        || order.order_type == OrderType::EntryTrailingCroppedLong
+                })
+            }
+            SHORT => {
+                self.closes.iter().any(|order| {
+                    order.order_type == OrderType::CloseUnstuckShort
+                        || order.order_type == OrderType::CloseTrailingShort
+                }) || self.entries.iter().any(|order| {
+                    order.order_type == OrderType::EntryTrailingNormalShort
+                        || order.order_type == OrderType::EntryTrailingCroppedShort
+                })
+            }
+            _ => panic!("Invalid pside"),
+        }
+    }
+}
+
 #[derive(Default, Debug)]
 pub struct Actives {
-    long: HashSet<usize>,
-    short: HashSet<usize>,
+    long: CoinSet,
+    short: CoinSet,
 }
 
 #[derive(Default, Debug)]
 pub struct IsStuck {
-    long: HashSet<usize>,
-    short: HashSet<usize>,
+    long: CoinSet,
+    short: CoinSet,
 }
 
 #[derive(Default, Debug)]
 pub struct TrailingPrices {
-    pub long: HashMap<usize, TrailingPriceBundle>,
-    pub short: HashMap<usize, TrailingPriceBundle>,
+    pub long: Vec<TrailingPriceBundle>,
+    pub short: Vec<TrailingPriceBundle>,
 }
 
 pub struct TrailingEnabled {
@@ -109,22 +236,22 @@ pub struct TradingEnabled {
     short: bool,
 }
 
-pub struct RollingVolumeSum {
-    long: Vec<f64>,
-    short: Vec<f64>,
-    prev_k_long: usize,
-    prev_k_short: usize,
-}
+/// Element types the engine reads HLCV data from. Values are widened to f64 on load, so a
+/// compact float32 array halves memory use without changing the engine's arithmetic.
+pub trait HlcvValue: Copy + Into<f64> + Send + Sync {}
+impl HlcvValue for f64 {}
+impl HlcvValue for f32 {}
 
-pub struct Backtest<'a> {
-    hlcvs: &'a ArrayView3<'a, f64>,
+pub struct Backtest<'a, T: HlcvValue = f64> {
+    hlcvs: &'a ArrayView3<'a, T>,
     bot_params_pair: BotParamsPair,
     exchange_params_list: Vec<ExchangeParams>,
     backtest_params: BacktestParams,
     balance: f64,
     n_coins: usize,
     ema_alphas: EmaAlphas,
-    emas: Vec<EMAs>,
+    emas: EMAs,
+    close_buffer: Vec<f64>,
     positions: Positions,
     open_orders: OpenOrdersNew,
     trailing_prices: TrailingPrices,
@@ -132,39 +259,41 @@ pub struct Backtest<'a> {
     pnl_cumsum_running: f64,
     pnl_cumsum_max: f64,
     fills: Vec<Fill>,
+    record_fills: bool,
     is_stuck: IsStuck,
     trading_enabled: TradingEnabled,
     trailing_enabled: TrailingEnabled,
     equities: Vec<f64>,
-    delist_timestamps: HashMap<usize, usize>,
-    did_fill_long: HashSet<usize>,
-    did_fill_short: HashSet<usize>,
+    record_equities: bool,
+    analysis_accumulator: AnalysisAccumulator,
+    delist_timestamps: Vec<Option<usize>>,
+    did_fill_long: CoinSet,
+    did_fill_short: CoinSet,
+    actives_without_pos: CoinSet,
     n_eligible_long: usize,
     n_eligible_short: usize,
-    rolling_volume_sum: RollingVolumeSum,
-    volume_indices_buffer: Option<Vec<(f64, usize)>>,
+    forager_index: Option<ForagerIndex<'a>>,
+    coin_major: Option<CoinMajorHlcvs<'a, T>>,
+    ranking_buffer: Vec<(f64, usize)>,
+    preferred_coins: Vec<usize>,
+    /// Turned off only by tests comparing `fast_forward` with the minute-by-minute updates.
+    fast_forward_enabled: bool,
 }
 
-impl<'a> Backtest<'a> {
+impl<'a, T: HlcvValue> Backtest<'a, T> {
     pub fn new(
-        hlcvs: &'a ArrayView3<'a, f64>,
+        hlcvs: &'a ArrayView3<'a, T>,
         bot_params_pair: BotParamsPair,
         exchange_params_list: Vec<ExchangeParams>,
         backtest_params: &BacktestParams,
     ) -> Self {
         let n_timesteps = hlcvs.shape()[0];
         let n_coins = hlcvs.shape()[1];
-        let initial_emas = (0..n_coins)
-            .map(|i| {
-                let close_price = hlcvs[[0, i, CLOSE]];
-                EMAs {
-                    long: [close_price; 3],
-                    short: [close_price; 3],
-                }
-            })
-            .collect();
+        let initial_closes: Vec<f64> = (0..n_coins).map(|i| hlcvs[[0, i, CLOSE]].into()).collect();
         let mut equities = Vec::<f64>::new();
         equities.push(backtest_params.starting_balance);
+        let mut analysis_accumulator = AnalysisAccumulator::new(n_timesteps.saturating_sub(1));
+        analysis_accumulator.add_equity(backtest_params.starting_balance);
         let mut bot_params_pair_cloned = bot_params_pair.clone();
         bot_params_pair_cloned.long.n_positions = n_coins.min(bot_params_pair.long.n_positions);
         bot_params_pair_cloned.short.n_positions = n_coins.min(bot_params_pair.short.n_positions);
@@ -184,15 +313,33 @@ impl<'a> Backtest<'a> {
             balance: backtest_params.starting_balance,
             n_coins,
             ema_alphas: calc_ema_alphas(&bot_params_pair),
-            emas: initial_emas,
-            positions: Positions::default(),
-            open_orders: OpenOrdersNew::default(),
-            trailing_prices: TrailingPrices::default(),
-            actives: Actives::default(),
+            emas: EMAs::new(&initial_closes),
+            close_buffer: initial_closes,
+            positions: Positions::new(n_coins),
+            open_orders: OpenOrdersNew {
+                long: SideOpenOrders::new(n_coins),
+                short: SideOpenOrders::new(n_coins),
+            },
+            trailing_prices: TrailingPrices {
+                long: (0..n_coins)
+                    .map(|_| TrailingPriceBundle::default())
+                    .collect(),
+                short: (0..n_coins)
+                    .map(|_| TrailingPriceBundle::default())
+                    .collect(),
+            },
+            actives: Actives {
+                long: CoinSet::new(n_coins),
+                short: CoinSet::new(n_coins),
+            },
             pnl_cumsum_running: 0.0,
             pnl_cumsum_max: 0.0,
             fills: Vec::new(),
-            is_stuck: IsStuck::default(),
+            record_fills: true,
+            is_stuck: IsStuck {
+                long: CoinSet::new(n_coins),
+                short: CoinSet::new(n_coins),
+            },
             trading_enabled: TradingEnabled {
                 long: bot_params_pair.long.wallet_exposure_limit != 0.0
                     && bot_params_pair.long.n_positions > 0,
@@ -206,165 +353,276 @@ impl<'a> Backtest<'a> {
                     || bot_params_pair.short.entry_trailing_grid_ratio != 0.0,
             },
             equities: equities,
-            delist_timestamps: HashMap::new(),
-            did_fill_long: HashSet::new(),
-            did_fill_short: HashSet::new(),
+            record_equities: true,
+            analysis_accumulator,
+            delist_timestamps: vec![None; n_coins],
+            did_fill_long: CoinSet::new(n_coins),
+            did_fill_short: CoinSet::new(n_coins),
+            actives_without_pos: CoinSet::new(n_coins),
             n_eligible_long,
             n_eligible_short,
-            rolling_volume_sum: RollingVolumeSum {
-                long: vec![0.0; n_coins],
-                short: vec![0.0; n_coins],
-                prev_k_long: 0,
-                prev_k_short: 0,
-            },
-            volume_indices_buffer: Some(vec![(0.0, 0); n_coins]), // Initialize here
+            forager_index: None,
+            coin_major: None,
+            ranking_buffer: Vec::with_capacity(n_coins),
+            preferred_coins: Vec::with_capacity(n_coins),
+            fast_forward_enabled: true,
         }
     }
 
-    pub fn calc_preferred_coins(&mut self, k: usize, pside: usize) -> Vec<usize> {
-        let (bot_params, n_positions) = match pside {
+    /// Ranks coins for `pside` by noisiness over the last `filter_rolling_window` minutes,
+    /// among the `n_eligible` coins with the highest volume over the same window.
+    /// The ranking is left in `self.preferred_coins`, noisiest first.
+    fn calc_preferred_coins(&mut self, k: usize, pside: usize) {
+        let (window, n_positions, n_eligible) = match pside {
             LONG => (
-                &self.bot_params_pair.long,
+                self.bot_params_pair.long.filter_rolling_window,
                 self.bot_params_pair.long.n_positions,
+                self.n_eligible_long,
             ),
             SHORT => (
-                &self.bot_params_pair.short,
+                self.bot_params_pair.short.filter_rolling_window,
                 self.bot_params_pair.short.n_positions,
+                self.n_eligible_short,
             ),
             _ => panic!("Invalid pside"),
         };
+        self.preferred_coins.clear();
 
         // Early return if all coins are already eligible
         if self.n_coins <= n_positions {
-            return (0..self.n_coins).collect();
+            self.preferred_coins.extend(0..self.n_coins);
+            return;
         }
 
-        let n_eligible = match pside {
-            LONG => self.n_eligible_long,
-            SHORT => self.n_eligible_short,
-            _ => panic!("Invalid pside"),
-        };
-
-        let window = bot_params.filter_rolling_window;
+        // Window sums are lookups in the prefix sums, built on first use unless shared
+        let hlcvs = self.hlcvs;
+        let forager_index = self
+            .forager_index
+            .get_or_insert_with(|| ForagerIndex::from_hlcvs(hlcvs));
         let start_k = k.saturating_sub(window);
+        let ranking = &mut self.ranking_buffer;
+        ranking.clear();
+        ranking
+            .extend((0..self.n_coins).map(|idx| (forager_index.volume_sum(idx, start_k, k), idx)));
 
-        let (rolling_volume_sum, prev_k) = match pside {
-            LONG => (
-                &mut self.rolling_volume_sum.long,
-                &mut self.rolling_volume_sum.prev_k_long,
-            ),
-            SHORT => (
-                &mut self.rolling_volume_sum.short,
-                &mut self.rolling_volume_sum.prev_k_short,
-            ),
-            _ => panic!("Invalid pside"),
-        };
+        // Keep the top n_eligible coins by volume, in descending order
+        let actual_n_eligible = n_eligible.min(self.n_coins);
+        if actual_n_eligible < ranking.len() {
+            ranking.select_nth_unstable_by(actual_n_eligible, |a, b| {
+                b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal)
+            });
+            ranking.truncate(actual_n_eligible);
+        }
 
-        // Use the pre-allocated buffer for volume indices
-        let volume_indices = self.volume_indices_buffer.as_mut().unwrap();
-
-        // Update rolling volume sums
-        if k > window && k - *prev_k < window {
-            // Rolling calculation
-            let safe_start = (*prev_k).saturating_sub(window);
-            for idx in 0..self.n_coins {
-                rolling_volume_sum[idx] -=
-                    self.hlcvs.slice(s![safe_start..start_k, idx, VOLUME]).sum();
-                rolling_volume_sum[idx] += self.hlcvs.slice(s![*prev_k..k, idx, VOLUME]).sum();
-                volume_indices[idx] = (rolling_volume_sum[idx], idx);
-            }
-        } else {
-            // Full calculation
-            for idx in 0..self.n_coins {
-                rolling_volume_sum[idx] = self.hlcvs.slice(s![start_k..k, idx, VOLUME]).sum();
-                volume_indices[idx] = (rolling_volume_sum[idx], idx);
-            }
+        // Sort them by noisiness in descending order
+        for entry in ranking.iter_mut() {
+            entry.0 = forager_index.noisiness_sum(entry.1, start_k, k);
         }
-        *prev_k = k;
+        ranking.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+        self.preferred_coins
+            .extend(ranking.iter().map(|&(_, idx)| idx));
+    }
 
-        // Sort by volume in descending order
-        volume_indices.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+    /// Shares a prebuilt forager index instead of building one on first use.
+    pub fn set_forager_index(&mut self, forager_index: ForagerIndex<'a>) {
+        self.forager_index = Some(forager_index);
+    }
 
-        // Calculate noisiness for top n_eligible coins
-        let actual_n_eligible = n_eligible.min(self.n_coins);
-        let mut noisinesses = Vec::with_capacity(actual_n_eligible);
+    /// Reads time series of single coins from a coin-major copy of the HLCV data instead of
+    /// striding through the time-major array.
+    pub fn set_coin_major_hlcvs(&mut self, coin_major: CoinMajorHlcvs<'a, T>) {
+        self.coin_major = Some(coin_major);
+    }
 
-        for &(_, idx) in volume_indices.iter().take(actual_n_eligible) {
-            let noisiness: f64 = self
-                .hlcvs
-                .slice(s![start_k..k, idx, ..])
-                .axis_iter(Axis(0))
-                .map(|row| (row[HIGH] - row[LOW]) / row[CLOSE])
-                .sum();
-            noisinesses.push((noisiness, idx));
+    /// Controls whether fills and per-minute equities are kept for `run` to return.
+    /// The analysis is computed incrementally either way.
+    pub fn set_record_outputs(&mut self, record_fills: bool, record_equities: bool) {
+        self.record_fills = record_fills;
+        self.record_equities = record_equities;
+        if !record_fills {
+            self.fills = Vec::new();
+        }
+        if !record_equities {
+            self.equities = Vec::new();
         }
-
-        // Sort by noisiness in descending order
-        noisinesses.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
-
-        // Return indices sorted by noisiness
-        noisinesses.into_iter().map(|(_, idx)| idx).collect()
     }
-    pub fn run(&mut self) -> (Vec<Fill>, Vec<f64>) {
-        let check_points: Vec<usize> = (0..7).map(|i| i * 60 * 24).collect();
+
+    pub fn run(&mut self) -> (Vec<Fill>, Vec<f64>, Analysis) {
         let n_timesteps = self.hlcvs.shape()[0];
 
         for idx in 0..self.n_coins {
-            self.trailing_prices
-                .long
-                .insert(idx, TrailingPriceBundle::default());
-            self.trailing_prices
-                .short
-                .insert(idx, TrailingPriceBundle::default());
-
             // check if the coin was delisted at any point
-            if n_timesteps > *check_points.last().unwrap() {
-                let last_hlc_close = self.hlcvs[[n_timesteps - 1, idx, CLOSE]];
-                if check_points.iter().all(|&point| {
-                    self.hlcvs[[n_timesteps - 1 - point, idx, HIGH]] == last_hlc_close
-                        && self.hlcvs[[n_timesteps - 1 - point, idx, LOW]] == last_hlc_close
-                        && self.hlcvs[[n_timesteps - 1 - point, idx, CLOSE]] == last_hlc_close
-                }) {
-                    // was delisted. Find timestamp of delisting
-                    let mut i = n_timesteps - check_points.last().unwrap();
-                    while i > 0
-                        && self.hlcvs[[i, idx, HIGH]] == last_hlc_close
-                        && self.hlcvs[[i, idx, LOW]] == last_hlc_close
-                        && self.hlcvs[[i, idx, CLOSE]] == last_hlc_close
-                    {
-                        i -= 1;
-                    }
-                    if i > 1 {
-                        self.delist_timestamps.insert(idx, i);
-                    }
-                }
-            }
+            let delist_timestamp = match self.coin_major {
+                Some(coin_major) => find_delist_timestamp(n_timesteps, |k, field| {
+                    coin_major.series(idx, field)[k].into()
+                }),
+                None => find_delist_timestamp(n_timesteps, |k, field| self.hlcv(k, idx, field)),
+            };
+            self.delist_timestamps[idx] = delist_timestamp;
         }
-        for k in 1..(n_timesteps - 1) {
+        let last_k = n_timesteps - 1;
+        let mut k = 1;
+        let mut next_abort_check = ABORT_CHECK_INTERVAL;
+        let mut truncated = false;
+        while k < last_k {
             self.check_for_fills(k);
             self.update_emas(k);
             self.update_open_orders(k);
             self.update_equities(k);
+            k += 1;
+            if self.fast_forward_enabled && self.open_orders_are_static() {
+                k = self.fast_forward(k, last_k);
+            }
+            if k >= next_abort_check {
+                if self.exceeds_abort_limits() {
+                    truncated = true;
+                    break;
+                }
+                next_abort_check = k + ABORT_CHECK_INTERVAL;
+            }
+        }
+        let mut analysis = self.analysis_accumulator.finish();
+        analysis.truncated = truncated;
+        (
+            std::mem::take(&mut self.fills),
+            std::mem::take(&mut self.equities),
+            analysis,
+        )
+    }
+
+    /// Whether the backtest so far exceeds any of the early termination limits in
+    /// `backtest_params`, meaning that it would be scored as a failure if run to the end.
+    fn exceeds_abort_limits(&mut self) -> bool {
+        let params = &self.backtest_params;
+        let accumulator = &mut self.analysis_accumulator;
+        accumulator.equity_balance_diff_neg_max() > params.abort_equity_balance_diff_neg_max
+            || accumulator.position_held_hours_max() > params.abort_position_held_hours_max
+            || accumulator.drawdown_worst() > params.abort_drawdown_worst
+    }
+
+    /// Whether minutes without fills leave all open orders unchanged: each trading side has all
+    /// its position slots taken, so no forager reselection, and no trailing or unstucking orders,
+    /// and no position is stuck. Such minutes only move EMAs, trailing prices and equity.
+    fn open_orders_are_static(&self) -> bool {
+        if !self.is_stuck.long.is_empty() || !self.is_stuck.short.is_empty() {
+            return false;
+        }
+        let sides = [
+            (
+                LONG,
+                self.trading_enabled.long,
+                self.positions.long.len() >= self.bot_params_pair.long.n_positions,
+                &self.open_orders.long,
+            ),
+            (
+                SHORT,
+                self.trading_enabled.short,
+                self.positions.short.len() >= self.bot_params_pair.short.n_positions,
+                &self.open_orders.short,
+            ),
+        ];
+        sides
+            .iter()
+            .all(|&(pside, trading_enabled, slots_full, open_orders)| {
+                !trading_enabled
+                    || (slots_full
+                        && !open_orders
+                            .keys
+                            .iter()
+                            .any(|idx| open_orders[idx].has_trailing_or_unstuck(pside)))
+            })
+    }
+
+    /// First minute in `k..end` at which any open order fills, or `end` if none does.
+    fn find_next_fill(&self, k: usize, end: usize) -> usize {
+        let mut next_fill = end;
+        let sides = [
+            (self.trading_enabled.long, &self.open_orders.long),
+            (self.trading_enabled.short, &self.open_orders.short),
+        ];
+        for &(trading_enabled, open_orders) in sides.iter() {
+            if !trading_enabled {
+                continue;
+            }
+            for idx in open_orders.keys.iter() {
+                let orders = &open_orders[idx];
+                for order in orders.entries.iter().chain(orders.closes.iter()) {
+                    if order.qty == 0.0 {
+                        continue;
+                    }
+                    next_fill = self.find_fill(idx, order, k, next_fill);
+                }
+            }
+        }
+        next_fill
+    }
+
+    /// First minute in `start..end` at which `order` of coin `idx` fills, or `end` if none.
+    fn find_fill(&self, idx: usize, order: &Order, start: usize, end: usize) -> usize {
+        if let Some(coin_major) = self.coin_major {
+            let fill_offset = if order.qty > 0.0 {
+                coin_major.series(idx, LOW)[start..end]
+                    .iter()
+                    .position(|&low| Into::<f64>::into(low) < order.price)
+            } else {
+                coin_major.series(idx, HIGH)[start..end]
+                    .iter()
+                    .position(|&high| Into::<f64>::into(high) > order.price)
+            };
+            return fill_offset.map_or(end, |offset| start + offset);
+        }
+        let mut k = start;
+        while k < end && !self.order_filled(k, idx, order) {
+            k += 1;
+        }
+        k
+    }
+
+    /// With static open orders (see `open_orders_are_static`), advances through the minutes from
+    /// `k` up to the next fill, doing only what `check_for_fills`, `update_emas`,
+    /// `update_open_orders` and `update_equities` would do on minutes without fills.
+    /// Returns the minute to resume the full per-minute update at.
+    fn fast_forward(&mut self, k: usize, end: usize) -> usize {
+        let next_fill = self.find_next_fill(k, end);
+        if next_fill == k {
+            return k;
+        }
+        self.did_fill_long.clear();
+        self.did_fill_short.clear();
+        for j in k..next_fill {
+            self.update_emas(j);
+            if self.trading_enabled.long && self.trailing_enabled.long {
+                self.update_trailing_prices_long(j);
+            }
+            if self.trading_enabled.short && self.trailing_enabled.short {
+                self.update_trailing_prices_short(j);
+            }
+            self.update_equities(j);
         }
-        (self.fills.clone(), self.equities.clone())
+        next_fill
+    }
+
+    #[inline(always)]
+    fn hlcv(&self, k: usize, idx: usize, field: usize) -> f64 {
+        self.hlcvs[[k, idx, field]].into()
     }
 
     fn create_state_params(&self, k: usize, idx: usize, pside: usize) -> StateParams {
-        let close_price = self.hlcvs[[k, idx, CLOSE]];
+        let close_price = self.hlcv(k, idx, CLOSE);
         StateParams {
             balance: self.balance,
             order_book: OrderBook {
                 bid: close_price,
                 ask: close_price,
             },
-            ema_bands: self.emas[idx].compute_bands(pside),
+            ema_bands: self.emas.compute_bands(idx, pside),
         }
     }
 
     fn get_position(&self, idx: usize, pside: usize) -> Position {
         match pside {
-            LONG => self.positions.long.get(&idx).cloned().unwrap_or_default(),
-            SHORT => self.positions.short.get(&idx).cloned().unwrap_or_default(),
+            LONG => self.positions.long.get(idx).cloned().unwrap_or_default(),
+            SHORT => self.positions.short.get(idx).cloned().unwrap_or_default(),
             _ => panic!("Invalid pside"),
         }
     }
@@ -372,13 +630,10 @@ impl<'a> Backtest<'a> {
     fn update_equities(&mut self, k: usize) {
         let mut equity = self.balance;
 
-        // Sort long keys
-        let mut long_keys: Vec<usize> = self.positions.long.keys().cloned().collect();
-        long_keys.sort();
-        // Calculate unrealized PnL for each long position in sorted order
-        for idx in long_keys {
-            let position = &self.positions.long[&idx];
-            let current_price = self.hlcvs[[k, idx, CLOSE]];
+        // Calculate unrealized PnL for each long position in ascending index order
+        for idx in self.positions.long.keys().iter() {
+            let position = &self.positions.long[idx];
+            let current_price = self.hlcv(k, idx, CLOSE);
             let upnl = calc_pnl_long(
                 position.price,
                 current_price,
@@ -388,13 +643,10 @@ impl<'a> Backtest<'a> {
             equity += upnl;
         }
 
-        // Sort short keys
-        let mut short_keys: Vec<usize> = self.positions.short.keys().cloned().collect();
-        short_keys.sort();
-        // Calculate unrealized PnL for each short position in sorted order
-        for idx in short_keys {
-            let position = &self.positions.short[&idx];
-            let current_price = self.hlcvs[[k, idx, CLOSE]];
+        // Calculate unrealized PnL for each short position in ascending index order
+        for idx in self.positions.short.keys().iter() {
+            let position = &self.positions.short[idx];
+            let current_price = self.hlcv(k, idx, CLOSE);
             let upnl = calc_pnl_short(
                 position.price,
                 current_price,
@@ -404,82 +656,108 @@ impl<'a> Backtest<'a> {
             equity += upnl;
         }
 
-        self.equities.push(equity);
+        self.analysis_accumulator.add_equity(equity);
+        if self.record_equities {
+            self.equities.push(equity);
+        }
+    }
+
+    fn record_fill(
+        &mut self,
+        k: usize,
+        idx: usize,
+        pnl: f64,
+        fee_paid: f64,
+        fill_qty: f64,
+        fill_price: f64,
+        position_size: f64,
+        position_price: f64,
+        order_type: OrderType,
+    ) {
+        self.analysis_accumulator
+            .add_fill(k, idx, pnl, self.balance, position_size, &order_type);
+        if self.record_fills {
+            self.fills.push(Fill {
+                index: k,                                      // index minute
+                coin: self.backtest_params.coins[idx].clone(), // coin
+                pnl,                                           // realized pnl
+                fee_paid,                                      // fee paid
+                balance: self.balance,                         // balance after fill
+                fill_qty,                                      // fill qty
+                fill_price,                                    // fill price
+                position_size,                                 // psize after fill
+                position_price,                                // pprice after fill
+                order_type,                                    // fill type
+            });
+        }
     }
 
-    fn update_actives(&mut self, k: usize, pside: usize) -> Vec<usize> {
-        // Calculate all the information we need before borrowing
-        let (positions, n_positions) = match pside {
-            LONG => (&self.positions.long, self.bot_params_pair.long.n_positions),
+    /// Recomputes the active coins for `pside`; coins that became active without a
+    /// position are left in `self.actives_without_pos`.
+    fn update_actives(&mut self, k: usize, pside: usize) {
+        let (n_current_positions, n_positions) = match pside {
+            LONG => (
+                self.positions.long.len(),
+                self.bot_params_pair.long.n_positions,
+            ),
             SHORT => (
-                &self.positions.short,
+                self.positions.short.len(),
                 self.bot_params_pair.short.n_positions,
             ),
             _ => panic!("Invalid pside"),
         };
-
-        // Sort positions to ensure stable iteration
-        let mut current_positions: Vec<usize> = positions.keys().cloned().collect();
-        current_positions.sort();
-        let mut preferred_coins = Vec::new();
-
         // Only calculate preferred coins if there are open slots
-        if current_positions.len() < n_positions {
-            preferred_coins = self.calc_preferred_coins(k, pside);
+        if n_current_positions < n_positions {
+            self.calc_preferred_coins(k, pside);
+        } else {
+            self.preferred_coins.clear();
         }
 
-        // Now we can mutably borrow self.actives
-        let actives = match pside {
-            LONG => &mut self.actives.long,
-            SHORT => &mut self.actives.short,
+        let (actives, positions) = match pside {
+            LONG => (&mut self.actives.long, &self.positions.long),
+            SHORT => (&mut self.actives.short, &self.positions.short),
             _ => unreachable!(),
         };
 
-        actives.clear();
+        // Start from all markets with existing positions
+        actives.copy_from(positions.keys());
 
-        // Add all markets with existing positions
-        for &market_idx in &current_positions {
-            actives.insert(market_idx);
-        }
-
-        let mut actives_without_pos = Vec::new();
+        let actives_without_pos = &mut self.actives_without_pos;
+        actives_without_pos.clear();
 
         // Add additional markets based on preferred_coins
-        for &market_idx in &preferred_coins {
+        for &market_idx in &self.preferred_coins {
             if actives.len() < n_positions {
                 if actives.insert(market_idx) {
-                    actives_without_pos.push(market_idx);
+                    actives_without_pos.insert(market_idx);
                 }
             } else {
                 break;
             }
         }
-
-        actives_without_pos
     }
 
     fn check_for_fills(&mut self, k: usize) {
         self.did_fill_long.clear();
         self.did_fill_short.clear();
         if self.trading_enabled.long {
-            let mut open_orders_keys_long: Vec<usize> =
-                self.open_orders.long.keys().cloned().collect();
-            open_orders_keys_long.sort();
-            for idx in open_orders_keys_long {
+            let mut cursor = self.open_orders.long.keys.next_from(0);
+            while let Some(idx) = cursor {
+                cursor = self.open_orders.long.keys.next_from(idx + 1);
                 // Process close fills long
-                if !self.open_orders.long[&idx].closes.is_empty() {
+                if !self.open_orders.long[idx].closes.is_empty() {
                     let mut closes_to_process = Vec::new();
                     {
-                        for close_order in &self.open_orders.long[&idx].closes {
+                        for close_order in &self.open_orders.long[idx].closes {
                             if self.order_filled(k, idx, close_order) {
                                 closes_to_process.push(close_order.clone());
                             }
                         }
                     }
                     for order in closes_to_process {
-                        //if order.qty != 0.0 && self.positions.long.contains_key(&idx) && self.positions.long.contains_key(&idx)
+                        //if order.qty != 0.0 && self.positions.long.contains_key(idx) && self.positions.long.contains_key(idx)
                         //if order.qty != 0.0 && self.get_position
-                        if self.positions.long.contains_key(&idx) {
+                        if self.positions.long.contains_key(idx) {
                             self.did_fill_long.insert(idx);
                             self.reset_trailing_prices(idx, LONG);
                             self.process_close_fill_long(k, idx, &order);
@@ -487,10 +765,10 @@ impl<'a> Backtest<'a> {
                     }
                 }
                 // Process entry fills long
-                if !self.open_orders.long[&idx].entries.is_empty() {
+                if !self.open_orders.long[idx].entries.is_empty() {
                     let mut entries_to_process = Vec::new();
                     {
-                        for entry_order in &self.open_orders.long[&idx].entries {
+                        for entry_order in &self.open_orders.long[idx].entries {
                             if self.order_filled(k, idx, entry_order) {
                                 entries_to_process.push(entry_order.clone());
                             }
@@ -505,22 +783,21 @@ impl<'a> Backtest<'a> {
             }
         }
         if self.trading_enabled.short {
-            let mut open_orders_keys_short: Vec<usize> =
-                self.open_orders.short.keys().cloned().collect();
-            open_orders_keys_short.sort();
-            for idx in open_orders_keys_short {
+            let mut cursor = self.open_orders.short.keys.next_from(0);
+            while let Some(idx) = cursor {
+                cursor = self.open_orders.short.keys.next_from(idx + 1);
                 // Process close fills short
-                if !self.open_orders.short[&idx].closes.is_empty() {
+                if !self.open_orders.short[idx].closes.is_empty() {
                     let mut closes_to_process = Vec::new();
                     {
-                        for close_order in &self.open_orders.short[&idx].closes {
+                        for close_order in &self.open_orders.short[idx].closes {
                             if self.order_filled(k, idx, close_order) {
                                 closes_to_process.push(close_order.clone());
                             }
                         }
                     }
                     for order in closes_to_process {
-                        if self.positions.short.contains_key(&idx) {
+                        if self.positions.short.contains_key(idx) {
                             self.did_fill_short.insert(idx);
                             self.reset_trailing_prices(idx, SHORT);
                             self.process_close_fill_short(k, idx, &order);
@@ -528,10 +805,10 @@ impl<'a> Backtest<'a> {
                     }
                 }
                 // Process entry fills short
-                if !self.open_orders.short[&idx].entries.is_empty() {
+                if !self.open_orders.short[idx].entries.is_empty() {
                     let mut entries_to_process = Vec::new();
                     {
-                        for entry_order in &self.open_orders.short[&idx].entries {
+                        for entry_order in &self.open_orders.short[idx].entries {
                             if self.order_filled(k, idx, entry_order) {
                                 entries_to_process.push(entry_order.clone());
                             }
@@ -550,41 +827,41 @@ impl<'a> Backtest<'a> {
     fn update_stuck_status(&mut self, idx: usize, pside: usize) {
         match pside {
             LONG => {
-                if self.positions.long.contains_key(&idx) {
+                if self.positions.long.contains_key(idx) {
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance,
-                        self.positions.long[&idx].size,
-                        self.positions.long[&idx].price,
+                        self.positions.long[idx].size,
+                        self.positions.long[idx].price,
                     );
                     if wallet_exposure / self.bot_params_pair.long.wallet_exposure_limit
                         > self.bot_params_pair.long.unstuck_threshold
                     {
                         self.is_stuck.long.insert(idx);
                     } else {
-                        self.is_stuck.long.remove(&idx);
+                        self.is_stuck.long.remove(idx);
                     }
                 } else {
-                    self.is_stuck.long.remove(&idx);
+                    self.is_stuck.long.remove(idx);
                 }
             }
             SHORT => {
-                if self.positions.short.contains_key(&idx) {
+                if self.positions.short.contains_key(idx) {
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance,
-                        self.positions.short[&idx].size.abs(),
-                        self.positions.short[&idx].price,
+                        self.positions.short[idx].size.abs(),
+                        self.positions.short[idx].price,
                     );
                     if wallet_exposure / self.bot_params_pair.short.wallet_exposure_limit
                         > self.bot_params_pair.short.unstuck_threshold
                     {
                         self.is_stuck.short.insert(idx);
                     } else {
-                        self.is_stuck.short.remove(&idx);
+                        self.is_stuck.short.remove(idx);
                     }
                 } else {
-                    self.is_stuck.short.remove(&idx);
+                    self.is_stuck.short.remove(idx);
                 }
             }
             _ => panic!("Invalid pside in update_stuck_status"),
@@ -593,7 +870,7 @@ impl<'a> Backtest<'a> {
 
     fn process_close_fill_long(&mut self, k: usize, idx: usize, close_fill: &Order) {
         let mut new_psize = round_(
-            self.positions.long[&idx].size + close_fill.qty,
+            self.positions.long[idx].size + close_fill.qty,
             self.exchange_params_list[idx].qty_step,
         );
         let mut adjusted_close_qty = close_fill.qty;
@@ -603,7 +880,7 @@ impl<'a> Backtest<'a> {
             println!("new_psize: {}", new_psize);
             println!("close order: {:?}", close_fill);
             new_psize = 0.0;
-            adjusted_close_qty = -self.positions.long[&idx].size;
+            adjusted_close_qty = -self.positions.long[idx].size;
         }
         let fee_paid = -qty_to_cost(
             adjusted_close_qty,
@@ -611,7 +888,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         let pnl = calc_pnl_long(
-            self.positions.long[&idx].price,
+            self.positions.long[idx].price,
             close_fill.price,
             adjusted_close_qty,
             self.exchange_params_list[idx].c_mult,
@@ -620,29 +897,28 @@ impl<'a> Backtest<'a> {
         self.pnl_cumsum_max = self.pnl_cumsum_max.max(self.pnl_cumsum_running);
         self.balance += pnl + fee_paid;
 
-        let current_pprice = self.positions.long[&idx].price;
+        let current_pprice = self.positions.long[idx].price;
         if new_psize == 0.0 {
-            self.positions.long.remove(&idx);
+            self.positions.long.remove(idx);
         } else {
-            self.positions.long.get_mut(&idx).unwrap().size = new_psize;
-        }
-        self.fills.push(Fill {
-            index: k,                                      // index minute
-            coin: self.backtest_params.coins[idx].clone(), // coin
-            pnl,                                           // realized pnl
-            fee_paid,                                      // fee paid
-            balance: self.balance,                         // balance after fill
-            fill_qty: adjusted_close_qty,                  // fill qty
-            fill_price: close_fill.price,                  // fill price
-            position_size: new_psize,                      // psize after fill
-            position_price: current_pprice,                // pprice after fill
-            order_type: close_fill.order_type.clone(),     // fill type
-        });
+            self.positions.long[idx].size = new_psize;
+        }
+        self.record_fill(
+            k,
+            idx,
+            pnl,
+            fee_paid,
+            adjusted_close_qty,
+            close_fill.price,
+            new_psize,
+            current_pprice,
+            close_fill.order_type,
+        );
     }
 
     fn process_close_fill_short(&mut self, k: usize, idx: usize, order: &Order) {
         let mut new_psize = round_(
-            self.positions.short[&idx].size + order.qty,
+            self.positions.short[idx].size + order.qty,
             self.exchange_params_list[idx].qty_step,
         );
         let mut adjusted_close_qty = order.qty;
@@ -652,7 +928,7 @@ impl<'a> Backtest<'a> {
             println!("new_psize: {}", new_psize);
             println!("close order: {:?}", order);
             new_psize = 0.0;
-            adjusted_close_qty = self.positions.short[&idx].size.abs();
+            adjusted_close_qty = self.positions.short[idx].size.abs();
         }
         let fee_paid = -qty_to_cost(
             adjusted_close_qty,
@@ -660,7 +936,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         let pnl = calc_pnl_short(
-            self.positions.short[&idx].price,
+            self.positions.short[idx].price,
             order.price,
             adjusted_close_qty,
             self.exchange_params_list[idx].c_mult,
@@ -669,24 +945,23 @@ impl<'a> Backtest<'a> {
         self.pnl_cumsum_max = self.pnl_cumsum_max.max(self.pnl_cumsum_running);
         self.balance += pnl + fee_paid;
 
-        let current_pprice = self.positions.short[&idx].price;
+        let current_pprice = self.positions.short[idx].price;
         if new_psize == 0.0 {
-            self.positions.short.remove(&idx);
+            self.positions.short.remove(idx);
         } else {
-            self.positions.short.get_mut(&idx).unwrap().size = new_psize;
-        }
-        self.fills.push(Fill {
-            index: k,                                      // index minute
-            coin: self.backtest_params.coins[idx].clone(), // coin
-            pnl,                                           // realized pnl
-            fee_paid,                                      // fee paid
-            balance: self.balance,                         // balance after fill
-            fill_qty: adjusted_close_qty,                  // fill qty
-            fill_price: order.price,                       // fill price
-            position_size: new_psize,                      // psize after fill
-            position_price: current_pprice,                // pprice after fill
-            order_type: order.order_type.clone(),          // fill type
-        });
+            self.positions.short[idx].size = new_psize;
+        }
+        self.record_fill(
+            k,
+            idx,
+            pnl,
+            fee_paid,
+            adjusted_close_qty,
+            order.price,
+            new_psize,
+            current_pprice,
+            order.order_type,
+        );
     }
 
     fn process_entry_fill_long(&mut self, k: usize, idx: usize, order: &Order) {
@@ -697,11 +972,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         self.balance += fee_paid;
-        let position_entry = self
-            .positions
-            .long
-            .entry(idx)
-            .or_insert(Position::default());
+        let position_entry = self.positions.long.entry(idx);
         let (new_psize, new_pprice) = calc_new_psize_pprice(
             position_entry.size,
             position_entry.price,
@@ -709,20 +980,19 @@ impl<'a> Backtest<'a> {
             order.price,
             self.exchange_params_list[idx].qty_step,
         );
-        self.positions.long.get_mut(&idx).unwrap().size = new_psize;
-        self.positions.long.get_mut(&idx).unwrap().price = new_pprice;
-        self.fills.push(Fill {
-            index: k,                                        // index minute
-            coin: self.backtest_params.coins[idx].clone(),   // coin
-            pnl: 0.0,                                        // realized pnl
-            fee_paid,                                        // fee paid
-            balance: self.balance,                           // balance after fill
-            fill_qty: order.qty,                             // fill qty
-            fill_price: order.price,                         // fill price
-            position_size: self.positions.long[&idx].size,   // psize after fill
-            position_price: self.positions.long[&idx].price, // pprice after fill
-            order_type: order.order_type.clone(),            // fill type
-        });
+        self.positions.long[idx].size = new_psize;
+        self.positions.long[idx].price = new_pprice;
+        self.record_fill(
+            k,
+            idx,
+            0.0,
+            fee_paid,
+            order.qty,
+            order.price,
+            self.positions.long[idx].size,
+            self.positions.long[idx].price,
+            order.order_type,
+        );
     }
 
     fn process_entry_fill_short(&mut self, k: usize, idx: usize, order: &Order) {
@@ -733,11 +1003,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         self.balance += fee_paid;
-        let position_entry = self
-            .positions
-            .short
-            .entry(idx)
-            .or_insert(Position::default());
+        let position_entry = self.positions.short.entry(idx);
         let (new_psize, new_pprice) = calc_new_psize_pprice(
             position_entry.size,
             position_entry.price,
@@ -745,104 +1011,126 @@ impl<'a> Backtest<'a> {
             order.price,
             self.exchange_params_list[idx].qty_step,
         );
-        self.positions.short.get_mut(&idx).unwrap().size = new_psize;
-        self.positions.short.get_mut(&idx).unwrap().price = new_pprice;
-        self.fills.push(Fill {
-            index: k,                                         // index minute
-            coin: self.backtest_params.coins[idx].clone(),    // coin
-            pnl: 0.0,                                         // realized pnl
-            fee_paid,                                         // fee paid
-            balance: self.balance,                            // balance after fill
-            fill_qty: order.qty,                              // fill qty
-            fill_price: order.price,                          // fill price
-            position_size: self.positions.short[&idx].size,   // psize after fill
-            position_price: self.positions.short[&idx].price, // pprice after fill
-            order_type: order.order_type.clone(),             // fill type
-        });
+        self.positions.short[idx].size = new_psize;
+        self.positions.short[idx].price = new_pprice;
+        self.record_fill(
+            k,
+            idx,
+            0.0,
+            fee_paid,
+            order.qty,
+            order.price,
+            self.positions.short[idx].size,
+            self.positions.short[idx].price,
+            order.order_type,
+        );
     }
 
     fn calc_next_grid_entry_long(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, LONG);
         let binding = Position::default();
-        let position = self.positions.long.get(&idx).unwrap_or(&binding);
+        let position = self.positions.long.get(idx).unwrap_or(&binding);
         calc_next_entry_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         )
     }
 
     fn calc_next_grid_entry_short(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, SHORT);
         let binding = Position::default();
-        let position = self.positions.short.get(&idx).unwrap_or(&binding);
+        let position = self.positions.short.get(idx).unwrap_or(&binding);
         calc_next_entry_short(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.short,
             position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         )
     }
 
     fn calc_grid_close_long(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, LONG);
         let binding = Position::default();
-        let position = self.positions.long.get(&idx).unwrap_or(&binding);
+        let position = self.positions.long.get(idx).unwrap_or(&binding);
         calc_next_close_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             &position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         )
     }
 
     fn calc_grid_close_short(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, SHORT);
         let binding = Position::default();
-        let position = self.positions.short.get(&idx).unwrap_or(&binding);
+        let position = self.positions.short.get(idx).unwrap_or(&binding);
         calc_next_close_short(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.short,
             &position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         )
     }
 
     fn reset_trailing_prices(&mut self, idx: usize, pside: usize) {
         let trailing_price_bundle = if pside == LONG {
-            self.trailing_prices.long.entry(idx).or_default()
+            &mut self.trailing_prices.long[idx]
         } else {
-            self.trailing_prices.short.entry(idx).or_default()
+            &mut self.trailing_prices.short[idx]
         };
         *trailing_price_bundle = TrailingPriceBundle::default();
     }
 
     fn update_trailing_prices(&mut self, k: usize, idx: usize, pside: usize) {
+        let (high, low, close) = (
+            self.hlcv(k, idx, HIGH),
+            self.hlcv(k, idx, LOW),
+            self.hlcv(k, idx, CLOSE),
+        );
         let trailing_price_bundle = if pside == LONG {
-            self.trailing_prices.long.entry(idx).or_default()
+            &mut self.trailing_prices.long[idx]
         } else {
-            self.trailing_prices.short.entry(idx).or_default()
+            &mut self.trailing_prices.short[idx]
         };
-        if self.hlcvs[[k, idx, LOW]] < trailing_price_bundle.min_since_open {
-            trailing_price_bundle.min_since_open = self.hlcvs[[k, idx, LOW]];
-            trailing_price_bundle.max_since_min = self.hlcvs[[k, idx, CLOSE]];
+        if low < trailing_price_bundle.min_since_open {
+            trailing_price_bundle.min_since_open = low;
+            trailing_price_bundle.max_since_min = close;
         } else {
-            trailing_price_bundle.max_since_min = trailing_price_bundle
-                .max_since_min
-                .max(self.hlcvs[[k, idx, HIGH]]);
+            trailing_price_bundle.max_since_min = trailing_price_bundle.max_since_min.max(high);
         }
-        if self.hlcvs[[k, idx, HIGH]] > trailing_price_bundle.max_since_open {
-            trailing_price_bundle.max_since_open = self.hlcvs[[k, idx, HIGH]];
-            trailing_price_bundle.min_since_max = self.hlcvs[[k, idx, CLOSE]];
+        if high > trailing_price_bundle.max_since_open {
+            trailing_price_bundle.max_since_open = high;
+            trailing_price_bundle.min_since_max = close;
         } else {
-            trailing_price_bundle.min_since_max = trailing_price_bundle
-                .min_since_max
-                .min(self.hlcvs[[k, idx, LOW]]);
+            trailing_price_bundle.min_since_max = trailing_price_bundle.min_since_max.min(low);
+        }
+    }
+
+    /// Updates trailing prices of all long positions that did not fill this minute.
+    fn update_trailing_prices_long(&mut self, k: usize) {
+        let mut cursor = self.positions.long.keys().next_from(0);
+        while let Some(idx) = cursor {
+            cursor = self.positions.long.keys().next_from(idx + 1);
+            if !self.did_fill_long.contains(idx) {
+                self.update_trailing_prices(k, idx, LONG);
+            }
+        }
+    }
+
+    /// Updates trailing prices of all short positions that did not fill this minute.
+    fn update_trailing_prices_short(&mut self, k: usize) {
+        let mut cursor = self.positions.short.keys().next_from(0);
+        while let Some(idx) = cursor {
+            cursor = self.positions.short.keys().next_from(idx + 1);
+            if !self.did_fill_short.contains(idx) {
+                self.update_trailing_prices(k, idx, SHORT);
+            }
         }
     }
 
@@ -879,26 +1167,26 @@ impl<'a> Backtest<'a> {
         let position = self
             .positions
             .long
-            .get(&idx)
+            .get(idx)
             .cloned()
             .unwrap_or(Position::default());
 
         // check if coin is delisted; if so, close pos as unstuck close
-        if let Some(&delist_timestamp) = self.delist_timestamps.get(&idx) {
-            if k >= delist_timestamp && self.positions.long.contains_key(&idx) {
-                self.open_orders.long.get_mut(&idx).unwrap().closes = [Order {
-                    qty: -self.positions.long[&idx].size,
+        if let Some(delist_timestamp) = self.delist_timestamps[idx] {
+            if k >= delist_timestamp && self.positions.long.contains_key(idx) {
+                let delist_close = Order {
+                    qty: -self.positions.long[idx].size,
                     price: round_(
                         f64::min(
-                            self.hlcvs[[k, idx, HIGH]] - self.exchange_params_list[idx].price_step,
-                            self.positions.long[&idx].price,
+                            self.hlcv(k, idx, HIGH) - self.exchange_params_list[idx].price_step,
+                            self.positions.long[idx].price,
                         ),
                         self.exchange_params_list[idx].price_step,
                     ),
                     order_type: OrderType::CloseUnstuckLong,
-                }]
-                .to_vec();
-                self.open_orders.long.entry(idx).or_default().entries = Vec::new();
+                };
+                self.open_orders.long.entry(idx).set_close(delist_close);
+                self.open_orders.long.entry(idx).entries.clear();
                 return;
             }
         }
@@ -907,42 +1195,42 @@ impl<'a> Backtest<'a> {
             &state_params,
             &self.bot_params_pair.long,
             &position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_entry_order)
             && self.has_next_grid_order(&next_entry_order, LONG)
         {
-            self.open_orders.long.entry(idx).or_default().entries = calc_entries_long(
+            self.open_orders.long.entry(idx).entries = calc_entries_long(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.long,
                 &position,
-                &self.trailing_prices.long[&idx],
+                &self.trailing_prices.long[idx],
             );
         } else {
-            self.open_orders.long.entry(idx).or_default().entries = [next_entry_order].to_vec();
+            self.open_orders.long.entry(idx).set_entry(next_entry_order);
         }
         let next_close_order = calc_next_close_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             &position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_close_order)
             && self.has_next_grid_order(&next_close_order, LONG)
         {
-            self.open_orders.long.entry(idx).or_default().closes = calc_closes_long(
+            self.open_orders.long.entry(idx).closes = calc_closes_long(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.long,
                 &position,
-                &self.trailing_prices.long[&idx],
+                &self.trailing_prices.long[idx],
             );
         } else {
-            self.open_orders.long.entry(idx).or_default().closes = [next_close_order].to_vec();
+            self.open_orders.long.entry(idx).set_close(next_close_order);
         }
     }
 
@@ -951,26 +1239,26 @@ impl<'a> Backtest<'a> {
         let position = self
             .positions
             .short
-            .get(&idx)
+            .get(idx)
             .cloned()
             .unwrap_or(Position::default());
 
         // check if coin is delisted; if so, close pos as unstuck close
-        if let Some(&delist_timestamp) = self.delist_timestamps.get(&idx) {
-            if k >= delist_timestamp && self.positions.short.contains_key(&idx) {
-                self.open_orders.short.get_mut(&idx).unwrap().closes = [Order {
-                    qty: self.positions.short[&idx].size.abs(),
+        if let Some(delist_timestamp) = self.delist_timestamps[idx] {
+            if k >= delist_timestamp && self.positions.short.contains_key(idx) {
+                let delist_close = Order {
+                    qty: self.positions.short[idx].size.abs(),
                     price: round_(
                         f64::max(
-                            self.hlcvs[[k, idx, LOW]] + self.exchange_params_list[idx].price_step,
-                            self.positions.short[&idx].price,
+                            self.hlcv(k, idx, LOW) + self.exchange_params_list[idx].price_step,
+                            self.positions.short[idx].price,
                         ),
                         self.exchange_params_list[idx].price_step,
                     ),
                     order_type: OrderType::CloseUnstuckLong,
-                }]
-                .to_vec();
-                self.open_orders.short.entry(idx).or_default().entries = Vec::new();
+                };
+                self.open_orders.short.entry(idx).set_close(delist_close);
+                self.open_orders.short.entry(idx).entries.clear();
                 return;
             }
         }
@@ -979,21 +1267,24 @@ impl<'a> Backtest<'a> {
             &state_params,
             &self.bot_params_pair.short,
             &position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_entry_order)
             && self.has_next_grid_order(&next_entry_order, SHORT)
         {
-            self.open_orders.short.entry(idx).or_default().entries = calc_entries_short(
+            self.open_orders.short.entry(idx).entries = calc_entries_short(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.short,
                 &position,
-                &self.trailing_prices.short[&idx],
+                &self.trailing_prices.short[idx],
             );
         } else {
-            self.open_orders.short.entry(idx).or_default().entries = [next_entry_order].to_vec();
+            self.open_orders
+                .short
+                .entry(idx)
+                .set_entry(next_entry_order);
         }
 
         let next_close_order = calc_next_close_short(
@@ -1001,30 +1292,33 @@ impl<'a> Backtest<'a> {
             &state_params,
             &self.bot_params_pair.short,
             &position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_close_order)
             && self.has_next_grid_order(&next_close_order, SHORT)
         {
-            self.open_orders.short.entry(idx).or_default().closes = calc_closes_short(
+            self.open_orders.short.entry(idx).closes = calc_closes_short(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.short,
                 &position,
-                &self.trailing_prices.short[&idx],
+                &self.trailing_prices.short[idx],
             );
         } else {
-            self.open_orders.short.entry(idx).or_default().closes = [next_close_order].to_vec()
+            self.open_orders
+                .short
+                .entry(idx)
+                .set_close(next_close_order);
         }
     }
 
     fn order_filled(&self, k: usize, idx: usize, order: &Order) -> bool {
         // check if will fill in next candle
         if order.qty > 0.0 {
-            self.hlcvs[[k, idx, LOW]] < order.price
+            self.hlcv(k, idx, LOW) < order.price
         } else if order.qty < 0.0 {
-            self.hlcvs[[k, idx, HIGH]] > order.price
+            self.hlcv(k, idx, HIGH) > order.price
         } else {
             false
         }
@@ -1043,12 +1337,9 @@ impl<'a> Backtest<'a> {
                 self.pnl_cumsum_running,
             );
             if unstuck_allowances.0 > 0.0 {
-                // Check long positions
-                // Sort the keys for long
-                let mut long_keys: Vec<usize> = self.positions.long.keys().cloned().collect();
-                long_keys.sort();
-                for idx in long_keys {
-                    let position = &self.positions.long[&idx];
+                // Check long positions in ascending index order
+                for idx in self.positions.long.keys().iter() {
+                    let position = &self.positions.long[idx];
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance,
@@ -1059,7 +1350,7 @@ impl<'a> Backtest<'a> {
                         > self.bot_params_pair.long.unstuck_threshold
                     {
                         let pprice_diff =
-                            calc_pprice_diff_int(LONG, position.price, self.hlcvs[[k, idx, CLOSE]]);
+                            calc_pprice_diff_int(LONG, position.price, self.hlcv(k, idx, CLOSE));
                         stuck_positions.push((idx, LONG, pprice_diff));
                     }
                 }
@@ -1075,13 +1366,9 @@ impl<'a> Backtest<'a> {
                 self.pnl_cumsum_running,
             );
             if unstuck_allowances.1 > 0.0 {
-                // Check short positions
-                // Sort the keys for short
-                let mut short_keys: Vec<usize> = self.positions.short.keys().cloned().collect();
-                short_keys.sort();
-
-                for idx in short_keys {
-                    let position = &self.positions.short[&idx];
+                // Check short positions in ascending index order
+                for idx in self.positions.short.keys().iter() {
+                    let position = &self.positions.short[idx];
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance,
@@ -1091,11 +1378,8 @@ impl<'a> Backtest<'a> {
                     if wallet_exposure / self.bot_params_pair.short.wallet_exposure_limit
                         > self.bot_params_pair.short.unstuck_threshold
                     {
-                        let pprice_diff = calc_pprice_diff_int(
-                            SHORT,
-                            position.price,
-                            self.hlcvs[[k, idx, CLOSE]],
-                        );
+                        let pprice_diff =
+                            calc_pprice_diff_int(SHORT, position.price, self.hlcv(k, idx, CLOSE));
                         stuck_positions.push((idx, SHORT, pprice_diff));
                     }
                 }
@@ -1115,21 +1399,21 @@ impl<'a> Backtest<'a> {
             match pside {
                 LONG => {
                     let close_price = f64::max(
-                        self.hlcvs[[k, idx, CLOSE]],
+                        self.hlcv(k, idx, CLOSE),
                         round_up(
-                            self.emas[idx].compute_bands(LONG).upper
+                            self.emas.compute_bands(idx, LONG).upper
                                 * (1.0 + self.bot_params_pair.long.unstuck_ema_dist),
                             self.exchange_params_list[idx].price_step,
                         ),
                     );
-                    if self.open_orders.long[&idx].closes.is_empty()
-                        || self.open_orders.long[&idx].closes[0].qty == 0.0
-                        || close_price < self.open_orders.long[&idx].closes[0].price
+                    if self.open_orders.long[idx].closes.is_empty()
+                        || self.open_orders.long[idx].closes[0].qty == 0.0
+                        || close_price < self.open_orders.long[idx].closes[0].price
                     {
                         let min_entry_qty =
                             calc_min_entry_qty(close_price, &self.exchange_params_list[idx]);
                         let mut close_qty = -f64::min(
-                            self.positions.long[&idx].size,
+                            self.positions.long[idx].size,
                             f64::max(
                                 min_entry_qty,
                                 round_dn(
@@ -1146,7 +1430,7 @@ impl<'a> Backtest<'a> {
                         );
                         if close_qty != 0.0 {
                             let pnl_if_closed = calc_pnl_long(
-                                self.positions.long[&idx].price,
+                                self.positions.long[idx].price,
                                 close_price,
                                 close_qty,
                                 self.exchange_params_list[idx].c_mult,
@@ -1156,7 +1440,7 @@ impl<'a> Backtest<'a> {
                                 // means unstuck allowance would be exceeded
                                 // reduce qty
                                 close_qty = -f64::min(
-                                    self.positions.long[&idx].size,
+                                    self.positions.long[idx].size,
                                     f64::max(
                                         min_entry_qty,
                                         round_dn(
@@ -1181,21 +1465,21 @@ impl<'a> Backtest<'a> {
                 }
                 SHORT => {
                     let close_price = f64::min(
-                        self.hlcvs[[k, idx, CLOSE]],
+                        self.hlcv(k, idx, CLOSE),
                         round_dn(
-                            self.emas[idx].compute_bands(SHORT).lower
+                            self.emas.compute_bands(idx, SHORT).lower
                                 * (1.0 - self.bot_params_pair.short.unstuck_ema_dist),
                             self.exchange_params_list[idx].price_step,
                         ),
                     );
-                    if self.open_orders.short[&idx].closes.is_empty()
-                        || self.open_orders.short[&idx].closes[0].qty == 0.0
-                        || close_price > self.open_orders.short[&idx].closes[0].price
+                    if self.open_orders.short[idx].closes.is_empty()
+                        || self.open_orders.short[idx].closes[0].qty == 0.0
+                        || close_price > self.open_orders.short[idx].closes[0].price
                     {
                         let min_entry_qty =
                             calc_min_entry_qty(close_price, &self.exchange_params_list[idx]);
                         let mut close_qty = f64::min(
-                            self.positions.short[&idx].size.abs(),
+                            self.positions.short[idx].size.abs(),
                             f64::max(
                                 min_entry_qty,
                                 round_dn(
@@ -1212,7 +1496,7 @@ impl<'a> Backtest<'a> {
                         );
                         if close_qty != 0.0 {
                             let pnl_if_closed = calc_pnl_short(
-                                self.positions.short[&idx].price,
+                                self.positions.short[idx].price,
                                 close_price,
                                 close_qty,
                                 self.exchange_params_list[idx].c_mult,
@@ -1222,7 +1506,7 @@ impl<'a> Backtest<'a> {
                                 // means unstuck allowance would be exceeded
                                 // reduce qty
                                 close_qty = f64::min(
-                                    self.positions.short[&idx].size.abs(),
+                                    self.positions.short[idx].size.abs(),
                                     f64::max(
                                         min_entry_qty,
                                         round_dn(
@@ -1254,44 +1538,28 @@ impl<'a> Backtest<'a> {
     fn update_open_orders_any_fill(&mut self, k: usize) {
         if self.trading_enabled.long {
             if self.trailing_enabled.long {
-                let mut positions_long_indices: Vec<usize> =
-                    self.positions.long.keys().cloned().collect();
-                positions_long_indices.sort();
-                for idx in &positions_long_indices {
-                    if !self.did_fill_long.contains(&idx) {
-                        self.update_trailing_prices(k, *idx, LONG);
-                    }
-                }
+                self.update_trailing_prices_long(k);
             }
             self.update_actives(k, LONG);
-            self.open_orders
-                .long
-                .retain(|&idx, _| self.actives.long.contains(&idx));
-            let mut active_long_indices: Vec<usize> = self.actives.long.iter().cloned().collect();
-            active_long_indices.sort(); // Ensure deterministic order
-            for &idx in &active_long_indices {
+            self.open_orders.long.retain_in(&self.actives.long);
+            // Ascending index order keeps results deterministic
+            let mut cursor = self.actives.long.next_from(0);
+            while let Some(idx) = cursor {
+                cursor = self.actives.long.next_from(idx + 1);
                 self.update_stuck_status(idx, LONG);
                 self.update_open_orders_long_single(k, idx);
             }
         }
         if self.trading_enabled.short {
             if self.trailing_enabled.short {
-                let mut positions_short_indices: Vec<usize> =
-                    self.positions.short.keys().cloned().collect();
-                positions_short_indices.sort();
-                for idx in &positions_short_indices {
-                    if !self.did_fill_short.contains(&idx) {
-                        self.update_trailing_prices(k, *idx, SHORT);
-                    }
-                }
+                self.update_trailing_prices_short(k);
             }
             self.update_actives(k, SHORT);
-            self.open_orders
-                .short
-                .retain(|&idx, _| self.actives.short.contains(&idx));
-            let mut active_short_indices: Vec<usize> = self.actives.short.iter().cloned().collect();
-            active_short_indices.sort(); // Ensure deterministic order
-            for &idx in &active_short_indices {
+            self.open_orders.short.retain_in(&self.actives.short);
+            // Ascending index order keeps results deterministic
+            let mut cursor = self.actives.short.next_from(0);
+            while let Some(idx) = cursor {
+                cursor = self.actives.short.next_from(idx + 1);
                 self.update_stuck_status(idx, SHORT);
                 self.update_open_orders_short_single(k, idx);
             }
@@ -1302,16 +1570,14 @@ impl<'a> Backtest<'a> {
                 LONG => {
                     self.open_orders
                         .long
-                        .get_mut(&unstucking_idx)
-                        .unwrap()
-                        .closes = [unstucking_close].to_vec();
+                        .entry(unstucking_idx)
+                        .set_close(unstucking_close);
                 }
                 SHORT => {
                     self.open_orders
                         .short
-                        .get_mut(&unstucking_idx)
-                        .unwrap()
-                        .closes = [unstucking_close].to_vec();
+                        .entry(unstucking_idx)
+                        .set_close(unstucking_close);
                 }
                 _ => panic!("Invalid unstucking_pside"),
             }
@@ -1325,37 +1591,23 @@ impl<'a> Backtest<'a> {
         // - entries for coins with open trailing entries
         // - closes for coins with open trailing closes
         if self.trading_enabled.long {
-            let mut positions_long_indices: Vec<usize> =
-                self.positions.long.keys().cloned().collect();
-            positions_long_indices.sort();
             if self.trailing_enabled.long {
-                for idx in &positions_long_indices {
-                    if !self.did_fill_long.contains(idx) {
-                        self.update_trailing_prices(k, *idx, LONG);
-                    }
-                }
+                self.update_trailing_prices_long(k);
             }
-            let mut actives_without_pos = Vec::<usize>::new();
-            if positions_long_indices.len() < self.bot_params_pair.long.n_positions {
-                actives_without_pos = self.update_actives(k, LONG);
-                self.open_orders
-                    .long
-                    .retain(|&idx, _| self.actives.long.contains(&idx));
+            self.actives_without_pos.clear();
+            if self.positions.long.len() < self.bot_params_pair.long.n_positions {
+                self.update_actives(k, LONG);
+                self.open_orders.long.retain_in(&self.actives.long);
             }
-            let mut active_long_indices: Vec<usize> = self.actives.long.iter().cloned().collect();
-            active_long_indices.sort();
-
-            for idx in active_long_indices {
-                if actives_without_pos.contains(&idx)
-                    || self.open_orders.long.get(&idx).map_or(false, |orders| {
-                        orders.closes.iter().any(|order| {
-                            order.order_type == OrderType::CloseUnstuckLong
-                                || order.order_type == OrderType::CloseTrailingLong
-                        }) || orders.entries.iter().any(|order| {
-                            order.order_type == OrderType::EntryTrailingNormalLong
-                                || order.order_type == OrderType::EntryTrailingCroppedLong
-                        })
-                    })
+            let mut cursor = self.actives.long.next_from(0);
+            while let Some(idx) = cursor {
+                cursor = self.actives.long.next_from(idx + 1);
+                if self.actives_without_pos.contains(idx)
+                    || self
+                        .open_orders
+                        .long
+                        .get(idx)
+                        .map_or(false, |orders| orders.has_trailing_or_unstuck(LONG))
                 {
                     self.update_open_orders_long_single(k, idx);
                 }
@@ -1363,36 +1615,23 @@ impl<'a> Backtest<'a> {
         }
 
         if self.trading_enabled.short {
-            let mut positions_short_indices: Vec<usize> =
-                self.positions.short.keys().cloned().collect();
-            positions_short_indices.sort();
             if self.trailing_enabled.short {
-                for idx in &positions_short_indices {
-                    if !self.did_fill_short.contains(idx) {
-                        self.update_trailing_prices(k, *idx, SHORT);
-                    }
-                }
+                self.update_trailing_prices_short(k);
             }
-            let mut actives_without_pos = Vec::<usize>::new();
-            if positions_short_indices.len() < self.bot_params_pair.short.n_positions {
-                actives_without_pos = self.update_actives(k, SHORT);
-                self.open_orders
-                    .short
-                    .retain(|&idx, _| self.actives.short.contains(&idx));
+            self.actives_without_pos.clear();
+            if self.positions.short.len() < self.bot_params_pair.short.n_positions {
+                self.update_actives(k, SHORT);
+                self.open_orders.short.retain_in(&self.actives.short);
             }
-            let mut active_short_indices: Vec<usize> = self.actives.short.iter().cloned().collect();
-            active_short_indices.sort();
-            for idx in active_short_indices {
-                if actives_without_pos.contains(&idx)
-                    || self.open_orders.short.get(&idx).map_or(false, |orders| {
-                        orders.closes.iter().any(|order| {
-                            order.order_type == OrderType::CloseUnstuckShort
-                                || order.order_type == OrderType::CloseTrailingShort
-                        }) || orders.entries.iter().any(|order| {
-                            order.order_type == OrderType::EntryTrailingNormalShort
-                                || order.order_type == OrderType::EntryTrailingCroppedShort
-                        })
-                    })
+            let mut cursor = self.actives.short.next_from(0);
+            while let Some(idx) = cursor {
+                cursor = self.actives.short.next_from(idx + 1);
+                if self.actives_without_pos.contains(idx)
+                    || self
+                        .open_orders
+                        .short
+                        .get(idx)
+                        .map_or(false, |orders| orders.has_trailing_or_unstuck(SHORT))
                 {
                     self.update_open_orders_short_single(k, idx);
                 }
@@ -1405,13 +1644,13 @@ impl<'a> Backtest<'a> {
             if unstucking_pside != NO_POS {
                 match unstucking_pside {
                     LONG => {
-                        if let Some(orders) = self.open_orders.long.get_mut(&unstucking_idx) {
-                            orders.closes = vec![unstucking_close];
+                        if let Some(orders) = self.open_orders.long.get_mut(unstucking_idx) {
+                            orders.set_close(unstucking_close);
                         }
                     }
                     SHORT => {
-                        if let Some(orders) = self.open_orders.short.get_mut(&unstucking_idx) {
-                            orders.closes = vec![unstucking_close];
+                        if let Some(orders) = self.open_orders.short.get_mut(unstucking_idx) {
+                            orders.set_close(unstucking_close);
                         }
                     }
                     _ => panic!("Invalid unstucking_pside"),
@@ -1430,21 +1669,42 @@ impl<'a> Backtest<'a> {
 
     #[inline]
     fn update_emas(&mut self, k: usize) {
-        for i in 0..self.n_coins {
-            let close_price = self.hlcvs[[k, i, CLOSE]];
-
-            let long_alphas = &self.ema_alphas.long.alphas;
-            let long_alphas_inv = &self.ema_alphas.long.alphas_inv;
-            let short_alphas = &self.ema_alphas.short.alphas;
-            let short_alphas_inv = &self.ema_alphas.short.alphas_inv;
-
-            let emas = &mut self.emas[i];
-
-            for z in 0..3 {
-                emas.long[z] = close_price * long_alphas[z] + emas.long[z] * long_alphas_inv[z];
-                emas.short[z] = close_price * short_alphas[z] + emas.short[z] * short_alphas_inv[z];
-            }
+        let hlcvs = self.hlcvs;
+        for (idx, close) in self.close_buffer.iter_mut().enumerate() {
+            *close = hlcvs[[k, idx, CLOSE]].into();
         }
+        self.emas.update(&self.close_buffer, &self.ema_alphas);
+    }
+}
+
+/// Minute at which a coin was delisted, if its data ends flat, i.e. with HIGH == LOW == CLOSE ==
+/// the last close, at each of the last 7 days' check points. Reads data through `hlc(k, field)`.
+fn find_delist_timestamp(n_timesteps: usize, hlc: impl Fn(usize, usize) -> f64) -> Option<usize> {
+    let check_points: Vec<usize> = (0..7).map(|i| i * 60 * 24).collect();
+    if n_timesteps <= *check_points.last().unwrap() {
+        return None;
+    }
+    let last_hlc_close = hlc(n_timesteps - 1, CLOSE);
+    let is_flat = |k: usize| {
+        hlc(k, HIGH) == last_hlc_close
+            && hlc(k, LOW) == last_hlc_close
+            && hlc(k, CLOSE) == last_hlc_close
+    };
+    if !check_points
+        .iter()
+        .all(|&point| is_flat(n_timesteps - 1 - point))
+    {
+        return None;
+    }
+    // was delisted. Find timestamp of delisting
+    let mut i = n_timesteps - check_points.last().unwrap();
+    while i > 0 && is_flat(i) {
+        i -= 1;
+    }
+    if i > 1 {
+        Some(i)
+    } else {
+        None
     }
 }
 
@@ -1481,29 +1741,376 @@ fn calc_ema_alphas(bot_params_pair: &BotParamsPair) -> EmaAlphas {
     }
 }
 
+/// Minimum equity per day (1440 samples), built one equity sample at a time.
+#[derive(Debug, Default, Clone)]
+struct DailyMinEquities {
+    daily_eqs: Vec<f64>,
+    current_day: usize,
+    current_min: f64,
+    n_samples: usize,
+}
+
+impl DailyMinEquities {
+    fn update(&mut self, equity: f64) {
+        if self.n_samples == 0 {
+            self.current_min = equity;
+        }
+        let day = self.n_samples / 1440;
+        if day > self.current_day {
+            self.daily_eqs.push(self.current_min);
+            self.current_day = day;
+            self.current_min = equity;
+        } else {
+            self.current_min = self.current_min.min(equity);
+        }
+        self.n_samples += 1;
+    }
+
+    /// Worst drawdown so far of the daily minimum equities, including the current day's,
+    /// continuing from `running` which covers the first `running.n_days` days.
+    fn update_drawdown(&self, running: &mut RunningDrawdown) -> f64 {
+        for &equity in self.daily_eqs[running.n_days..].iter() {
+            running.peak = running.peak.max(equity);
+            running.worst = running.worst.max((running.peak - equity) / running.peak);
+        }
+        running.n_days = self.daily_eqs.len();
+        if self.n_samples > 0 && running.peak > 0.0 {
+            running
+                .worst
+                .max((running.peak - self.current_min) / running.peak)
+        } else {
+            running.worst
+        }
+    }
+
+    fn finish(&self) -> Vec<f64> {
+        let mut daily_eqs = self.daily_eqs.clone();
+        if self.n_samples > 0 && self.current_min != f64::INFINITY {
+            daily_eqs.push(self.current_min);
+        }
+        daily_eqs
+    }
+}
+
+/// Peak and worst drawdown of the daily minimum equities of the first `n_days` days.
+#[derive(Debug, Default, Clone)]
+struct RunningDrawdown {
+    n_days: usize,
+    peak: f64,
+    worst: f64,
+}
+
+/// Running sums over fills: count, first/last balance and realized profit/loss.
+#[derive(Debug, Default, Clone)]
+struct FillStats {
+    n_fills: usize,
+    first_balance: f64,
+    last_balance: f64,
+    total_profit: f64,
+    total_loss: f64,
+}
+
+impl FillStats {
+    fn update(&mut self, pnl: f64, balance: f64) {
+        if self.n_fills == 0 {
+            self.first_balance = balance;
+        }
+        self.last_balance = balance;
+        if pnl > 0.0 {
+            self.total_profit += pnl;
+        } else {
+            self.total_loss += pnl.abs();
+        }
+        self.n_fills += 1;
+    }
+}
+
+/// Running sums of positive and negative (equity - balance) / balance.
+#[derive(Debug, Default, Clone)]
+struct EquityBalanceDiffStats {
+    pos_sum: f64,
+    pos_count: usize,
+    pos_max: f64,
+    neg_sum: f64,
+    neg_count: usize,
+    neg_max: f64,
+}
+
+impl EquityBalanceDiffStats {
+    fn update(&mut self, balance: f64, equity: f64) {
+        let ebd = (equity - balance) / balance;
+        if ebd > 0.0 {
+            self.pos_sum += ebd;
+            self.pos_count += 1;
+            self.pos_max = f64::max(self.pos_max, ebd);
+        } else if ebd < 0.0 {
+            self.neg_sum += ebd.abs();
+            self.neg_count += 1;
+            self.neg_max = f64::max(self.neg_max, ebd.abs());
+        }
+    }
+}
+
+/// Tracks how long positions are held, keyed by coin and position side.
+#[derive(Debug, Clone)]
+struct PositionDurations<K> {
+    positions_opened: HashMap<K, usize>,
+    durations: Vec<usize>,
+    max_duration: usize,
+}
+
+impl<K: std::hash::Hash + Eq + Clone> PositionDurations<K> {
+    fn new() -> Self {
+        PositionDurations {
+            positions_opened: HashMap::new(),
+            durations: Vec::new(),
+            max_duration: 0,
+        }
+    }
+
+    fn update(&mut self, key: K, index: usize, position_size: f64) {
+        let start_idx = *self.positions_opened.entry(key.clone()).or_insert(index);
+        if position_size == 0.0 {
+            self.positions_opened.remove(&key);
+            self.durations.push(index - start_idx);
+            self.max_duration = self.max_duration.max(index - start_idx);
+        }
+    }
+
+    /// Longest duration of any position closed so far or still open at `index`.
+    fn max_duration(&self, index: usize) -> usize {
+        self.positions_opened
+            .values()
+            .fold(self.max_duration, |max, &start_idx| {
+                max.max(index.saturating_sub(start_idx))
+            })
+    }
+
+    /// Durations of closed positions plus positions still open at `last_index`.
+    fn finish(&self, last_index: usize) -> Vec<usize> {
+        let mut durations = self.durations.clone();
+        for (_key, &start_idx) in self.positions_opened.iter() {
+            durations.push(last_index - start_idx);
+        }
+        durations
+    }
+}
+
+fn is_long_fill(order_type: &OrderType) -> bool {
+    order_type.to_string().contains("long")
+}
+
+/// Builds the analysis incrementally while the backtest runs, so that neither fills nor
+/// per-minute equities need to be kept in memory.
+///
+/// Produces the same metrics as `analyze_backtest`. Equity is reduced to daily minimums as
+/// it arrives, one set per weighted subset (the last 1/2, 1/3, ..., 1/10 of the backtest),
+/// so quantile-based metrics are computed exactly from series of length n_days.
+pub struct AnalysisAccumulator {
+    n_equities_expected: usize,
+    n_equities: usize,
+    // windows[0] is the full backtest, windows[i] the last 1 / (1 + i) of it
+    window_starts: Vec<usize>,
+    window_daily_eqs: Vec<DailyMinEquities>,
+    window_fill_stats: Vec<FillStats>,
+    equity_balance_diffs: EquityBalanceDiffStats,
+    // equities seen before the first fill, run-length encoded, as their balance is that of
+    // the first fill
+    equities_before_first_fill: Vec<(f64, usize)>,
+    position_durations: PositionDurations<(usize, bool)>,
+    last_fill_index: usize,
+    running_drawdown: RunningDrawdown,
+}
+
+impl AnalysisAccumulator {
+    pub fn new(n_equities_expected: usize) -> Self {
+        let n = n_equities_expected as f64;
+        let mut window_starts = vec![0];
+        for i in 1..10 {
+            let fraction = 1.0 / (1.0 + i as f64);
+            window_starts.push((n - fraction * n).round() as usize);
+        }
+        AnalysisAccumulator {
+            n_equities_expected,
+            n_equities: 0,
+            window_daily_eqs: vec![DailyMinEquities::default(); window_starts.len()],
+            window_fill_stats: vec![FillStats::default(); window_starts.len()],
+            window_starts,
+            equity_balance_diffs: EquityBalanceDiffStats::default(),
+            equities_before_first_fill: Vec::new(),
+            position_durations: PositionDurations::new(),
+            last_fill_index: 0,
+            running_drawdown: RunningDrawdown::default(),
+        }
+    }
+
+    /// Records a fill. Fills must be added before the equity sample of the same minute.
+    pub fn add_fill(
+        &mut self,
+        index: usize,
+        coin_idx: usize,
+        pnl: f64,
+        balance: f64,
+        position_size: f64,
+        order_type: &OrderType,
+    ) {
+        let is_first_fill = self.window_fill_stats[0].n_fills == 0;
+        for (w, &start) in self.window_starts.iter().enumerate() {
+            if index >= start {
+                self.window_fill_stats[w].update(pnl, balance);
+            }
+        }
+        if is_first_fill {
+            for &(equity, count) in self.equities_before_first_fill.iter() {
+                for _ in 0..count {
+                    self.equity_balance_diffs.update(balance, equity);
+                }
+            }
+            self.equities_before_first_fill = Vec::new();
+        }
+        self.position_durations
+            .update((coin_idx, is_long_fill(order_type)), index, position_size);
+        self.last_fill_index = index;
+    }
+
+    pub fn add_equity(&mut self, equity: f64) {
+        let index = self.n_equities;
+        for (w, &start) in self.window_starts.iter().enumerate() {
+            if index >= start {
+                self.window_daily_eqs[w].update(equity);
+            }
+        }
+        if self.window_fill_stats[0].n_fills > 0 {
+            let balance = self.window_fill_stats[0].last_balance;
+            self.equity_balance_diffs.update(balance, equity);
+        } else {
+            match self.equities_before_first_fill.last_mut() {
+                Some((prev, count)) if prev.to_bits() == equity.to_bits() => *count += 1,
+                _ => self.equities_before_first_fill.push((equity, 1)),
+            }
+        }
+        self.n_equities += 1;
+    }
+
+    /// Worst drawdown so far; may slightly differ from the final analysis' `drawdown_worst`,
+    /// which is computed from compounded daily returns.
+    pub fn drawdown_worst(&mut self) -> f64 {
+        self.window_daily_eqs[0].update_drawdown(&mut self.running_drawdown)
+    }
+
+    pub fn equity_balance_diff_neg_max(&self) -> f64 {
+        self.equity_balance_diffs.neg_max
+    }
+
+    pub fn position_held_hours_max(&self) -> f64 {
+        self.position_durations.max_duration(self.n_equities) as f64 / 60.0
+    }
+
+    pub fn finish(&self) -> Analysis {
+        // daily returns need at least two days, which a backtest stopped early may not span
+        let daily_eqs = self.window_daily_eqs[0].finish();
+        if self.window_fill_stats[0].n_fills <= 1 || daily_eqs.len() < 2 {
+            return Analysis::default();
+        }
+        let mut analysis = calc_analysis_basic(
+            &daily_eqs,
+            self.n_equities,
+            &self.window_fill_stats[0],
+            &self.equity_balance_diffs,
+            &self.position_durations.finish(self.last_fill_index),
+        );
+        let mut subset_analyses = Vec::with_capacity(10);
+        subset_analyses.push(analysis.clone());
+        for w in 1..self.window_starts.len() {
+            if self.window_starts[w] >= self.n_equities {
+                break;
+            }
+            let fill_stats = &self.window_fill_stats[w];
+            if fill_stats.n_fills == 0 {
+                break;
+            }
+            if fill_stats.n_fills <= 1 {
+                subset_analyses.push(Analysis::default());
+                continue;
+            }
+            // as in analyze_backtest: no daily returns in a window of less than two days
+            let daily_eqs = self.window_daily_eqs[w].finish();
+            if daily_eqs.len() < 2 {
+                break;
+            }
+            subset_analyses.push(calc_analysis_basic(
+                &daily_eqs,
+                self.n_equities - self.window_starts[w],
+                fill_stats,
+                &EquityBalanceDiffStats::default(),
+                &[],
+            ));
+        }
+        set_weighted_metrics(&mut analysis, &subset_analyses);
+        analysis
+    }
+}
+
 fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     if fills.len() <= 1 {
         return Analysis::default();
     }
     // Calculate daily equities
-    let mut daily_eqs = Vec::new();
-    let mut current_day = 0;
-    let mut current_min = equities[0];
+    let mut daily_eqs = DailyMinEquities::default();
+    for &equity in equities.iter() {
+        daily_eqs.update(equity);
+    }
+    let daily_eqs = daily_eqs.finish();
+    if daily_eqs.len() < 2 {
+        return Analysis::default();
+    }
+
+    // Calculate equity-balance differences
+    let mut equity_balance_diffs = EquityBalanceDiffStats::default();
+    let mut fill_iter = fills.iter().peekable();
+    let mut last_balance = fills[0].balance;
 
     for (i, &equity) in equities.iter().enumerate() {
-        let day = i / 1440;
-        if day > current_day {
-            daily_eqs.push(current_min);
-            current_day = day;
-            current_min = equity;
-        } else {
-            current_min = current_min.min(equity);
+        while let Some(fill) = fill_iter.peek() {
+            if fill.index <= i {
+                last_balance = fill.balance;
+                fill_iter.next();
+            } else {
+                break;
+            }
         }
+        equity_balance_diffs.update(last_balance, equity);
     }
-    if current_min != f64::INFINITY {
-        daily_eqs.push(current_min);
+
+    // Calculate profit/loss sums and position durations
+    let mut fill_stats = FillStats::default();
+    let mut position_durations = PositionDurations::new();
+    for fill in fills {
+        fill_stats.update(fill.pnl, fill.balance);
+        position_durations.update(
+            (fill.coin.clone(), is_long_fill(&fill.order_type)),
+            fill.index,
+            fill.position_size,
+        );
     }
+    let last_index = fills.last().map_or(0, |f| f.index);
+
+    calc_analysis_basic(
+        &daily_eqs,
+        equities.len(),
+        &fill_stats,
+        &equity_balance_diffs,
+        &position_durations.finish(last_index),
+    )
+}
 
+fn calc_analysis_basic(
+    daily_eqs: &[f64],
+    n_equities: usize,
+    fill_stats: &FillStats,
+    equity_balance_diffs: &EquityBalanceDiffStats,
+    durations: &[usize],
+) -> Analysis {
     // Calculate daily percentage changes
     let daily_eqs_pct_change: Vec<f64> =
         daily_eqs.windows(2).map(|w| (w[1] - w[0]) / w[0]).collect();
@@ -1585,7 +2192,7 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     };
 
     // Calculate drawdowns
-    let drawdowns = calc_drawdowns(&daily_eqs);
+    let drawdowns = calc_drawdowns(daily_eqs);
     let drawdown_worst_mean_1pct = {
         let mut sorted_drawdowns = drawdowns.clone();
         sorted_drawdowns.sort_by(|a, b| b.abs().partial_cmp(&a.abs()).unwrap_or(Ordering::Equal));
@@ -1616,101 +2223,32 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
         0.0
     };
 
-    // Calculate equity-balance differences
-    let mut bal_eq = Vec::with_capacity(equities.len());
-    let mut fill_iter = fills.iter().peekable();
-    let mut last_balance = fills[0].balance;
-
-    for (i, &equity) in equities.iter().enumerate() {
-        while let Some(fill) = fill_iter.peek() {
-            if fill.index <= i {
-                last_balance = fill.balance;
-                fill_iter.next();
-            } else {
-                break;
-            }
-        }
-        bal_eq.push((last_balance, equity));
-    }
-
-    // Calculate equity-balance differences with separate positive and negative tracking
-    let mut ebds_pos = Vec::new();
-    let mut ebds_neg = Vec::new();
-
-    for &(balance, equity) in bal_eq.iter() {
-        let ebd = (equity - balance) / balance;
-        if ebd > 0.0 {
-            ebds_pos.push(ebd);
-        } else if ebd < 0.0 {
-            ebds_neg.push(ebd);
-        }
-    }
-
-    let equity_balance_diff_pos_max = ebds_pos.iter().fold(0.0, |max, &x| f64::max(max, x));
-    let equity_balance_diff_pos_mean = if !ebds_pos.is_empty() {
-        ebds_pos.iter().sum::<f64>() / ebds_pos.len() as f64
+    // Equity-balance differences
+    let equity_balance_diff_pos_max = equity_balance_diffs.pos_max;
+    let equity_balance_diff_pos_mean = if equity_balance_diffs.pos_count > 0 {
+        equity_balance_diffs.pos_sum / equity_balance_diffs.pos_count as f64
     } else {
         0.0
     };
 
-    let equity_balance_diff_neg_max = ebds_neg.iter().fold(0.0, |max, &x| f64::max(max, x.abs()));
-    let equity_balance_diff_neg_mean = if !ebds_neg.is_empty() {
-        ebds_neg.iter().map(|x| x.abs()).sum::<f64>() / ebds_neg.len() as f64
+    let equity_balance_diff_neg_max = equity_balance_diffs.neg_max;
+    let equity_balance_diff_neg_mean = if equity_balance_diffs.neg_count > 0 {
+        equity_balance_diffs.neg_sum / equity_balance_diffs.neg_count as f64
     } else {
         0.0
     };
 
-    let gain = fills[fills.len() - 1].balance / fills[0].balance;
+    let gain = fill_stats.last_balance / fill_stats.first_balance;
 
     // Calculate profit factor
-    let (total_profit, total_loss) = fills.iter().fold((0.0, 0.0), |(profit, loss), fill| {
-        if fill.pnl > 0.0 {
-            (profit + fill.pnl, loss)
-        } else {
-            (profit, loss + fill.pnl.abs())
-        }
-    });
-    let loss_profit_ratio = if total_profit == 0.0 {
+    let loss_profit_ratio = if fill_stats.total_profit == 0.0 {
         f64::INFINITY
     } else {
-        total_loss / total_profit
+        fill_stats.total_loss / fill_stats.total_profit
     };
 
-    // Calculate position durations
-    let mut positions_opened: HashMap<String, usize> = HashMap::new();
-    let mut durations: Vec<usize> = Vec::new();
-
-    for fill in fills {
-        let key = format!(
-            "{}_{}",
-            fill.coin,
-            if fill.order_type.to_string().contains("long") {
-                "long"
-            } else {
-                "short"
-            }
-        );
-
-        if !positions_opened.contains_key(&key) {
-            positions_opened.insert(key.clone(), fill.index);
-        }
-
-        if fill.position_size == 0.0 {
-            if let Some(&start_idx) = positions_opened.get(&key) {
-                durations.push(fill.index - start_idx);
-                positions_opened.remove(&key);
-            }
-        }
-    }
-
-    // Add remaining open positions
-    let last_index = fills.last().map_or(0, |f| f.index);
-    for (_key, &start_idx) in positions_opened.iter() {
-        durations.push(last_index - start_idx);
-    }
-
     // Calculate duration statistics
-    let n_days = (equities.len() as f64) / 1440.0; // Convert minutes to days
+    let n_days = (n_equities as f64) / 1440.0; // Convert minutes to days
     let positions_held_per_day = durations.len() as f64 / n_days;
 
     let position_held_hours_mean = if !durations.is_empty() {
@@ -1726,7 +2264,7 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     };
 
     let position_held_hours_median = if !durations.is_empty() {
-        let mut sorted_durations = durations.clone();
+        let mut sorted_durations = durations.to_vec();
         sorted_durations.sort_unstable();
         let mid = sorted_durations.len() / 2;
         if sorted_durations.len() % 2 == 0 {
@@ -1763,6 +2301,9 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     analysis
 }
 
+/// Computes the analysis from complete fill and equity vectors.
+///
+/// `Backtest::run` computes the same metrics incrementally with `AnalysisAccumulator`.
 pub fn analyze_backtest(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     let mut analysis = analyze_backtest_basic(fills, equities);
 
@@ -1800,12 +2341,21 @@ pub fn analyze_backtest(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
         if subset_fills.len() == 0 {
             break;
         }
+        if subset_fills.len() > 1 && subset_equities.len() <= 1440 {
+            // less than two days leave no daily returns to compute metrics from
+            break;
+        }
 
         let subset_analysis = analyze_backtest_basic(&subset_fills, &subset_equities.to_vec());
         subset_analyses.push(subset_analysis);
     }
 
-    // Compute weighted metrics as the mean of subset analyses
+    set_weighted_metrics(&mut analysis, &subset_analyses);
+    analysis
+}
+
+/// Sets the `_w` metrics as the mean over the full backtest and its trailing subsets.
+fn set_weighted_metrics(analysis: &mut Analysis, subset_analyses: &[Analysis]) {
     analysis.adg_w = subset_analyses.iter().map(|a| a.adg).sum::<f64>() / 10.0;
     analysis.mdg_w = subset_analyses.iter().map(|a| a.mdg).sum::<f64>() / 10.0;
     analysis.sharpe_ratio_w = subset_analyses.iter().map(|a| a.sharpe_ratio).sum::<f64>() / 10.0;
@@ -1822,8 +2372,6 @@ pub fn analyze_backtest(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
         .map(|a| a.loss_profit_ratio)
         .sum::<f64>()
         / 10.0;
-
-    analysis
 }
 
 fn calc_drawdowns(equity_series: &[f64]) -> Vec<f64> {
@@ -1843,3 +2391,335 @@ fn calc_drawdowns(equity_series: &[f64]) -> Vec<f64> {
         .map(|(&ret, &max)| (ret - max) / max)
         .collect()
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    /// Deterministic pseudo-random numbers in [0, 1).
+    struct Lcg(u64);
+
+    impl Lcg {
+        fn next(&mut self) -> f64 {
+            self.0 = self
+                .0
+                .wrapping_mul(6364136223846793005)
+                .wrapping_add(1442695040888963407);
+            (self.0 >> 11) as f64 / (1u64 << 53) as f64
+        }
+    }
+
+    /// Synthetic backtest of n_minutes: a random walk of equity and, from first_fill_minute
+    /// on, fills opening and closing positions on three coins with probability fill_prob per
+    /// minute.
+    fn synthetic_backtest(
+        seed: u64,
+        n_minutes: usize,
+        first_fill_minute: usize,
+        fill_prob: f64,
+    ) -> (Vec<Fill>, Vec<f64>) {
+        let mut rng = Lcg(seed);
+        let mut equities = Vec::with_capacity(n_minutes);
+        let mut fills = Vec::new();
+        let mut equity = 1000.0;
+        let mut balance = 1000.0;
+        let mut position_sizes = [0.0; 3];
+        for index in 0..n_minutes {
+            if index >= first_fill_minute && rng.next() < fill_prob {
+                let coin = (rng.next() * 3.0) as usize;
+                let (pnl, order_type) = if position_sizes[coin] == 0.0 {
+                    position_sizes[coin] = 1.0 + rng.next();
+                    (0.0, OrderType::EntryGridNormalLong)
+                } else {
+                    position_sizes[coin] = 0.0;
+                    ((rng.next() - 0.45) * 20.0, OrderType::CloseGridLong)
+                };
+                balance += pnl;
+                fills.push(Fill {
+                    index,
+                    coin: format!("COIN{}", coin),
+                    pnl,
+                    fee_paid: 0.0,
+                    balance,
+                    fill_qty: 1.0,
+                    fill_price: 1.0,
+                    position_size: position_sizes[coin],
+                    position_price: 1.0,
+                    order_type,
+                });
+            }
+            equity = (equity + (rng.next() - 0.5) * 4.0).max(1.0);
+            equities.push(equity);
+        }
+        (fills, equities)
+    }
+
+    fn accumulate(fills: &[Fill], equities: &[f64]) -> Analysis {
+        let mut accumulator = AnalysisAccumulator::new(equities.len());
+        let mut fill_iter = fills.iter().peekable();
+        for (index, &equity) in equities.iter().enumerate() {
+            while let Some(fill) = fill_iter.next_if(|fill| fill.index == index) {
+                let coin_idx = fill.coin[4..].parse::<usize>().unwrap();
+                accumulator.add_fill(
+                    index,
+                    coin_idx,
+                    fill.pnl,
+                    fill.balance,
+                    fill.position_size,
+                    &fill.order_type,
+                );
+            }
+            accumulator.add_equity(equity);
+        }
+        accumulator.finish()
+    }
+
+    fn assert_close(name: &str, streamed: f64, post_hoc: f64) {
+        let tolerance = 1e-9 * streamed.abs().max(post_hoc.abs()).max(1.0);
+        assert!(
+            streamed == post_hoc || (streamed - post_hoc).abs() <= tolerance,
+            "{}: streamed {} != post hoc {}",
+            name,
+            streamed,
+            post_hoc
+        );
+    }
+
+    fn assert_same_analysis(streamed: &Analysis, post_hoc: &Analysis) {
+        macro_rules! check {
+            ($($field:ident),*) => {
+                $(assert_close(stringify!($field), streamed.$field, post_hoc.$field);)*
+            };
+        }
+        check!(
+            adg,
+            mdg,
+            gain,
+            sharpe_ratio,
+            sortino_ratio,
+            omega_ratio,
+            expected_shortfall_1pct,
+            calmar_ratio,
+            sterling_ratio,
+            drawdown_worst,
+            drawdown_worst_mean_1pct,
+            equity_balance_diff_neg_max,
+            equity_balance_diff_neg_mean,
+            equity_balance_diff_pos_max,
+            equity_balance_diff_pos_mean,
+            loss_profit_ratio,
+            positions_held_per_day,
+            position_held_hours_mean,
+            position_held_hours_max,
+            position_held_hours_median,
+            adg_w,
+            mdg_w,
+            sharpe_ratio_w,
+            sortino_ratio_w,
+            omega_ratio_w,
+            calmar_ratio_w,
+            sterling_ratio_w,
+            loss_profit_ratio_w
+        );
+    }
+
+    fn check_streamed_matches_post_hoc(
+        seed: u64,
+        n_minutes: usize,
+        first_fill_minute: usize,
+        fill_prob: f64,
+    ) {
+        let (fills, equities) = synthetic_backtest(seed, n_minutes, first_fill_minute, fill_prob);
+        assert_same_analysis(
+            &accumulate(&fills, &equities),
+            &analyze_backtest(&fills, &equities),
+        );
+    }
+
+    #[test]
+    fn accumulator_matches_analyze_backtest() {
+        for seed in 0..5 {
+            check_streamed_matches_post_hoc(seed, 1440 * 30 + 17 * seed as usize, 0, 0.002);
+        }
+    }
+
+    #[test]
+    fn accumulator_matches_analyze_backtest_with_late_first_fill() {
+        // equities before the first fill are compared with its balance
+        check_streamed_matches_post_hoc(7, 1440 * 20, 1440 * 3 + 11, 0.002);
+    }
+
+    #[test]
+    fn accumulator_matches_analyze_backtest_on_short_windows() {
+        // 5 days: the last few tenths span less than two days, with several fills each
+        check_streamed_matches_post_hoc(11, 1440 * 5, 0, 0.01);
+        // 3 days and sparse fills: some trailing windows have a single fill
+        check_streamed_matches_post_hoc(12, 1440 * 3, 0, 0.0008);
+        // less than two days in total
+        check_streamed_matches_post_hoc(13, 1440 + 600, 0, 0.01);
+    }
+
+    #[test]
+    fn accumulator_matches_analyze_backtest_on_short_window_with_single_fill() {
+        // 5 days, fills in the first 4 and a single one late on the last day: the last tenth
+        // spans half a day with one fill, which counts as a default analysis, not as the end
+        let n_minutes = 1440 * 5;
+        let (fills, equities) = synthetic_backtest(14, n_minutes, 0, 0.01);
+        let mut fills: Vec<Fill> = fills.into_iter().filter(|f| f.index < 1440 * 4).collect();
+        let mut last_fill = fills.last().unwrap().clone();
+        last_fill.index = n_minutes - 100;
+        fills.push(last_fill);
+        assert_same_analysis(
+            &accumulate(&fills, &equities),
+            &analyze_backtest(&fills, &equities),
+        );
+    }
+
+    /// Synthetic HLCV data of n_minutes for n_coins: random walks with occasional trends, so
+    /// that positions both fill up and get stuck, and random volumes.
+    fn synthetic_hlcvs(seed: u64, n_minutes: usize, n_coins: usize) -> Array3<f64> {
+        let mut rng = Lcg(seed);
+        let mut hlcvs = Array3::<f64>::zeros((n_minutes, n_coins, 4));
+        for idx in 0..n_coins {
+            let mut close = 10.0 + 90.0 * rng.next();
+            let mut drift = 0.0;
+            for k in 0..n_minutes {
+                if k % 720 == 0 {
+                    drift = (rng.next() - 0.5) * 0.0002;
+                }
+                let prev_close = close;
+                close *= 1.0 + drift + (rng.next() - 0.5) * 0.002;
+                hlcvs[[k, idx, HIGH]] = prev_close.max(close) * (1.0 + rng.next() * 0.001);
+                hlcvs[[k, idx, LOW]] = prev_close.min(close) * (1.0 - rng.next() * 0.001);
+                hlcvs[[k, idx, CLOSE]] = close;
+                hlcvs[[k, idx, VOLUME]] = 1000.0 * rng.next();
+            }
+        }
+        hlcvs
+    }
+
+    fn grid_bot_params(n_positions: usize) -> BotParams {
+        BotParams {
+            close_grid_markup_range: 0.01,
+            close_grid_min_markup: 0.005,
+            close_grid_qty_pct: 0.25,
+            close_trailing_retracement_pct: 0.002,
+            close_trailing_qty_pct: 0.25,
+            close_trailing_threshold_pct: 0.008,
+            enforce_exposure_limit: true,
+            entry_grid_double_down_factor: 1.0,
+            entry_grid_spacing_weight: 0.5,
+            entry_grid_spacing_pct: 0.01,
+            entry_initial_ema_dist: 0.0,
+            entry_initial_qty_pct: 0.05,
+            entry_trailing_retracement_pct: 0.005,
+            entry_trailing_threshold_pct: 0.01,
+            filter_rolling_window: 60,
+            filter_relative_volume_clip_pct: 0.5,
+            ema_span_0: 60.0,
+            ema_span_1: 240.0,
+            n_positions,
+            total_wallet_exposure_limit: 1.0,
+            wallet_exposure_limit: 1.0 / n_positions as f64,
+            // positions at the exposure limit count as stuck unless the threshold is above it
+            unstuck_threshold: 1.5,
+            ..Default::default()
+        }
+    }
+
+    fn run_backtest(
+        hlcvs: &Array3<f64>,
+        bot_params_pair: &BotParamsPair,
+        fast_forward_enabled: bool,
+    ) -> (Vec<Fill>, Vec<f64>) {
+        let n_coins = hlcvs.shape()[1];
+        let hlcvs_view = hlcvs.view();
+        let backtest_params = BacktestParams {
+            starting_balance: 1000.0,
+            maker_fee: 0.0002,
+            coins: (0..n_coins).map(|idx| format!("COIN{}", idx)).collect(),
+            abort_drawdown_worst: f64::INFINITY,
+            abort_equity_balance_diff_neg_max: f64::INFINITY,
+            abort_position_held_hours_max: f64::INFINITY,
+        };
+        let exchange_params_list = vec![ExchangeParams::default(); n_coins];
+        let mut backtest = Backtest::new(
+            &hlcvs_view,
+            bot_params_pair.clone(),
+            exchange_params_list,
+            &backtest_params,
+        );
+        backtest.fast_forward_enabled = fast_forward_enabled;
+        let (fills, equities, _) = backtest.run();
+        (fills, equities)
+    }
+
+    /// Runs the backtest minute by minute and with fast-forwarding, asserting identical fills
+    /// and equities. Returns the fills.
+    fn check_fast_forward_matches_per_minute(
+        hlcvs: &Array3<f64>,
+        bot_params_pair: &BotParamsPair,
+    ) -> Vec<Fill> {
+        let (fills, equities) = run_backtest(hlcvs, bot_params_pair, false);
+        let (fills_ff, equities_ff) = run_backtest(hlcvs, bot_params_pair, true);
+        assert_eq!(fills.len(), fills_ff.len(), "number of fills");
+        for (fill, fill_ff) in fills.iter().zip(fills_ff.iter()) {
+            assert_eq!(
+                format!("{:?}", fill),
+                format!("{:?}", fill_ff),
+                "fill at minute {}",
+                fill.index
+            );
+        }
+        assert_eq!(equities.len(), equities_ff.len(), "number of equities");
+        for (k, (equity, equity_ff)) in equities.iter().zip(equities_ff.iter()).enumerate() {
+            assert_eq!(equity, equity_ff, "equity at minute {}", k);
+        }
+        fills
+    }
+
+    fn has_fill(fills: &[Fill], order_types: &[OrderType]) -> bool {
+        fills
+            .iter()
+            .any(|fill| order_types.contains(&fill.order_type))
+    }
+
+    #[test]
+    fn fast_forward_matches_per_minute_with_unstucking() {
+        // long only, all slots taken most of the time
+        let hlcvs = synthetic_hlcvs(21, 1440 * 8, 3);
+        let mut long = grid_bot_params(3);
+        long.unstuck_close_pct = 0.05;
+        long.unstuck_loss_allowance_pct = 0.02;
+        long.unstuck_threshold = 0.7;
+        let short = BotParams::default();
+        let fills = check_fast_forward_matches_per_minute(&hlcvs, &BotParamsPair { long, short });
+        assert!(has_fill(&fills, &[OrderType::CloseUnstuckLong]));
+    }
+
+    #[test]
+    fn fast_forward_matches_per_minute_with_slots_not_full() {
+        // fewer slots than coins on both sides, so that positions get opened on new coins
+        let hlcvs = synthetic_hlcvs(22, 1440 * 8, 4);
+        let bot_params_pair = BotParamsPair {
+            long: grid_bot_params(2),
+            short: grid_bot_params(1),
+        };
+        let fills = check_fast_forward_matches_per_minute(&hlcvs, &bot_params_pair);
+        assert!(has_fill(&fills, &[OrderType::EntryInitialNormalLong]));
+        assert!(has_fill(&fills, &[OrderType::EntryInitialNormalShort]));
+    }
+
+    #[test]
+    fn fast_forward_matches_per_minute_with_trailing_orders() {
+        // long trailing up to half the exposure limit and grid beyond, short grid only
+        let hlcvs = synthetic_hlcvs(23, 1440 * 8, 3);
+        let mut long = grid_bot_params(3);
+        long.entry_trailing_grid_ratio = 0.5;
+        long.close_trailing_grid_ratio = 0.5;
+        let short = grid_bot_params(3);
+        let fills = check_fast_forward_matches_per_minute(&hlcvs, &BotParamsPair { long, short });
+        assert!(has_fill(&fills, &[OrderType::EntryTrailingNormalLong]));
+        assert!(has_fill(&fills, &[OrderType::CloseTrailingLong]));
+    }
+}
@@ -0,0 +1,55 @@
+use crate::backtest::HlcvValue;
+use crate::constants::{CLOSE, HIGH, LOW};
+
+/// Number of fields per coin in a coin-major layout: HIGH, LOW and CLOSE, in that order.
+pub const COIN_MAJOR_FIELDS: usize = 3;
+
+/// HIGH, LOW and CLOSE of every coin as contiguous time series, i.e. the `(n_coins,
+/// COIN_MAJOR_FIELDS, n_timesteps)` transpose of the engine's `(n_timesteps, n_coins, 4)` HLCV
+/// layout. Scans along the time axis of a single coin, such as delisting detection or looking
+/// for the next fill of an order, read sequential memory instead of one value per row.
+///
+/// `dump_coin_major_hlcvs` in backtest.py writes this layout once, so the optimizer can share it
+/// between backtests through a memory-mapped file.
+#[derive(Clone, Copy)]
+pub struct CoinMajorHlcvs<'a, T: HlcvValue> {
+    data: &'a [T],
+    n_timesteps: usize,
+    first_timestep: usize,
+}
+
+impl<'a, T: HlcvValue> CoinMajorHlcvs<'a, T> {
+    pub fn from_slice(data: &'a [T], n_timesteps: usize, n_coins: usize) -> Result<Self, String> {
+        let expected_len = n_coins * COIN_MAJOR_FIELDS * n_timesteps;
+        if data.len() != expected_len {
+            return Err(format!(
+                "Coin-major HLCV data has {} values, expected {} for {} timesteps and {} coins",
+                data.len(),
+                expected_len,
+                n_timesteps,
+                n_coins
+            ));
+        }
+        Ok(CoinMajorHlcvs {
+            data,
+            n_timesteps,
+            first_timestep: 0,
+        })
+    }
+
+    /// A view of the minutes from `first_timestep` on, for backtests of a trailing sub-range.
+    pub fn skip_timesteps(self, first_timestep: usize) -> Self {
+        CoinMajorHlcvs {
+            first_timestep: (self.first_timestep + first_timestep).min(self.n_timesteps),
+            ..self
+        }
+    }
+
+    /// Time series of `field` (HIGH, LOW or CLOSE) of coin `idx`, from `first_timestep` on.
+    #[inline]
+    pub fn series(&self, idx: usize, field: usize) -> &'a [T] {
+        debug_assert!(field == HIGH || field == LOW || field == CLOSE);
+        let start = (idx * COIN_MAJOR_FIELDS + field) * self.n_timesteps;
+        &self.data[start + self.first_timestep..start + self.n_timesteps]
+    }
+}
@@ -0,0 +1,99 @@
+use crate::constants::{CLOSE, HIGH, LOW, VOLUME};
+use crate::backtest::HlcvValue;
+use ndarray::ArrayView3;
+use std::borrow::Cow;
+
+/// Number of values stored per (timestep, coin) in a forager index.
+pub const FORAGER_INDEX_FIELDS: usize = 2;
+/// Field holding the cumulative volume.
+pub const CUM_VOLUME: usize = 0;
+/// Field holding the cumulative noisiness, (high - low) / close.
+pub const CUM_NOISINESS: usize = 1;
+
+/// Prefix sums of volume and noisiness per coin, used to rank coins for forager mode.
+///
+/// Stored as a flat `(n_timesteps + 1, n_coins, FORAGER_INDEX_FIELDS)` array in which row `k`
+/// holds the sums over minutes `0..k`, so the sum over any window `start..end` is
+/// `row[end] - row[start]`. `build_forager_index` in backtest.py writes the same layout, which
+/// lets the optimizer build the index once and share it between backtests through a
+/// memory-mapped file.
+pub struct ForagerIndex<'a> {
+    cumsums: Cow<'a, [f64]>,
+    n_coins: usize,
+}
+
+impl ForagerIndex<'static> {
+    pub fn from_hlcvs<T: HlcvValue>(hlcvs: &ArrayView3<T>) -> Self {
+        let n_timesteps = hlcvs.shape()[0];
+        let n_coins = hlcvs.shape()[1];
+        let row_len = n_coins * FORAGER_INDEX_FIELDS;
+        let mut cumsums = vec![0.0; (n_timesteps + 1) * row_len];
+        for k in 0..n_timesteps {
+            let (prev, next) = cumsums[k * row_len..(k + 2) * row_len].split_at_mut(row_len);
+            for idx in 0..n_coins {
+                let i = idx * FORAGER_INDEX_FIELDS;
+                let high: f64 = hlcvs[[k, idx, HIGH]].into();
+                let low: f64 = hlcvs[[k, idx, LOW]].into();
+                let close: f64 = hlcvs[[k, idx, CLOSE]].into();
+                let volume: f64 = hlcvs[[k, idx, VOLUME]].into();
+                next[i + CUM_VOLUME] = prev[i + CUM_VOLUME] + volume;
+                next[i + CUM_NOISINESS] = prev[i + CUM_NOISINESS] + (high - low) / close;
+            }
+        }
+        ForagerIndex {
+            cumsums: Cow::Owned(cumsums),
+            n_coins,
+        }
+    }
+}
+
+impl<'a> ForagerIndex<'a> {
+    /// Wraps prefix sums laid out as described above, e.g. a memory-mapped index file.
+    pub fn from_slice(
+        cumsums: &'a [f64],
+        n_timesteps: usize,
+        n_coins: usize,
+    ) -> Result<Self, String> {
+        let expected_len = (n_timesteps + 1) * n_coins * FORAGER_INDEX_FIELDS;
+        if cumsums.len() != expected_len {
+            return Err(format!(
+                "Forager index has {} values, expected {} for {} timesteps and {} coins",
+                cumsums.len(),
+                expected_len,
+                n_timesteps,
+                n_coins
+            ));
+        }
+        Ok(ForagerIndex {
+            cumsums: Cow::Borrowed(cumsums),
+            n_coins,
+        })
+    }
+
+    /// A view of this index that borrows its data instead of owning it.
+    pub fn borrowed(&self) -> ForagerIndex<'_> {
+        ForagerIndex {
+            cumsums: Cow::Borrowed(&self.cumsums),
+            n_coins: self.n_coins,
+        }
+    }
+
+    #[inline]
+    fn window_sum(&self, field: usize, idx: usize, start: usize, end: usize) -> f64 {
+        let stride = self.n_coins * FORAGER_INDEX_FIELDS;
+        let offset = idx * FORAGER_INDEX_FIELDS + field;
+        self.cumsums[end * stride + offset] - self.cumsums[start * stride + offset]
+    }
+
+    /// Sum of volume of coin `idx` over minutes `start..end`.
+    #[inline]
+    pub fn volume_sum(&self, idx: usize, start: usize, end: usize) -> f64 {
+        self.window_sum(CUM_VOLUME, idx, start, end)
+    }
+
+    /// Sum of (high - low) / close of coin `idx` over minutes `start..end`.
+    #[inline]
+    pub fn noisiness_sum(&self, idx: usize, start: usize, end: usize) -> f64 {
+        self.window_sum(CUM_NOISINESS, idx, start, end)
+    }
+}
@@ -1,7 +1,9 @@
 mod backtest;
 mod closes;
+mod coin_major;
 mod constants;
 mod entries;
+mod forager;
 mod python;
 mod types;
 mod utils;
@@ -12,6 +14,7 @@ use entries::*;
 use pyo3::prelude::*;
 use pyo3::wrap_pyfunction;
 use python::*;
+use types::OrderType;
 use utils::*;
 
 /// A Python module implemented in Rust.
@@ -43,6 +46,17 @@ fn passivbot_rust(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(calc_closes_long_py, m)?)?;
     m.add_function(wrap_pyfunction!(calc_closes_short_py, m)?)?;
     m.add_function(wrap_pyfunction!(run_backtest, m)?)?;
+    m.add_function(wrap_pyfunction!(run_backtest_batch, m)?)?;
     m.add_function(wrap_pyfunction!(calc_auto_unstuck_allowance, m)?)?;
+    m.add_function(wrap_pyfunction!(calc_ideal_orders_batch, m)?)?;
+    m.add("BATCH_BOT_PARAM_KEYS", BATCH_BOT_PARAM_KEYS.to_vec())?;
+    m.add("BATCH_STATE_KEYS", BATCH_STATE_KEYS.to_vec())?;
+    m.add(
+        "ORDER_TYPES",
+        OrderType::ALL
+            .iter()
+            .map(|order_type| order_type.to_string())
+            .collect::<Vec<_>>(),
+    )?;
     Ok(())
 }
@@ -1,18 +1,23 @@
-use crate::backtest::{analyze_backtest, Backtest};
+use crate::backtest::{Backtest, HlcvValue};
 use crate::closes::{
     calc_closes_long, calc_closes_short, calc_grid_close_long, calc_next_close_long,
     calc_next_close_short, calc_trailing_close_long,
 };
+use crate::coin_major::{CoinMajorHlcvs, COIN_MAJOR_FIELDS};
 use crate::entries::{
     calc_entries_long, calc_entries_short, calc_grid_entry_long, calc_next_entry_long,
     calc_next_entry_short, calc_trailing_entry_long,
 };
+use crate::forager::{ForagerIndex, FORAGER_INDEX_FIELDS};
 use crate::types::{
-    Analysis, BacktestParams, BotParams, BotParamsPair, EMABands, ExchangeParams, Order, OrderBook,
-    Position, StateParams, TrailingPriceBundle,
+    Analysis, BacktestParams, BotParams, BotParamsPair, EMABands, ExchangeParams, Fill, Order,
+    OrderBook, Position, StateParams, TrailingPriceBundle,
+};
+use memmap::{Mmap, MmapOptions};
+use ndarray::{
+    Array1, Array2, Array3, Array4, ArrayBase, ArrayD, ArrayView, ArrayView2, ArrayView3,
+    ShapeBuilder,
 };
-use memmap::MmapOptions;
-use ndarray::{Array1, Array2, Array3, Array4, ArrayBase, ArrayD, ArrayView, ShapeBuilder};
 use numpy::{
     IntoPyArray, PyArray1, PyArray2, PyArray3, PyArray4, PyReadonlyArray2, PyReadonlyArray3,
     PyReadonlyArray4,
@@ -21,9 +26,35 @@ use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
 use pyo3::types::{PyDict, PyList};
 use pyo3::wrap_pyfunction;
+use std::sync::atomic::{AtomicUsize, Ordering as AtomicOrdering};
 use std::{fs::File, slice};
 
+/// Runs a single backtest and returns (fills, equities, analysis).
+///
+/// With `return_fills=False` / `return_equities=False` the corresponding array is returned
+/// empty: the engine then neither stores fills/equities nor converts them to Python objects,
+/// as the analysis is accumulated while the backtest runs.
+/// `forager_index_file` optionally points to prefix sums written by `build_forager_index`;
+/// without it the engine builds them itself if forager mode needs them.
+/// `coin_major_file` optionally points to the coin-major copy of the HLCV data written by
+/// `dump_coin_major_hlcvs`, used for scans along the time axis of single coins.
+/// `hlcvs_dtype` may be `"<f8"` or, for compact HLCV data, `"<f4"`.
+/// With `first_timestep` > 0 the backtest covers only the minutes from `first_timestep` on,
+/// read in place from the same files.
 #[pyfunction]
+#[pyo3(signature = (
+    shared_memory_file,
+    hlcvs_shape,
+    hlcvs_dtype,
+    bot_params_pair_dict,
+    exchange_params_list,
+    backtest_params_dict,
+    return_fills=true,
+    return_equities=true,
+    forager_index_file=None,
+    coin_major_file=None,
+    first_timestep=0
+))]
 pub fn run_backtest(
     shared_memory_file: &str,
     hlcvs_shape: (usize, usize, usize),
@@ -31,109 +62,61 @@ pub fn run_backtest(
     bot_params_pair_dict: &PyDict,
     exchange_params_list: &PyAny,
     backtest_params_dict: &PyDict,
+    return_fills: bool,
+    return_equities: bool,
+    forager_index_file: Option<&str>,
+    coin_major_file: Option<&str>,
+    first_timestep: usize,
 ) -> PyResult<(Py<PyArray2<PyObject>>, Py<PyArray1<f64>>, Py<PyDict>)> {
-    // Open the memory-mapped file
-    let file = File::open(shared_memory_file)
-        .map_err(|e| PyValueError::new_err(format!("Unable to open shared memory file: {}", e)))?;
-
-    let mmap = unsafe {
-        MmapOptions::new()
-            .map(&file)
-            .map_err(|e| PyValueError::new_err(format!("Unable to map file: {}", e)))?
+    let mmap = mmap_shared_memory_file(shared_memory_file)?;
+    let hlcvs_rust = hlcvs_view_from_mmap(&mmap, hlcvs_shape, hlcvs_dtype, first_timestep)?;
+    let forager_mmap = match forager_index_file {
+        Some(forager_index_file) => Some(mmap_shared_memory_file(forager_index_file)?),
+        None => None,
     };
-
-    let hlcvs_rust = unsafe {
-        match hlcvs_dtype {
-            "<f8" => ArrayView::from_shape_ptr(hlcvs_shape, mmap.as_ptr() as *const f64),
-            _ => return Err(PyValueError::new_err("Unsupported dtype for HLCV data")),
-        }
+    let forager_index = match forager_mmap.as_ref() {
+        Some(forager_mmap) => Some(forager_index_from_mmap(
+            forager_mmap,
+            hlcvs_shape,
+            first_timestep,
+        )?),
+        None => None,
     };
-
-    let bot_params_pair = bot_params_pair_from_dict(bot_params_pair_dict)?;
-    let exchange_params = {
-        let mut params_vec = Vec::new();
-        if let Ok(py_list) = exchange_params_list.downcast::<PyList>() {
-            for py_dict in py_list.iter() {
-                if let Ok(dict) = py_dict.downcast::<PyDict>() {
-                    let params = exchange_params_from_dict(dict)?;
-                    params_vec.push(params);
-                } else {
-                    return Err(PyValueError::new_err(
-                        "Unsupported data type in exchange_params_list",
-                    ));
-                }
-            }
-        } else {
-            return Err(PyValueError::new_err(
-                "Unsupported data type for exchange_params_list",
-            ));
-        }
-        params_vec
+    let coin_major_mmap = match coin_major_file {
+        Some(coin_major_file) => Some(mmap_shared_memory_file(coin_major_file)?),
+        None => None,
     };
 
+    let bot_params_pair = bot_params_pair_from_dict(bot_params_pair_dict)?;
+    let exchange_params = exchange_params_list_from_py(exchange_params_list)?;
     let backtest_params = backtest_params_from_dict(backtest_params_dict)?;
-    let mut backtest = Backtest::new(
-        &hlcvs_rust,
-        bot_params_pair,
-        exchange_params,
-        &backtest_params,
-    );
 
     // Run the backtest and get fills and equities
-    Python::with_gil(|py| {
-        let (fills, equities) = backtest.run();
-        let analysis = analyze_backtest(&fills, &equities);
-        let py_analysis = PyDict::new(py);
-        py_analysis.set_item("adg", analysis.adg)?;
-        py_analysis.set_item("mdg", analysis.mdg)?;
-        py_analysis.set_item("gain", analysis.gain)?;
-        py_analysis.set_item("sharpe_ratio", analysis.sharpe_ratio)?;
-        py_analysis.set_item("sortino_ratio", analysis.sortino_ratio)?;
-        py_analysis.set_item("omega_ratio", analysis.omega_ratio)?;
-        py_analysis.set_item("expected_shortfall_1pct", analysis.expected_shortfall_1pct)?;
-        py_analysis.set_item("calmar_ratio", analysis.calmar_ratio)?;
-        py_analysis.set_item("sterling_ratio", analysis.sterling_ratio)?;
-        py_analysis.set_item("drawdown_worst", analysis.drawdown_worst)?;
-        py_analysis.set_item(
-            "drawdown_worst_mean_1pct",
-            analysis.drawdown_worst_mean_1pct,
-        )?;
-        py_analysis.set_item(
-            "equity_balance_diff_neg_max",
-            analysis.equity_balance_diff_neg_max,
-        )?;
-        py_analysis.set_item(
-            "equity_balance_diff_neg_mean",
-            analysis.equity_balance_diff_neg_mean,
-        )?;
-        py_analysis.set_item(
-            "equity_balance_diff_pos_max",
-            analysis.equity_balance_diff_pos_max,
-        )?;
-        py_analysis.set_item(
-            "equity_balance_diff_pos_mean",
-            analysis.equity_balance_diff_pos_mean,
-        )?;
-        py_analysis.set_item("loss_profit_ratio", analysis.loss_profit_ratio)?;
-        py_analysis.set_item("positions_held_per_day", analysis.positions_held_per_day)?;
-        py_analysis.set_item(
-            "position_held_hours_mean",
-            analysis.position_held_hours_mean,
-        )?;
-        py_analysis.set_item("position_held_hours_max", analysis.position_held_hours_max)?;
-        py_analysis.set_item(
-            "position_held_hours_median",
-            analysis.position_held_hours_median,
-        )?;
+    let (fills, equities, analysis) = match &hlcvs_rust {
+        HlcvsView::F64(hlcvs) => run_single_backtest(
+            hlcvs,
+            forager_index,
+            coin_major_from_mmap(coin_major_mmap.as_ref(), hlcvs_shape, first_timestep)?,
+            bot_params_pair,
+            exchange_params,
+            &backtest_params,
+            return_fills,
+            return_equities,
+        ),
+        HlcvsView::F32(hlcvs) => run_single_backtest(
+            hlcvs,
+            forager_index,
+            coin_major_from_mmap(coin_major_mmap.as_ref(), hlcvs_shape, first_timestep)?,
+            bot_params_pair,
+            exchange_params,
+            &backtest_params,
+            return_fills,
+            return_equities,
+        ),
+    };
 
-        py_analysis.set_item("adg_w", analysis.adg_w)?;
-        py_analysis.set_item("mdg_w", analysis.mdg_w)?;
-        py_analysis.set_item("sharpe_ratio_w", analysis.sharpe_ratio_w)?;
-        py_analysis.set_item("sortino_ratio_w", analysis.sortino_ratio_w)?;
-        py_analysis.set_item("omega_ratio_w", analysis.omega_ratio_w)?;
-        py_analysis.set_item("calmar_ratio_w", analysis.calmar_ratio_w)?;
-        py_analysis.set_item("sterling_ratio_w", analysis.sterling_ratio_w)?;
-        py_analysis.set_item("loss_profit_ratio_w", analysis.loss_profit_ratio_w)?;
+    Python::with_gil(|py| {
+        let py_analysis = analysis_to_py_dict(py, &analysis)?;
 
         // Convert fills to a 2D array with mixed types
         let mut py_fills = Array2::from_elem((fills.len(), 10), py.None());
@@ -156,16 +139,405 @@ pub fn run_backtest(
         Ok((
             py_fills.into_pyarray(py).to_owned(),
             py_equities.into_pyarray(py).to_owned(),
-            py_analysis.into(),
+            py_analysis,
         ))
     })
 }
 
+/// Runs one backtest per bot_params_pair dict over the same HLCV data, in parallel.
+///
+/// The shared memory file is mapped once, the GIL is released while the backtests run,
+/// and only the analyses are returned, in the same order as `bot_params_pair_dicts`.
+/// `n_threads` defaults to the number of available cores. The forager index is read from
+/// `forager_index_file` if given, else built once and shared by all backtests of the batch.
+/// The coin-major copy of the HLCV data in `coin_major_file` is shared the same way.
+/// `first_timestep` is as in `run_backtest`.
+#[pyfunction]
+#[pyo3(signature = (
+    shared_memory_file,
+    hlcvs_shape,
+    hlcvs_dtype,
+    bot_params_pair_dicts,
+    exchange_params_list,
+    backtest_params_dict,
+    n_threads=None,
+    forager_index_file=None,
+    coin_major_file=None,
+    first_timestep=0
+))]
+pub fn run_backtest_batch(
+    py: Python<'_>,
+    shared_memory_file: &str,
+    hlcvs_shape: (usize, usize, usize),
+    hlcvs_dtype: &str,
+    bot_params_pair_dicts: &PyList,
+    exchange_params_list: &PyAny,
+    backtest_params_dict: &PyDict,
+    n_threads: Option<usize>,
+    forager_index_file: Option<&str>,
+    coin_major_file: Option<&str>,
+    first_timestep: usize,
+) -> PyResult<Py<PyList>> {
+    let mmap = mmap_shared_memory_file(shared_memory_file)?;
+    let hlcvs_rust = hlcvs_view_from_mmap(&mmap, hlcvs_shape, hlcvs_dtype, first_timestep)?;
+    let forager_mmap = match forager_index_file {
+        Some(forager_index_file) => Some(mmap_shared_memory_file(forager_index_file)?),
+        None => None,
+    };
+    let shared_forager_index = match forager_mmap.as_ref() {
+        Some(forager_mmap) => Some(forager_index_from_mmap(
+            forager_mmap,
+            hlcvs_shape,
+            first_timestep,
+        )?),
+        None => None,
+    };
+    let coin_major_mmap = match coin_major_file {
+        Some(coin_major_file) => Some(mmap_shared_memory_file(coin_major_file)?),
+        None => None,
+    };
+
+    let mut bot_params_pairs = Vec::with_capacity(bot_params_pair_dicts.len());
+    for py_dict in bot_params_pair_dicts.iter() {
+        let dict = py_dict
+            .downcast::<PyDict>()
+            .map_err(|_| PyValueError::new_err("Unsupported data type in bot_params_pair_dicts"))?;
+        bot_params_pairs.push(bot_params_pair_from_dict(dict)?);
+    }
+    let exchange_params = exchange_params_list_from_py(exchange_params_list)?;
+    let backtest_params = backtest_params_from_dict(backtest_params_dict)?;
+
+    let analyses = match &hlcvs_rust {
+        HlcvsView::F64(hlcvs) => {
+            let coin_major =
+                coin_major_from_mmap(coin_major_mmap.as_ref(), hlcvs_shape, first_timestep)?;
+            py.allow_threads(|| {
+                run_backtests_parallel(
+                    hlcvs,
+                    shared_forager_index,
+                    coin_major,
+                    &bot_params_pairs,
+                    &exchange_params,
+                    &backtest_params,
+                    n_threads,
+                )
+            })
+        }
+        HlcvsView::F32(hlcvs) => {
+            let coin_major =
+                coin_major_from_mmap(coin_major_mmap.as_ref(), hlcvs_shape, first_timestep)?;
+            py.allow_threads(|| {
+                run_backtests_parallel(
+                    hlcvs,
+                    shared_forager_index,
+                    coin_major,
+                    &bot_params_pairs,
+                    &exchange_params,
+                    &backtest_params,
+                    n_threads,
+                )
+            })
+        }
+    }
+    .map_err(PyValueError::new_err)?;
+
+    let py_analyses = PyList::empty(py);
+    for analysis in analyses.iter() {
+        py_analyses.append(analysis_to_py_dict(py, analysis)?)?;
+    }
+    Ok(py_analyses.into())
+}
+
+fn run_single_backtest<T: HlcvValue>(
+    hlcvs: &ArrayView3<T>,
+    forager_index: Option<ForagerIndex>,
+    coin_major: Option<CoinMajorHlcvs<T>>,
+    bot_params_pair: BotParamsPair,
+    exchange_params: Vec<ExchangeParams>,
+    backtest_params: &BacktestParams,
+    return_fills: bool,
+    return_equities: bool,
+) -> (Vec<Fill>, Vec<f64>, Analysis) {
+    let mut backtest = Backtest::new(hlcvs, bot_params_pair, exchange_params, backtest_params);
+    backtest.set_record_outputs(return_fills, return_equities);
+    if let Some(forager_index) = forager_index {
+        backtest.set_forager_index(forager_index);
+    }
+    if let Some(coin_major) = coin_major {
+        backtest.set_coin_major_hlcvs(coin_major);
+    }
+    backtest.run()
+}
+
+/// Builds the forager index once, unless one is given, and shares it between the threads.
+fn run_backtests_parallel<T: HlcvValue>(
+    hlcvs: &ArrayView3<T>,
+    forager_index: Option<ForagerIndex>,
+    coin_major: Option<CoinMajorHlcvs<T>>,
+    bot_params_pairs: &[BotParamsPair],
+    exchange_params: &[ExchangeParams],
+    backtest_params: &BacktestParams,
+    n_threads: Option<usize>,
+) -> Result<Vec<Analysis>, String> {
+    let forager_index = forager_index.unwrap_or_else(|| ForagerIndex::from_hlcvs(hlcvs));
+    let n_threads = n_threads
+        .unwrap_or_else(|| {
+            std::thread::available_parallelism()
+                .map(|n| n.get())
+                .unwrap_or(1)
+        })
+        .max(1)
+        .min(bot_params_pairs.len().max(1));
+    // Hand out work one backtest at a time so that slow candidates don't stall a whole chunk
+    let next_idx = AtomicUsize::new(0);
+    let mut results: Vec<(usize, Analysis)> = std::thread::scope(|scope| {
+        let handles: Vec<_> = (0..n_threads)
+            .map(|_| {
+                scope.spawn(|| {
+                    let mut thread_results = Vec::new();
+                    loop {
+                        let i = next_idx.fetch_add(1, AtomicOrdering::Relaxed);
+                        if i >= bot_params_pairs.len() {
+                            break;
+                        }
+                        let mut backtest = Backtest::new(
+                            hlcvs,
+                            bot_params_pairs[i].clone(),
+                            exchange_params.to_vec(),
+                            backtest_params,
+                        );
+                        backtest.set_record_outputs(false, false);
+                        backtest.set_forager_index(forager_index.borrowed());
+                        if let Some(coin_major) = coin_major {
+                            backtest.set_coin_major_hlcvs(coin_major);
+                        }
+                        let (_, _, analysis) = backtest.run();
+                        thread_results.push((i, analysis));
+                    }
+                    thread_results
+                })
+            })
+            .collect();
+        let mut results = Vec::with_capacity(bot_params_pairs.len());
+        for handle in handles {
+            match handle.join() {
+                Ok(thread_results) => results.extend(thread_results),
+                Err(_) => return Err("Backtest thread panicked".to_string()),
+            }
+        }
+        Ok(results)
+    })?;
+    results.sort_unstable_by_key(|(i, _)| *i);
+    Ok(results.into_iter().map(|(_, analysis)| analysis).collect())
+}
+
+fn mmap_shared_memory_file(shared_memory_file: &str) -> PyResult<Mmap> {
+    let file = File::open(shared_memory_file)
+        .map_err(|e| PyValueError::new_err(format!("Unable to open shared memory file: {}", e)))?;
+    unsafe {
+        MmapOptions::new()
+            .map(&file)
+            .map_err(|e| PyValueError::new_err(format!("Unable to map file: {}", e)))
+    }
+}
+
+/// HLCV data mapped from a shared memory file, in one of the supported element types.
+enum HlcvsView<'a> {
+    F64(ArrayView3<'a, f64>),
+    F32(ArrayView3<'a, f32>),
+}
+
+/// Maps the HLCV data of minutes `first_timestep..`, which need to be at least two.
+fn hlcvs_view_from_mmap<'a>(
+    mmap: &'a Mmap,
+    hlcvs_shape: (usize, usize, usize),
+    hlcvs_dtype: &str,
+    first_timestep: usize,
+) -> PyResult<HlcvsView<'a>> {
+    if first_timestep + 2 > hlcvs_shape.0 {
+        return Err(PyValueError::new_err(format!(
+            "first_timestep {} leaves fewer than two timesteps of HLCV data with shape {:?}",
+            first_timestep, hlcvs_shape
+        )));
+    }
+    match hlcvs_dtype {
+        "<f8" => Ok(HlcvsView::F64(typed_view_from_mmap(
+            mmap,
+            hlcvs_shape,
+            first_timestep,
+        )?)),
+        "<f4" => Ok(HlcvsView::F32(typed_view_from_mmap(
+            mmap,
+            hlcvs_shape,
+            first_timestep,
+        )?)),
+        _ => Err(PyValueError::new_err(format!(
+            "Unsupported dtype for HLCV data: {}",
+            hlcvs_dtype
+        ))),
+    }
+}
+
+fn typed_view_from_mmap<'a, T>(
+    mmap: &'a Mmap,
+    hlcvs_shape: (usize, usize, usize),
+    first_timestep: usize,
+) -> PyResult<ArrayView3<'a, T>> {
+    let n_bytes = hlcvs_shape.0 * hlcvs_shape.1 * hlcvs_shape.2 * std::mem::size_of::<T>();
+    if mmap.len() < n_bytes {
+        return Err(PyValueError::new_err(format!(
+            "Shared memory file too small for shape {:?}: {} < {} bytes",
+            hlcvs_shape,
+            mmap.len(),
+            n_bytes
+        )));
+    }
+    // rows are contiguous, so the minutes from first_timestep on are a suffix of the data
+    let row_len = hlcvs_shape.1 * hlcvs_shape.2;
+    unsafe {
+        Ok(ArrayView::from_shape_ptr(
+            (hlcvs_shape.0 - first_timestep, hlcvs_shape.1, hlcvs_shape.2),
+            (mmap.as_ptr() as *const T).add(first_timestep * row_len),
+        ))
+    }
+}
+
+fn forager_index_from_mmap<'a>(
+    mmap: &'a Mmap,
+    hlcvs_shape: (usize, usize, usize),
+    first_timestep: usize,
+) -> PyResult<ForagerIndex<'a>> {
+    let n_values = (hlcvs_shape.0 + 1) * hlcvs_shape.1 * FORAGER_INDEX_FIELDS;
+    if mmap.len() < n_values * std::mem::size_of::<f64>() {
+        return Err(PyValueError::new_err(format!(
+            "Forager index file too small for HLCV shape {:?}: {} < {} bytes",
+            hlcvs_shape,
+            mmap.len(),
+            n_values * std::mem::size_of::<f64>()
+        )));
+    }
+    let cumsums = unsafe { slice::from_raw_parts(mmap.as_ptr() as *const f64, n_values) };
+    // window sums are differences of rows, so dropping leading rows leaves a valid index
+    let row_len = hlcvs_shape.1 * FORAGER_INDEX_FIELDS;
+    ForagerIndex::from_slice(
+        &cumsums[first_timestep * row_len..],
+        hlcvs_shape.0 - first_timestep,
+        hlcvs_shape.1,
+    )
+    .map_err(PyValueError::new_err)
+}
+
+fn coin_major_from_mmap<'a, T: HlcvValue>(
+    mmap: Option<&'a Mmap>,
+    hlcvs_shape: (usize, usize, usize),
+    first_timestep: usize,
+) -> PyResult<Option<CoinMajorHlcvs<'a, T>>> {
+    let mmap = match mmap {
+        Some(mmap) => mmap,
+        None => return Ok(None),
+    };
+    let n_values = hlcvs_shape.0 * hlcvs_shape.1 * COIN_MAJOR_FIELDS;
+    if mmap.len() < n_values * std::mem::size_of::<T>() {
+        return Err(PyValueError::new_err(format!(
+            "Coin-major HLCV file too small for HLCV shape {:?}: {} < {} bytes",
+            hlcvs_shape,
+            mmap.len(),
+            n_values * std::mem::size_of::<T>()
+        )));
+    }
+    let data = unsafe { slice::from_raw_parts(mmap.as_ptr() as *const T, n_values) };
+    CoinMajorHlcvs::from_slice(data, hlcvs_shape.0, hlcvs_shape.1)
+        .map(|coin_major| Some(coin_major.skip_timesteps(first_timestep)))
+        .map_err(PyValueError::new_err)
+}
+
+fn exchange_params_list_from_py(exchange_params_list: &PyAny) -> PyResult<Vec<ExchangeParams>> {
+    let mut params_vec = Vec::new();
+    if let Ok(py_list) = exchange_params_list.downcast::<PyList>() {
+        for py_dict in py_list.iter() {
+            if let Ok(dict) = py_dict.downcast::<PyDict>() {
+                let params = exchange_params_from_dict(dict)?;
+                params_vec.push(params);
+            } else {
+                return Err(PyValueError::new_err(
+                    "Unsupported data type in exchange_params_list",
+                ));
+            }
+        }
+    } else {
+        return Err(PyValueError::new_err(
+            "Unsupported data type for exchange_params_list",
+        ));
+    }
+    Ok(params_vec)
+}
+
+fn analysis_to_py_dict(py: Python<'_>, analysis: &Analysis) -> PyResult<Py<PyDict>> {
+    let py_analysis = PyDict::new(py);
+    py_analysis.set_item("adg", analysis.adg)?;
+    py_analysis.set_item("mdg", analysis.mdg)?;
+    py_analysis.set_item("gain", analysis.gain)?;
+    py_analysis.set_item("sharpe_ratio", analysis.sharpe_ratio)?;
+    py_analysis.set_item("sortino_ratio", analysis.sortino_ratio)?;
+    py_analysis.set_item("omega_ratio", analysis.omega_ratio)?;
+    py_analysis.set_item("expected_shortfall_1pct", analysis.expected_shortfall_1pct)?;
+    py_analysis.set_item("calmar_ratio", analysis.calmar_ratio)?;
+    py_analysis.set_item("sterling_ratio", analysis.sterling_ratio)?;
+    py_analysis.set_item("drawdown_worst", analysis.drawdown_worst)?;
+    py_analysis.set_item(
+        "drawdown_worst_mean_1pct",
+        analysis.drawdown_worst_mean_1pct,
+    )?;
+    py_analysis.set_item(
+        "equity_balance_diff_neg_max",
+        analysis.equity_balance_diff_neg_max,
+    )?;
+    py_analysis.set_item(
+        "equity_balance_diff_neg_mean",
+        analysis.equity_balance_diff_neg_mean,
+    )?;
+    py_analysis.set_item(
+        "equity_balance_diff_pos_max",
+        analysis.equity_balance_diff_pos_max,
+    )?;
+    py_analysis.set_item(
+        "equity_balance_diff_pos_mean",
+        analysis.equity_balance_diff_pos_mean,
+    )?;
+    py_analysis.set_item("loss_profit_ratio", analysis.loss_profit_ratio)?;
+    py_analysis.set_item("positions_held_per_day", analysis.positions_held_per_day)?;
+    py_analysis.set_item(
+        "position_held_hours_mean",
+        analysis.position_held_hours_mean,
+    )?;
+    py_analysis.set_item("position_held_hours_max", analysis.position_held_hours_max)?;
+    py_analysis.set_item(
+        "position_held_hours_median",
+        analysis.position_held_hours_median,
+    )?;
+
+    py_analysis.set_item("adg_w", analysis.adg_w)?;
+    py_analysis.set_item("mdg_w", analysis.mdg_w)?;
+    py_analysis.set_item("sharpe_ratio_w", analysis.sharpe_ratio_w)?;
+    py_analysis.set_item("sortino_ratio_w", analysis.sortino_ratio_w)?;
+    py_analysis.set_item("omega_ratio_w", analysis.omega_ratio_w)?;
+    py_analysis.set_item("calmar_ratio_w", analysis.calmar_ratio_w)?;
+    py_analysis.set_item("sterling_ratio_w", analysis.sterling_ratio_w)?;
+    py_analysis.set_item("loss_profit_ratio_w", analysis.loss_profit_ratio_w)?;
+    py_analysis.set_item("truncated", analysis.truncated)?;
+    Ok(py_analysis.into())
+}
+
 fn backtest_params_from_dict(dict: &PyDict) -> PyResult<BacktestParams> {
     Ok(BacktestParams {
         starting_balance: extract_value(dict, "starting_balance").unwrap_or_default(),
         maker_fee: extract_value(dict, "maker_fee").unwrap_or_default(),
         coins: extract_value(dict, "coins").unwrap_or_default(),
+        abort_drawdown_worst: extract_value(dict, "abort_drawdown_worst").unwrap_or(f64::INFINITY),
+        abort_equity_balance_diff_neg_max: extract_value(dict, "abort_equity_balance_diff_neg_max")
+            .unwrap_or(f64::INFINITY),
+        abort_position_held_hours_max: extract_value(dict, "abort_position_held_hours_max")
+            .unwrap_or(f64::INFINITY),
     })
 }
 
@@ -1077,3 +1449,224 @@ pub fn calc_closes_short_py(
         .map(|order| (order.qty, order.price, order.order_type.to_string()))
         .collect()
 }
+
+/// Bot params per symbol and position side in `calc_ideal_orders_batch`, in column order.
+pub const BATCH_BOT_PARAM_KEYS: [&str; 17] = [
+    "entry_grid_double_down_factor",
+    "entry_grid_spacing_weight",
+    "entry_grid_spacing_pct",
+    "entry_initial_ema_dist",
+    "entry_initial_qty_pct",
+    "entry_trailing_grid_ratio",
+    "entry_trailing_retracement_pct",
+    "entry_trailing_threshold_pct",
+    "close_grid_markup_range",
+    "close_grid_min_markup",
+    "close_grid_qty_pct",
+    "close_trailing_grid_ratio",
+    "close_trailing_qty_pct",
+    "close_trailing_retracement_pct",
+    "close_trailing_threshold_pct",
+    "enforce_exposure_limit",
+    "wallet_exposure_limit",
+];
+
+/// State per symbol and position side in `calc_ideal_orders_batch`, in column order.
+/// `ema_band` is the EMA band the entries are computed from, `price` the last price.
+pub const BATCH_STATE_KEYS: [&str; 8] = [
+    "position_size",
+    "position_price",
+    "min_since_open",
+    "max_since_min",
+    "max_since_open",
+    "min_since_max",
+    "ema_band",
+    "price",
+];
+
+/// Entries and closes of every symbol and position side flagged in `active`, in one call.
+///
+/// `exchange_params` has shape `(n_symbols, 5)`: qty_step, price_step, min_qty, min_cost and
+/// c_mult. `bot_params` and `state` have shapes `(n_symbols, 2, n)`, long then short, with the
+/// columns of `BATCH_BOT_PARAM_KEYS` and `BATCH_STATE_KEYS`. `active` has shape `(n_symbols, 2)`.
+/// Returns an `(n_orders, 4)` array of symbol index, qty, price and order type, an index into
+/// `ORDER_TYPES`. Orders are grouped by symbol: long entries, long closes, short entries, then
+/// short closes, each as computed by `calc_{entries,closes}_{long,short}_py`.
+#[pyfunction]
+pub fn calc_ideal_orders_batch(
+    py: Python<'_>,
+    exchange_params: PyReadonlyArray2<f64>,
+    bot_params: PyReadonlyArray3<f64>,
+    state: PyReadonlyArray3<f64>,
+    active: PyReadonlyArray2<bool>,
+    balance: f64,
+) -> PyResult<Py<PyArray2<f64>>> {
+    let exchange_params = exchange_params.as_array();
+    let bot_params = bot_params.as_array();
+    let state = state.as_array();
+    let active = active.as_array();
+    let n_symbols = exchange_params.shape()[0];
+    if exchange_params.shape()[1] != 5
+        || bot_params.shape() != [n_symbols, 2, BATCH_BOT_PARAM_KEYS.len()]
+        || state.shape() != [n_symbols, 2, BATCH_STATE_KEYS.len()]
+        || active.shape() != [n_symbols, 2]
+    {
+        return Err(PyValueError::new_err(format!(
+            "Inconsistent shapes: exchange_params {:?}, bot_params {:?}, state {:?}, active {:?}",
+            exchange_params.shape(),
+            bot_params.shape(),
+            state.shape(),
+            active.shape()
+        )));
+    }
+    let rows = calc_ideal_orders_rows(exchange_params, bot_params, state, active, balance);
+    let n_orders = rows.len() / 4;
+    let orders = Array2::from_shape_vec((n_orders, 4), rows)
+        .map_err(|e| PyValueError::new_err(e.to_string()))?;
+    Ok(orders.into_pyarray(py).to_owned())
+}
+
+/// Rows of `calc_ideal_orders_batch`, flattened.
+fn calc_ideal_orders_rows(
+    exchange_params: ArrayView2<f64>,
+    bot_params: ArrayView3<f64>,
+    state: ArrayView3<f64>,
+    active: ArrayView2<bool>,
+    balance: f64,
+) -> Vec<f64> {
+    let n_symbols = exchange_params.shape()[0];
+    let mut rows: Vec<f64> = Vec::new();
+    for idx in 0..n_symbols {
+        let e = exchange_params.row(idx);
+        let ep = ExchangeParams {
+            qty_step: e[0],
+            price_step: e[1],
+            min_qty: e[2],
+            min_cost: e[3],
+            c_mult: e[4],
+        };
+        for pside in 0..2 {
+            if !active[[idx, pside]] {
+                continue;
+            }
+            let b = |key: usize| bot_params[[idx, pside, key]];
+            let s = |key: usize| state[[idx, pside, key]];
+            let (position_size, position_price) = (s(0), s(1));
+            let (min_since_open, max_since_min, max_since_open, min_since_max) =
+                (s(2), s(3), s(4), s(5));
+            let (ema_band, price) = (s(6), s(7));
+            let position = Position {
+                size: position_size,
+                price: position_price,
+            };
+            let entry_params = BotParams {
+                entry_grid_double_down_factor: b(0),
+                entry_grid_spacing_weight: b(1),
+                entry_grid_spacing_pct: b(2),
+                entry_initial_ema_dist: b(3),
+                entry_initial_qty_pct: b(4),
+                entry_trailing_grid_ratio: b(5),
+                entry_trailing_retracement_pct: b(6),
+                entry_trailing_threshold_pct: b(7),
+                wallet_exposure_limit: b(16),
+                ..Default::default()
+            };
+            let close_params = BotParams {
+                close_grid_markup_range: b(8),
+                close_grid_min_markup: b(9),
+                close_grid_qty_pct: b(10),
+                close_trailing_grid_ratio: b(11),
+                close_trailing_qty_pct: b(12),
+                close_trailing_retracement_pct: b(13),
+                close_trailing_threshold_pct: b(14),
+                enforce_exposure_limit: b(15) != 0.0,
+                wallet_exposure_limit: b(16),
+                ..Default::default()
+            };
+            let bid_state = StateParams {
+                balance,
+                order_book: OrderBook {
+                    bid: price,
+                    ..Default::default()
+                },
+                ..Default::default()
+            };
+            let ask_state = StateParams {
+                balance,
+                order_book: OrderBook {
+                    ask: price,
+                    ..Default::default()
+                },
+                ..Default::default()
+            };
+            let trailing_since_open_low = TrailingPriceBundle {
+                min_since_open,
+                max_since_min,
+                ..Default::default()
+            };
+            let trailing_since_open_high = TrailingPriceBundle {
+                max_since_open,
+                min_since_max,
+                ..Default::default()
+            };
+            let (entries, closes) = if pside == 0 {
+                let entry_state = StateParams {
+                    ema_bands: EMABands {
+                        lower: ema_band,
+                        ..Default::default()
+                    },
+                    ..bid_state.clone()
+                };
+                (
+                    calc_entries_long(
+                        &ep,
+                        &entry_state,
+                        &entry_params,
+                        &position,
+                        &trailing_since_open_low,
+                    ),
+                    calc_closes_long(
+                        &ep,
+                        &ask_state,
+                        &close_params,
+                        &position,
+                        &trailing_since_open_high,
+                    ),
+                )
+            } else {
+                let entry_state = StateParams {
+                    ema_bands: EMABands {
+                        upper: ema_band,
+                        ..Default::default()
+                    },
+                    ..ask_state.clone()
+                };
+                (
+                    calc_entries_short(
+                        &ep,
+                        &entry_state,
+                        &entry_params,
+                        &position,
+                        &trailing_since_open_high,
+                    ),
+                    calc_closes_short(
+                        &ep,
+                        &bid_state,
+                        &close_params,
+                        &position,
+                        &trailing_since_open_low,
+                    ),
+                )
+            };
+            for order in entries.iter().chain(closes.iter()) {
+                rows.extend_from_slice(&[
+                    idx as f64,
+                    order.qty,
+                    order.price,
+                    order.order_type as usize as f64,
+                ]);
+            }
+        }
+    }
+    rows
+}
@@ -1,7 +1,6 @@
-use std::collections::HashMap;
 use std::fmt;
 
-#[derive(Debug)]
+#[derive(Debug, Clone)]
 pub struct ExchangeParams {
     pub qty_step: f64,
     pub price_step: f64,
@@ -27,6 +26,12 @@ pub struct BacktestParams {
     pub starting_balance: f64,
     pub maker_fee: f64,
     pub coins: Vec<String>,
+    /// The backtest stops early, returning an analysis marked as truncated, once its worst
+    /// drawdown, greatest equity/balance divergence or longest position holding time exceeds
+    /// the corresponding limit. Infinite limits disable early termination.
+    pub abort_drawdown_worst: f64,
+    pub abort_equity_balance_diff_neg_max: f64,
+    pub abort_position_held_hours_max: f64,
 }
 
 #[derive(Default, Debug, Clone, Copy)]
@@ -35,10 +40,217 @@ pub struct Position {
     pub price: f64,
 }
 
+/// Set of coin indices in `0..n_coins`, stored as a bitset.
+/// Iterates in ascending index order and does not allocate after construction.
+#[derive(Debug, Default, Clone)]
+pub struct CoinSet {
+    words: Vec<u64>,
+    len: usize,
+}
+
+impl CoinSet {
+    pub fn new(n_coins: usize) -> Self {
+        CoinSet {
+            words: vec![0; (n_coins + 63) / 64],
+            len: 0,
+        }
+    }
+
+    #[inline]
+    pub fn contains(&self, idx: usize) -> bool {
+        self.words[idx / 64] & (1u64 << (idx % 64)) != 0
+    }
+
+    /// Returns true if `idx` was not already present.
+    #[inline]
+    pub fn insert(&mut self, idx: usize) -> bool {
+        let bit = 1u64 << (idx % 64);
+        let word = &mut self.words[idx / 64];
+        if *word & bit != 0 {
+            return false;
+        }
+        *word |= bit;
+        self.len += 1;
+        true
+    }
+
+    /// Returns true if `idx` was present.
+    #[inline]
+    pub fn remove(&mut self, idx: usize) -> bool {
+        let bit = 1u64 << (idx % 64);
+        let word = &mut self.words[idx / 64];
+        if *word & bit == 0 {
+            return false;
+        }
+        *word &= !bit;
+        self.len -= 1;
+        true
+    }
+
+    #[inline]
+    pub fn len(&self) -> usize {
+        self.len
+    }
+
+    #[inline]
+    pub fn is_empty(&self) -> bool {
+        self.len == 0
+    }
+
+    pub fn clear(&mut self) {
+        self.words.iter_mut().for_each(|word| *word = 0);
+        self.len = 0;
+    }
+
+    /// Smallest index >= `start` in the set.
+    /// Lets callers walk the set while mutating the struct that owns it.
+    #[inline]
+    pub fn next_from(&self, start: usize) -> Option<usize> {
+        let mut w = start / 64;
+        if w >= self.words.len() {
+            return None;
+        }
+        let mut word = self.words[w] & (!0u64 << (start % 64));
+        loop {
+            if word != 0 {
+                return Some(w * 64 + word.trailing_zeros() as usize);
+            }
+            w += 1;
+            if w >= self.words.len() {
+                return None;
+            }
+            word = self.words[w];
+        }
+    }
+
+    pub fn iter(&self) -> CoinSetIter<'_> {
+        CoinSetIter { set: self, next: 0 }
+    }
+
+    /// Makes `self` equal to `other` without reallocating.
+    pub fn copy_from(&mut self, other: &CoinSet) {
+        self.words.copy_from_slice(&other.words);
+        self.len = other.len;
+    }
+
+    /// Removes every index not in `other`, calling `on_removed` for each one dropped.
+    pub fn retain_in(&mut self, other: &CoinSet, mut on_removed: impl FnMut(usize)) {
+        for (w, (word, &keep)) in self.words.iter_mut().zip(other.words.iter()).enumerate() {
+            let mut removed = *word & !keep;
+            while removed != 0 {
+                on_removed(w * 64 + removed.trailing_zeros() as usize);
+                removed &= removed - 1;
+                self.len -= 1;
+            }
+            *word &= keep;
+        }
+    }
+}
+
+pub struct CoinSetIter<'a> {
+    set: &'a CoinSet,
+    next: usize,
+}
+
+impl<'a> Iterator for CoinSetIter<'a> {
+    type Item = usize;
+
+    #[inline]
+    fn next(&mut self) -> Option<usize> {
+        let idx = self.set.next_from(self.next)?;
+        self.next = idx + 1;
+        Some(idx)
+    }
+}
+
+/// Positions for one side, one slot per coin. A coin has a position iff it is in `open`.
+#[derive(Debug, Default)]
+pub struct SidePositions {
+    slots: Vec<Position>,
+    open: CoinSet,
+}
+
+impl SidePositions {
+    pub fn new(n_coins: usize) -> Self {
+        SidePositions {
+            slots: vec![Position::default(); n_coins],
+            open: CoinSet::new(n_coins),
+        }
+    }
+
+    #[inline]
+    pub fn get(&self, idx: usize) -> Option<&Position> {
+        if self.open.contains(idx) {
+            Some(&self.slots[idx])
+        } else {
+            None
+        }
+    }
+
+    #[inline]
+    pub fn contains_key(&self, idx: usize) -> bool {
+        self.open.contains(idx)
+    }
+
+    /// Returns the position for `idx`, opening an empty one if there is none.
+    #[inline]
+    pub fn entry(&mut self, idx: usize) -> &mut Position {
+        if self.open.insert(idx) {
+            self.slots[idx] = Position::default();
+        }
+        &mut self.slots[idx]
+    }
+
+    #[inline]
+    pub fn remove(&mut self, idx: usize) {
+        if self.open.remove(idx) {
+            self.slots[idx] = Position::default();
+        }
+    }
+
+    #[inline]
+    pub fn len(&self) -> usize {
+        self.open.len()
+    }
+
+    /// Coin indices with an open position.
+    #[inline]
+    pub fn keys(&self) -> &CoinSet {
+        &self.open
+    }
+}
+
+impl std::ops::Index<usize> for SidePositions {
+    type Output = Position;
+
+    #[inline]
+    fn index(&self, idx: usize) -> &Position {
+        debug_assert!(self.open.contains(idx));
+        &self.slots[idx]
+    }
+}
+
+impl std::ops::IndexMut<usize> for SidePositions {
+    #[inline]
+    fn index_mut(&mut self, idx: usize) -> &mut Position {
+        debug_assert!(self.open.contains(idx));
+        &mut self.slots[idx]
+    }
+}
+
 #[derive(Debug, Default)]
 pub struct Positions {
-    pub long: HashMap<usize, Position>,
-    pub short: HashMap<usize, Position>,
+    pub long: SidePositions,
+    pub short: SidePositions,
+}
+
+impl Positions {
+    pub fn new(n_coins: usize) -> Self {
+        Positions {
+            long: SidePositions::new(n_coins),
+            short: SidePositions::new(n_coins),
+        }
+    }
 }
 
 #[derive(Debug, Default, Clone)]
@@ -173,6 +385,35 @@ pub enum OrderType {
     Empty,
 }
 
+impl OrderType {
+    /// Every order type, in declaration order, so that `ALL[order_type as usize] == order_type`.
+    pub const ALL: [OrderType; 23] = [
+        OrderType::EntryInitialNormalLong,
+        OrderType::EntryInitialPartialLong,
+        OrderType::EntryTrailingNormalLong,
+        OrderType::EntryTrailingCroppedLong,
+        OrderType::EntryGridNormalLong,
+        OrderType::EntryGridCroppedLong,
+        OrderType::EntryGridInflatedLong,
+        OrderType::CloseGridLong,
+        OrderType::CloseTrailingLong,
+        OrderType::CloseUnstuckLong,
+        OrderType::CloseAutoReduceLong,
+        OrderType::EntryInitialNormalShort,
+        OrderType::EntryInitialPartialShort,
+        OrderType::EntryTrailingNormalShort,
+        OrderType::EntryTrailingCroppedShort,
+        OrderType::EntryGridNormalShort,
+        OrderType::EntryGridCroppedShort,
+        OrderType::EntryGridInflatedShort,
+        OrderType::CloseGridShort,
+        OrderType::CloseTrailingShort,
+        OrderType::CloseUnstuckShort,
+        OrderType::CloseAutoReduceShort,
+        OrderType::Empty,
+    ];
+}
+
 impl fmt::Display for OrderType {
     fn fmt(&self, f: &mut fmt::Formatter) -> fmt::Result {
         match self {
@@ -249,6 +490,9 @@ pub struct Analysis {
     pub calmar_ratio_w: f64,
     pub sterling_ratio_w: f64,
     pub loss_profit_ratio_w: f64,
+
+    /// Whether the backtest stopped early at one of the `abort_*` limits of BacktestParams.
+    pub truncated: bool,
 }
 
 impl Default for Analysis {
@@ -283,6 +527,8 @@ impl Default for Analysis {
             calmar_ratio_w: 0.0,
             sterling_ratio_w: 0.0,
             loss_profit_ratio_w: 1.0,
+
+            truncated: false,
         }
     }
 }
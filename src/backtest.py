@@ -25,7 +25,12 @@ from pure_funcs import (
 )
 import pprint
 from copy import deepcopy
-from downloader import prepare_hlcvs, prepare_hlcvs_combined, add_all_eligible_coins_to_config
+from downloader import (
+    prepare_hlcvs,
+    prepare_hlcvs_combined,
+    add_all_eligible_coins_to_config,
+    create_temp_memmap,
+)
 from pathlib import Path
 from plotting import plot_fills_forager
 from collections import defaultdict
@@ -33,7 +38,10 @@ import matplotlib.pyplot as plt
 import logging
 from main import manage_rust_compilation
 import gzip
+import zlib
+import mmap
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 import tempfile
 from contextlib import contextmanager
@@ -45,8 +53,30 @@ logging.basicConfig(
 )
 
 
+HLCVS_CACHE_CHUNK_BYTES = 16 * 1024 * 1024  # uncompressed size of each compressed cache chunk
+
+
+def get_memmap_filename(hlcvs):
+    """
+    Returns the path of the file backing hlcvs if the Rust engine can map that file directly,
+    i.e. hlcvs is a whole C-ordered np.memmap starting at byte 0; else None.
+    """
+    if (
+        isinstance(hlcvs, np.memmap)
+        and isinstance(hlcvs.base, mmap.mmap)
+        and hlcvs.offset == 0
+        and hlcvs.flags.c_contiguous
+    ):
+        return hlcvs.filename
+    return None
+
+
 @contextmanager
 def create_shared_memory_file(hlcvs):
+    if mapped_file := get_memmap_filename(hlcvs):
+        # hlcvs memory-mapped from the cache: no need to copy it
+        yield mapped_file
+        return
     temp_file = tempfile.NamedTemporaryFile(delete=False)
     shared_memory_file = temp_file.name
     try:
@@ -57,6 +87,34 @@ def create_shared_memory_file(hlcvs):
         os.unlink(shared_memory_file)
 
 
+def build_forager_index(hlcvs):
+    """
+    Prefix sums used by the Rust engine to rank coins for forager mode.
+    Returns a float64 array of shape (n_timesteps + 1, n_coins, 2) where row k holds, per coin,
+    the sums over minutes 0..k of volume and of (high - low) / close.
+    """
+    index = np.zeros((hlcvs.shape[0] + 1, hlcvs.shape[1], 2), dtype=np.float64)
+    hlcvs = hlcvs.astype(np.float64, copy=False)
+    np.cumsum(hlcvs[:, :, 3], axis=0, out=index[1:, :, 0])
+    np.cumsum((hlcvs[:, :, 0] - hlcvs[:, :, 1]) / hlcvs[:, :, 2], axis=0, out=index[1:, :, 1])
+    return index
+
+
+def dump_coin_major_hlcvs(hlcvs, filepath):
+    """
+    Writes high, low and close of hlcvs to filepath in coin-major layout, i.e. as an array of
+    shape (n_coins, 3, n_timesteps) and hlcvs' dtype, which lets the Rust engine scan a single
+    coin's prices along the time axis in contiguous memory. Written one coin at a time.
+    """
+    coin_major = np.memmap(
+        filepath, dtype=hlcvs.dtype, mode="w+", shape=(hlcvs.shape[1], 3, hlcvs.shape[0])
+    )
+    for i in range(hlcvs.shape[1]):
+        coin_major[i] = hlcvs[:, i, :3].T
+    coin_major.flush()
+    del coin_major
+
+
 plt.rcParams["figure.figsize"] = [29, 18]
 
 
@@ -153,16 +211,80 @@ def get_cache_hash(config, exchange):
         "minimum_coin_age_days": config["live"]["minimum_coin_age_days"],
         "gap_tolerance_ohlcvs_minutes": config["backtest"]["gap_tolerance_ohlcvs_minutes"],
     }
+    if config["backtest"]["compact_hlcvs"]:
+        to_hash["hlcvs_dtype"] = "float32"
     return calc_hash(to_hash)
 
 
+def dump_hlcvs_cache(cache_dir, hlcvs, compress):
+    """
+    Writes hlcvs to cache_dir as a raw C-ordered array (hlcvs.bin) which is memory-mapped as is
+    when loaded, or, if compress, as independently zlib-compressed chunks of rows
+    (hlcvs.chunks) which can be decompressed in parallel. Shape, dtype and chunk offsets go to
+    hlcvs_meta.json, written last so that an interrupted dump is not mistaken for a cache.
+    """
+    hlcvs = np.ascontiguousarray(hlcvs)
+    meta = {"shape": list(hlcvs.shape), "dtype": hlcvs.dtype.str}
+    if compress:
+        fpath = cache_dir / "hlcvs.chunks"
+        row_nbytes = hlcvs[0].nbytes if len(hlcvs) else 1
+        chunk_rows = max(1, HLCVS_CACHE_CHUNK_BYTES // row_nbytes)
+        chunks = []
+        offset = 0
+        with open(fpath, "wb") as f:
+            for i in range(0, len(hlcvs), chunk_rows):
+                data = zlib.compress(hlcvs[i : i + chunk_rows].tobytes(), 1)
+                f.write(data)
+                chunks.append([offset, len(data)])
+                offset += len(data)
+        meta.update({"chunk_rows": chunk_rows, "chunks": chunks})
+    else:
+        fpath = cache_dir / "hlcvs.bin"
+        hlcvs.tofile(fpath)
+    json.dump(meta, open(cache_dir / "hlcvs_meta.json", "w"))
+    return fpath
+
+
+def load_hlcvs_cache(cache_dir):
+    """
+    Returns cached hlcvs as a read-only np.memmap. Uncompressed caches are mapped in place.
+    Compressed caches are decompressed chunk by chunk, in parallel, straight into a temporary
+    file which is removed at exit.
+    """
+    meta = json.load(open(cache_dir / "hlcvs_meta.json"))
+    shape, dtype = tuple(meta["shape"]), np.dtype(meta["dtype"])
+    if "chunks" not in meta:
+        return np.memmap(cache_dir / "hlcvs.bin", dtype=dtype, mode="r", shape=shape)
+    hlcvs = create_temp_memmap(shape, dtype)
+
+    def decompress_chunk(target, i):
+        offset, length = meta["chunks"][i]
+        with open(cache_dir / "hlcvs.chunks", "rb") as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(length))
+        chunk = np.frombuffer(data, dtype=dtype).reshape(-1, *shape[1:])
+        start = i * meta["chunk_rows"]
+        target[start : start + len(chunk)] = chunk
+
+    with ThreadPoolExecutor() as executor:
+        n_chunks = len(meta["chunks"])
+        list(executor.map(decompress_chunk, [hlcvs] * n_chunks, range(n_chunks)))
+    hlcvs.flush()
+    filename = hlcvs.filename
+    del hlcvs
+    return np.memmap(filename, dtype=dtype, mode="r", shape=shape)
+
+
 def load_coins_hlcvs_from_cache(config, exchange):
     cache_hash = get_cache_hash(config, exchange)
     cache_dir = Path("caches") / "hlcvs_data" / cache_hash[:16]
     if os.path.exists(cache_dir):
         coins = json.load(open(cache_dir / "coins.json"))
         mss = json.load(open(cache_dir / "market_specific_settings.json"))
-        if config["backtest"]["compress_cache"]:
+        if os.path.exists(cache_dir / "hlcvs_meta.json"):
+            logging.info(f"{exchange} Attempting to load hlcvs data from cache {cache_dir}...")
+            hlcvs = load_hlcvs_cache(cache_dir)
+        elif config["backtest"]["compress_cache"]:
             fname = cache_dir / "hlcvs.npy.gz"
             logging.info(f"{exchange} Attempting to load hlcvs data from cache {fname}...")
             with gzip.open(fname, "rb") as f:
@@ -178,27 +300,22 @@ def save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss):
     cache_hash = get_cache_hash(config, exchange)
     cache_dir = Path("caches") / "hlcvs_data" / cache_hash[:16]
     cache_dir.mkdir(parents=True, exist_ok=True)
-    if all([os.path.exists(cache_dir / x) for x in ["coins.json", "hlcvs.npy"]]):
+    if all([os.path.exists(cache_dir / x) for x in ["coins.json", "hlcvs_meta.json"]]):
         return
     logging.info(f"Dumping cache...")
     json.dump(coins, open(cache_dir / "coins.json", "w"))
     json.dump(mss, open(cache_dir / "market_specific_settings.json", "w"))
     uncompressed_size = hlcvs.nbytes
     sts = utc_ms()
+    logging.info(f"Attempting to save hlcvs data to cache {cache_dir}...")
+    fpath = dump_hlcvs_cache(cache_dir, hlcvs, config["backtest"]["compress_cache"])
     if config["backtest"]["compress_cache"]:
-        fpath = cache_dir / "hlcvs.npy.gz"
-        logging.info(f"Attempting to save hlcvs data to cache {fpath}...")
-        with gzip.open(fpath, "wb", compresslevel=1) as f:
-            np.save(f, hlcvs)
-        compressed_size = (cache_dir / "hlcvs.npy.gz").stat().st_size
+        compressed_size = fpath.stat().st_size
         line = (
             f"{compressed_size/(1024**3):.2f} GB compressed "
             f"({compressed_size/uncompressed_size*100:.1f}%)"
         )
     else:
-        fpath = cache_dir / "hlcvs.npy"
-        logging.info(f"Attempting to save hlcvs data to cache {fpath}...")
-        np.save(fpath, hlcvs)
         line = ""
     logging.info(
         f"Successfully dumped hlcvs cache {fpath}: "
@@ -234,6 +351,9 @@ async def prepare_hlcvs_mss(config, exchange):
     logging.info(f"Finished preparing hlcvs data for {exchange}. Shape: {hlcvs.shape}")
     try:
         cache_dir = save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss)
+        if cache_dir and not config["backtest"]["compress_cache"]:
+            # swap in the memory-mapped cache so it can be handed to Rust without a copy
+            hlcvs = load_hlcvs_cache(cache_dir)
     except Exception as e:
         logging.error(f"failed to save hlcvs to cache {e}")
         traceback.print_exc()
@@ -0,0 +1,120 @@
+import os
+import logging
+import numpy as np
+from uuid import uuid4
+from ohlcv_buffer import OHLCVBuffer
+from procedures import utc_ms
+
+
+class CandleCache:
+    """
+    Append-only on-disk cache of the 1m candles of one symbol, shared by processes without
+    locks. The cache is a directory of immutable segment files, each holding the candles of one
+    write, named "{write timestamp}_{random id}.npy". A segment is written to a temporary file
+    and renamed into place, so readers never see a partial segment, and a crashed writer leaves
+    at most a temporary file behind.
+
+    Segments are applied in name order, later candles of a minute overwriting earlier ones.
+    Readers only load the segments they haven't read yet. Once there are more than
+    max_n_segments segments, the writer merges them into one, named after the last merged
+    segment so it sorts before any segment written since, and keeps only the latest `capacity`
+    minutes.
+
+    If the cache is empty, the single .npy file of earlier versions at legacy_filepath, if any,
+    is imported as its first segment.
+    """
+
+    def __init__(self, dirpath, capacity, max_n_segments=32, legacy_filepath=None):
+        self.dirpath = dirpath
+        self.capacity = capacity
+        self.max_n_segments = max_n_segments
+        self.read_segments = set()
+        os.makedirs(dirpath, exist_ok=True)
+        if legacy_filepath and os.path.exists(legacy_filepath) and not self.list_segments():
+            try:
+                self.write_segment(
+                    f"{int(utc_ms()):013d}_{uuid4().hex}.npy", np.load(legacy_filepath)
+                )
+            except Exception as e:
+                logging.error(f"error importing {legacy_filepath} {e}")
+
+    def list_segments(self):
+        return sorted(
+            name
+            for name in os.listdir(self.dirpath)
+            if name.endswith(".npy") and not name.startswith(".")
+        )
+
+    def get_last_write_ts(self):
+        """Timestamp of the latest write by any process, 0 if the cache is empty."""
+        segments = self.list_segments()
+        return int(segments[-1].split("_")[0]) if segments else 0
+
+    def load_segments(self, segments):
+        loaded = []
+        for name in segments:
+            filepath = os.path.join(self.dirpath, name)
+            try:
+                loaded.append(np.load(filepath).reshape(-1, 6))
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                logging.error(f"removing corrupted candle cache segment {filepath} {e}")
+                os.remove(filepath)
+        return np.concatenate(loaded) if loaded else np.empty((0, 6))
+
+    def read(self, n_tries=3):
+        """
+        Returns the candles of the segments not read yet, oldest segment first. If segments
+        were merged since the last read, or one written earlier than the latest one read shows
+        up late, returns the candles of all segments instead, so they apply in order.
+        """
+        for i in range(n_tries):
+            segments = self.list_segments()
+            new_segments = [name for name in segments if name not in self.read_segments]
+            if new_segments and self.read_segments and new_segments[0] < max(self.read_segments):
+                new_segments = segments
+            try:
+                candles = self.load_segments(new_segments)
+            except FileNotFoundError:
+                continue  # merged and removed by another process meanwhile; list again
+            self.read_segments = set(segments)
+            return candles
+        raise Exception(f"segments of {self.dirpath} kept changing while reading")
+
+    def write(self, candles):
+        """Appends candles as a new segment."""
+        candles = np.asarray(candles, dtype=float).reshape(-1, 6)
+        if len(candles) == 0:
+            return
+        name = f"{int(utc_ms()):013d}_{uuid4().hex}.npy"
+        self.write_segment(name, candles)
+        self.read_segments.add(name)
+        if len(self.list_segments()) > self.max_n_segments:
+            self.merge()
+
+    def write_segment(self, name, candles):
+        tmp_filepath = os.path.join(self.dirpath, f".{name}.{uuid4().hex}.tmp")
+        with open(tmp_filepath, "wb") as f:
+            np.save(f, candles)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, os.path.join(self.dirpath, name))
+
+    def merge(self):
+        segments = self.list_segments()
+        try:
+            candles = self.load_segments(segments)
+        except FileNotFoundError:
+            return  # merged by another process meanwhile
+        buffer = OHLCVBuffer(self.capacity)
+        buffer.load(candles)
+        merged_name = f"{segments[-1][:-4]}_merged.npy"
+        self.write_segment(merged_name, buffer.to_array())
+        if self.read_segments.issuperset(segments):
+            self.read_segments = (self.read_segments - set(segments)) | {merged_name}
+        for name in segments:
+            try:
+                os.remove(os.path.join(self.dirpath, name))
+            except FileNotFoundError:
+                pass
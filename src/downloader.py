@@ -1,6 +1,9 @@
 import argparse
 import asyncio
+import atexit
+import copy
 import datetime
+import fcntl
 import gzip
 import json
 import logging
@@ -8,15 +11,16 @@ import inspect
 import os
 import shutil
 import sys
+import tempfile
 import traceback
 import zipfile
 from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from functools import wraps
 from io import BytesIO
-from pathlib import Path
 from time import time
 from typing import List, Dict, Any, Tuple
-from uuid import uuid4
 from urllib.request import urlopen
 from collections import defaultdict
 
@@ -25,8 +29,6 @@ import pprint
 import ccxt.async_support as ccxt
 import numpy as np
 import pandas as pd
-from dateutil import parser
-from tqdm import tqdm
 from pure_funcs import (
     date_to_ts,
     ts_to_date_utc,
@@ -55,6 +57,7 @@ logging.basicConfig(
 
 MAX_REQUESTS_PER_MINUTE = 120
 REQUEST_TIMESTAMPS = deque(maxlen=1000)  # for rate-limiting checks
+_temp_memmap_files = []
 
 # ========================= HELPER FUNCTIONS =========================
 
@@ -71,6 +74,28 @@ def get_function_name():
     return inspect.currentframe().f_back.f_code.co_name
 
 
+@atexit.register
+def remove_temp_memmap_files():
+    for fname in _temp_memmap_files:
+        try:
+            os.unlink(fname)
+        except OSError:
+            pass
+
+
+def create_temp_memmap(shape, dtype):
+    """Returns a zero-filled, writable np.memmap backed by a temporary file removed at exit."""
+    temp_file = tempfile.NamedTemporaryFile(delete=False)
+    temp_file.close()
+    _temp_memmap_files.append(temp_file.name)
+    return np.memmap(temp_file.name, dtype=dtype, mode="w+", shape=shape)
+
+
+def get_hlcvs_dtype(config):
+    """float32 if backtest.compact_hlcvs is set, else float64. The Rust engine reads both."""
+    return np.float32 if config["backtest"]["compact_hlcvs"] else np.float64
+
+
 def dump_ohlcv_data(data, filepath):
     columns = ["timestamp", "open", "high", "low", "close", "volume"]
     if isinstance(data, pd.DataFrame):
@@ -87,24 +112,21 @@ def deduplicate_rows(arr):
     Remove duplicate rows from a 2D NumPy array while preserving order.
 
     Parameters:
-    arr (numpy.ndarray): Input 2D array of shape (x, y)
+    arr (numpy.ndarray): Input 2D array of shape (x, y), first column being timestamps
 
     Returns:
     numpy.ndarray: Array with duplicate rows removed, maintaining original order
     """
-    # Convert rows to tuples for hashing
-    rows_as_tuples = map(tuple, arr)
-
-    # Keep track of seen rows while preserving order
-    seen = set()
-    unique_indices = [
-        i
-        for i, row_tuple in enumerate(rows_as_tuples)
-        if not (row_tuple in seen or seen.add(row_tuple))
-    ]
-
-    # Return array with only unique rows
-    return arr[unique_indices]
+    if arr.ndim != 2 or len(arr) < 2:
+        return arr
+    if (np.diff(arr[:, 0]) > 0).all():
+        # strictly increasing timestamps: no two rows can be equal
+        return arr
+    # index of the first occurrence of each unique row, in original order
+    _, unique_indices = np.unique(arr, axis=0, return_index=True)
+    if len(unique_indices) == len(arr):
+        return arr
+    return arr[np.sort(unique_indices)]
 
 
 def load_ohlcv_data(filepath: str) -> pd.DataFrame:
@@ -112,7 +134,7 @@ def load_ohlcv_data(filepath: str) -> pd.DataFrame:
     columns = ["timestamp", "open", "high", "low", "close", "volume"]
     arr_deduplicated = deduplicate_rows(arr)
     if len(arr) != len(arr_deduplicated):
-        dump_ohlcv_data(arr_deduplicated, filepath)
+        np.save(filepath, arr_deduplicated)
         print(
             f"Caught .npy file with duplicate rows: {filepath} Overwrote with deduplicated version."
         )
@@ -223,6 +245,183 @@ def ensure_millis(df):
     return df
 
 
+class OHLCVStore:
+    """
+    Consolidated 1m ohlcv store of a single coin on a single exchange.
+
+    Rows of [timestamp, open, high, low, close, volume] are appended to one float64 data file,
+    indexed by an ohlcvs_index.json mapping each day to its (row offset, n_rows) in that file.
+    Downloaders keep writing .npy files (daily, or monthly for binance) into the coin's directory;
+    these are ingested into the store and removed on the next lookup.
+
+    The index is kept compacted: days in ascending order, contiguous and with no dead rows, so that
+    any date range is a single slice of the memory-mapped data file. Appending days out of order,
+    e.g. when backfilling older history, or replacing a day rewrites the data file into a new
+    generation. The index is replaced atomically, which is the commit point of every change.
+
+    Several processes may share a store: ingesting and compacting hold an exclusive flock on a
+    lock file in the coin's directory, reading a shared one, and each reloads the index once
+    holding the lock.
+    """
+
+    INDEX_FILENAME = "ohlcvs_index.json"
+    LOCK_FILENAME = "ohlcvs.lock"
+    COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+    MS_PER_DAY = 1000 * 60 * 60 * 24
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        self.index_filepath = os.path.join(dirpath, self.INDEX_FILENAME)
+        self.index = self.load_index()
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        with open(os.path.join(self.dirpath, self.LOCK_FILENAME), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load_index(self):
+        if os.path.exists(self.index_filepath):
+            with open(self.index_filepath) as f:
+                return json.load(f)
+        return {"generation": 0, "n_rows": 0, "days": {}}
+
+    def dump_index(self, index):
+        tmp_filepath = self.index_filepath + ".tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_filepath, self.index_filepath)
+        self.index = index
+
+    def get_data_filepath(self, generation=None):
+        generation = self.index["generation"] if generation is None else generation
+        return os.path.join(self.dirpath, f"ohlcvs_{generation}.bin")
+
+    def get_days(self):
+        return self.index["days"]
+
+    def is_compacted(self, index):
+        offset = 0
+        for day in sorted(index["days"]):
+            start, n_rows = index["days"][day]
+            if start != offset:
+                return False
+            offset += n_rows
+        return offset == index["n_rows"]
+
+    def map_data(self):
+        if self.index["n_rows"] == 0:
+            return np.zeros((0, len(self.COLUMNS)))
+        return np.memmap(
+            self.get_data_filepath(),
+            dtype=np.float64,
+            mode="r",
+            shape=(self.index["n_rows"], len(self.COLUMNS)),
+        )
+
+    def ingest_new_files(self):
+        """
+        Moves any .npy files in the coin's directory into the store. Rows are split by day, sorted
+        and deduplicated by timestamp, keeping the first occurrence.
+        A day already in the store is replaced.
+        """
+        if not os.path.exists(self.dirpath):
+            return
+        with self.locked():
+            self.index = self.load_index()
+            self.ingest_new_files_locked()
+
+    def ingest_new_files_locked(self):
+        filenames = sorted(f for f in os.listdir(self.dirpath) if f.endswith(".npy"))
+        # month files first, as their days may be partial duplicates of day files
+        filenames = [f for f in filenames if len(f) == 11] + [f for f in filenames if len(f) != 11]
+        arrs, ingested = [], []
+        for f in filenames:
+            filepath = os.path.join(self.dirpath, f)
+            try:
+                arrs.append(load_ohlcv_data(filepath)[self.COLUMNS].values.astype(np.float64))
+                ingested.append(filepath)
+            except Exception as e:
+                logging.error(f"Error loading file {filepath}: {e}")
+        if not arrs:
+            return
+        new_rows = np.concatenate(arrs)
+        _, first_idxs = np.unique(new_rows[:, 0], return_index=True)
+        new_rows = new_rows[first_idxs]  # sorted by timestamp, first occurrence kept
+        day_ids = (new_rows[:, 0] // self.MS_PER_DAY).astype(np.int64)
+        split_idxs = np.flatnonzero(np.diff(day_ids)) + 1
+        new_days = {
+            ts_to_date_utc(int(day_ids[i]) * self.MS_PER_DAY)[:10]: (i, j)
+            for i, j in zip(np.r_[0, split_idxs], np.r_[split_idxs, len(new_rows)])
+        }
+
+        index = {
+            "generation": self.index["generation"],
+            "n_rows": self.index["n_rows"],
+            "days": dict(self.index["days"]),
+        }
+        for day, (i, j) in new_days.items():
+            index["days"][day] = [index["n_rows"] + int(i), int(j - i)]
+        index["n_rows"] += len(new_rows)
+        if self.is_compacted(index):
+            # append: drop any rows left by an interrupted append, then write the new ones
+            with open(self.get_data_filepath(), "ab") as f:
+                f.truncate(self.index["n_rows"] * new_rows.shape[1] * 8)
+                f.write(new_rows.tobytes())
+            self.dump_index(index)
+        else:
+            self.compact(new_rows, index)
+        for filepath in ingested:
+            os.remove(filepath)
+
+    def compact(self, new_rows, index):
+        """
+        Writes all days of index, in ascending order, into a new generation of the data file.
+        Offsets in index at or past the current n_rows refer to new_rows.
+        Called by ingest_new_files, holding the exclusive lock.
+        """
+        old_data = self.map_data()
+        old_filepath = self.get_data_filepath()
+        generation = self.index["generation"] + 1
+        compacted = {"generation": generation, "n_rows": 0, "days": {}}
+        with open(self.get_data_filepath(generation), "wb") as f:
+            for day in sorted(index["days"]):
+                start, n_rows = index["days"][day]
+                if start >= len(old_data):
+                    rows = new_rows[start - len(old_data) : start - len(old_data) + n_rows]
+                else:
+                    rows = old_data[start : start + n_rows]
+                f.write(np.ascontiguousarray(rows).tobytes())
+                compacted["days"][day] = [compacted["n_rows"], n_rows]
+                compacted["n_rows"] += n_rows
+        del old_data
+        self.dump_index(compacted)
+        try:
+            os.remove(old_filepath)
+        except OSError:
+            pass
+
+    def read(self, days):
+        """
+        Returns the rows of all stored days among days as a float64 array sorted by timestamp.
+        """
+        if not os.path.exists(self.dirpath):
+            return np.zeros((0, len(self.COLUMNS)))
+        # the shared lock keeps the data file from being compacted away while it is copied
+        with self.locked(exclusive=False):
+            self.index = self.load_index()
+            stored = sorted(day for day in days if day in self.index["days"])
+            if not stored:
+                return np.zeros((0, len(self.COLUMNS)))
+            start = self.index["days"][stored[0]][0]
+            end = sum(self.index["days"][stored[-1]])
+            # stored days are contiguous in a compacted store, making the range a single slice
+            return np.array(self.map_data()[start:end])
+
+
 class OHLCVManager:
     """
     Manages OHLCVs for multiple exchanges.
@@ -274,6 +473,15 @@ class OHLCVManager:
             self.end_date = format_end_date(self.end_date)
             self.end_ts = date_to_ts(self.end_date)
 
+    def with_date_range(self, new_start_date=None, new_end_date=None):
+        """
+        Returns a copy with its own date range, sharing markets, ccxt client and rate limiter
+        with self. Lets coins with different date ranges be fetched concurrently.
+        """
+        om = copy.copy(self)
+        om.update_date_range(new_start_date=new_start_date, new_end_date=new_end_date)
+        return om
+
     def get_symbol(self, coin):
         assert self.markets, "needs to call self.load_markets() first"
         return coin_to_symbol(
@@ -362,9 +570,7 @@ class OHLCVManager:
             return pd.DataFrame(columns=["timestamp", "open", "high", "low", "close", "volume"])
         if start_date or end_date:
             self.update_date_range(new_start_date=start_date, new_end_date=end_date)
-        missing_days = await self.get_missing_days_ohlcvs(coin)
-        if missing_days:
-            await self.download_ohlcvs(coin)
+        await self.download_missing_ohlcvs(coin)
         ohlcvs = await self.load_ohlcvs_from_cache(coin)
         ohlcvs.volume = ohlcvs.volume * ohlcvs.close  # use quote volume
         return ohlcvs
@@ -376,11 +582,19 @@ class OHLCVManager:
     async def get_missing_days_ohlcvs(self, coin):
         start_date = await self.get_start_date_modified(coin)
         days = get_days_in_between(start_date, self.end_date)
-        dirpath = os.path.join(self.cache_filepaths["ohlcvs"], coin)
-        if not os.path.exists(dirpath):
-            return days
-        all_files = os.listdir(dirpath)
-        return sorted([x for x in days if x + ".npy" not in all_files])
+        store = self.get_ohlcv_store(coin)
+        return sorted([x for x in days if x not in store.get_days()])
+
+    def get_ohlcv_store(self, coin):
+        """OHLCVStore of coin, with any newly downloaded files ingested."""
+        store = OHLCVStore(os.path.join(self.cache_filepaths["ohlcvs"], coin))
+        store.ingest_new_files()
+        return store
+
+    async def download_missing_ohlcvs(self, coin):
+        missing_days = await self.get_missing_days_ohlcvs(coin)
+        if missing_days:
+            await self.download_ohlcvs(coin)
 
     async def download_ohlcvs(self, coin):
         if not self.markets:
@@ -481,40 +695,18 @@ class OHLCVManager:
         Loads any cached ohlcv data for exchange, coin and date range from cache
         and *strictly* enforces no gaps. If any gap is found, return empty.
         """
-        dirpath = os.path.join(self.cache_filepaths["ohlcvs"], coin, "")
-        if not os.path.exists(dirpath):
-            return pd.DataFrame()
-
-        all_files = sorted([f for f in os.listdir(dirpath) if f.endswith(".npy")])
-        all_days = get_days_in_between(self.start_date, self.end_date)
-        all_months = sorted(set([x[:7] for x in all_days]))
+        return self.read_ohlcvs_from_cache(coin)
 
-        # Load month files first
-        files_to_load = [x for x in all_files if x.replace(".npy", "") in all_months]
-        # Add day files (exclude if they were loaded already as a month)
-        files_to_load += [
-            x for x in all_files if x.replace(".npy", "") in all_days and x not in files_to_load
-        ]
-
-        dfs = []
-        for f in files_to_load:
-            try:
-                filepath = os.path.join(dirpath, f)
-                df_part = load_ohlcv_data(filepath)
-                dfs.append(df_part)
-            except Exception as e:
-                logging.error(f"Error loading file {f}: {e}")
-
-        if not dfs:
+    def read_ohlcvs_from_cache(self, coin):
+        """
+        Synchronous load_ohlcvs_from_cache, also usable where there is no event loop,
+        e.g. in a worker process.
+        """
+        store = self.get_ohlcv_store(coin)
+        data = store.read(get_days_in_between(self.start_date, self.end_date))
+        if len(data) == 0:
             return pd.DataFrame()
-
-        # Concatenate, drop duplicates, sort by timestamp
-        df = (
-            pd.concat(dfs)
-            .drop_duplicates("timestamp")
-            .sort_values("timestamp")
-            .reset_index(drop=True)
-        )
+        df = pd.DataFrame(data, columns=OHLCVStore.COLUMNS)
         # ----------------------------------------------------------------------
         # 1) Clip to [start_ts, end_ts] and return
         # ----------------------------------------------------------------------
@@ -588,7 +780,7 @@ class OHLCVManager:
 
         # Convert any monthly data to daily data
         for f in os.listdir(dirpath):
-            if len(f) == 11:
+            if len(f) == 11 and f.endswith(".npy"):
                 df = load_ohlcv_data(os.path.join(dirpath, f))
 
                 df.loc[:, "datetime"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
@@ -931,42 +1123,35 @@ async def prepare_hlcvs_internal(config, coins, exchange, start_date, end_date,
 
     first_timestamps_unified = await get_first_timestamps_unified(coins)
 
-    # Create cache directory if it doesn't exist
-    cache_dir = Path(f"./caches/hlcvs_data/{uuid4().hex[:16]}")
-    cache_dir.mkdir(parents=True, exist_ok=True)
-
-    # First pass: Download data and store metadata
-    coin_metadata = {}
-
-    valid_coins = {}
-    global_start_time = float("inf")
-    global_end_time = float("-inf")
     await om.load_markets()
     min_coin_age_ms = 1000 * 60 * 60 * 24 * minimum_coin_age_days
+    max_concurrent = max(1, int(config["backtest"]["max_concurrent_ohlcv_fetches"]))
+    semaphore = asyncio.Semaphore(max_concurrent)
 
-    # First pass: Download and save data, collect metadata
-    for coin in coins:
+    async def get_adjusted_start_ts(coin):
+        # returns None if coin is to be skipped
         adjusted_start_ts = date_to_ts(start_date)
         if not om.has_coin(coin):
             logging.info(f"{exchange} coin {coin} missing, skipping")
-            continue
+            return None
         if coin not in first_timestamps_unified:
             logging.info(f"coin {coin} missing from first_timestamps_unified, skipping")
-            continue
+            return None
         if minimum_coin_age_days > 0.0:
-            first_ts = await om.get_first_timestamp(coin)
+            async with semaphore:
+                first_ts = await om.get_first_timestamp(coin)
             if first_ts >= end_ts:
                 logging.info(
                     f"{exchange} Coin {coin} too young, start date {ts_to_date_utc(first_ts)}. Skipping"
                 )
-                continue
+                return None
             first_ts_plus_min_coin_age = first_timestamps_unified[coin] + min_coin_age_ms
             if first_ts_plus_min_coin_age >= end_ts:
                 logging.info(
                     f"{exchange} Coin {coin}: Not traded due to min_coin_age {int(minimum_coin_age_days)} days"
                     f"{ts_to_date_utc(first_ts_plus_min_coin_age)}. Skipping"
                 )
-                continue
+                return None
             new_adjusted_start_ts = max(first_timestamps_unified[coin] + min_coin_age_ms, first_ts)
             if new_adjusted_start_ts > adjusted_start_ts:
                 logging.info(
@@ -974,81 +1159,115 @@ async def prepare_hlcvs_internal(config, coins, exchange, start_date, end_date,
                     f"to {ts_to_date_utc(new_adjusted_start_ts)}"
                 )
                 adjusted_start_ts = new_adjusted_start_ts
+        return adjusted_start_ts
+
+    adjusted_start_tss = await asyncio.gather(*[get_adjusted_start_ts(coin) for coin in coins])
+    candidates = [(c, ts) for c, ts in zip(coins, adjusted_start_tss) if ts is not None]
+    if not candidates:
+        raise ValueError("No valid coins found with data")
+
+    # All data lies within [start_date, end_date]. Allocate the unified array for that whole range
+    # up front, so each coin is written to its column by a worker process as soon as it is
+    # downloaded, while other coins are still downloading. Trimmed to the actual range at the end.
+    grid_start_ts = -(-date_to_ts(start_date) // interval_ms) * interval_ms
+    n_grid_timesteps = max(1, (end_ts - grid_start_ts) // interval_ms + 1)
+    unified_array = create_temp_memmap(
+        (n_grid_timesteps, len(candidates), 4), get_hlcvs_dtype(config)
+    )
+    loop = asyncio.get_running_loop()
+
+    async def fetch_and_load(i, coin, adjusted_start_ts):
         try:
-            om.update_date_range(adjusted_start_ts)
-            df = await om.get_ohlcvs(coin)
-            data = df[["timestamp", "high", "low", "close", "volume"]].values
+            om_coin = om.with_date_range(adjusted_start_ts)
+            async with semaphore:
+                await om_coin.download_missing_ohlcvs(coin)
+            return await loop.run_in_executor(
+                executor,
+                load_hlcvs_into_unified_array,
+                exchange,
+                coin,
+                om_coin.start_date,
+                om_coin.end_date,
+                om.gap_tolerance_ohlcvs_minutes,
+                unified_array.filename,
+                unified_array.shape,
+                unified_array.dtype.str,
+                grid_start_ts,
+                i,
+            )
         except Exception as e:
             logging.error(f"error with get_ohlcvs for {coin} {e}. Skipping")
             traceback.print_exc()
-            continue
-        if len(data) == 0:
-            continue
-
-        assert (np.diff(data[:, 0]) == interval_ms).all(), f"gaps in hlcv data {coin}"
-
-        # Save data to disk
-        file_path = cache_dir / f"{coin}.npy"
-        dump_ohlcv_data(data, file_path)
+            return None
 
-        # Update metadata
-        coin_metadata[coin] = {
-            "start_time": int(data[0, 0]),
-            "end_time": int(data[-1, 0]),
-            "length": len(data),
-        }
-
-        valid_coins[coin] = file_path
-        global_start_time = min(global_start_time, data[0, 0])
-        global_end_time = max(global_end_time, data[-1, 0])
+    logging.info(f"{exchange} Fetching and unifying data for {len(candidates)} coins...")
+    with ProcessPoolExecutor(max_workers=min(max_concurrent, os.cpu_count() or 1)) as executor:
+        tasks = [fetch_and_load(i, coin, ts) for i, (coin, ts) in enumerate(candidates)]
+        time_ranges = await asyncio.gather(*tasks)
 
-    if not valid_coins:
+    valid_idxs = [i for i, time_range in enumerate(time_ranges) if time_range is not None]
+    if not valid_idxs:
         raise ValueError("No valid coins found with data")
-
-    # Calculate dimensions for the unified array
-    n_timesteps = int((global_end_time - global_start_time) / interval_ms) + 1
-    n_coins = len(valid_coins)
-
-    # Create the timestamp array
+    global_start_time = min(time_ranges[i][0] for i in valid_idxs)
+    global_end_time = max(time_ranges[i][1] for i in valid_idxs)
     timestamps = np.arange(global_start_time, global_end_time + interval_ms, interval_ms)
 
-    # Pre-allocate the unified array
-    unified_array = np.zeros((n_timesteps, n_coins, 4))
-
-    # Second pass: Load data from disk and populate the unified array
-    logging.info(f"{exchange} Unifying data for {len(valid_coins)} coins into single numpy array...")
-    for i, coin in enumerate(tqdm(valid_coins, desc="Processing coins", unit="coin")):
-        file_path = valid_coins[coin]
-        ohlcv = np.load(file_path)
-
-        # Calculate indices
-        start_idx = int((ohlcv[0, 0] - global_start_time) / interval_ms)
-        end_idx = start_idx + len(ohlcv)
-
-        # Extract and process data
-        coin_data = ohlcv[:, 1:]
-
-        # Place the data in the unified array
-        unified_array[start_idx:end_idx, i, :] = coin_data
-
-        # Front-fill
-        if start_idx > 0:
-            unified_array[:start_idx, i, :3] = coin_data[0, 2]
+    start_idx = int((global_start_time - grid_start_ts) / interval_ms)
+    end_idx = start_idx + len(timestamps)
+    if len(valid_idxs) < len(candidates):
+        unified_array = unified_array[start_idx:end_idx, valid_idxs]
+    elif start_idx > 0 or end_idx < n_grid_timesteps:
+        unified_array = unified_array[start_idx:end_idx]
+    valid_coins = [candidates[i][0] for i in valid_idxs]
+    mss = {coin: om.get_market_specific_settings(coin) for coin in sorted(valid_coins)}
+    return mss, timestamps, unified_array
 
-        # Back-fill
-        if end_idx < n_timesteps:
-            unified_array[end_idx:, i, :3] = coin_data[-1, 2]
 
-        # Clean up temporary file
-        os.remove(file_path)
+def load_hlcvs_into_unified_array(
+    exchange,
+    coin,
+    start_date,
+    end_date,
+    gap_tolerance_ohlcvs_minutes,
+    unified_filename,
+    unified_shape,
+    unified_dtype,
+    grid_start_ts,
+    coin_idx,
+):
+    """
+    Worker process half of prepare_hlcvs_internal. Loads, gap fills and validates the cached ohlcvs
+    of coin and writes high, low, close and quote volume into column coin_idx of the memory-mapped
+    unified array, front- and back-filling prices over the rest of the column.
+    Returns the first and last timestamps of the data, or None if there is no data.
+    """
+    interval_ms = 60000
+    om = OHLCVManager(
+        exchange,
+        start_date,
+        end_date,
+        gap_tolerance_ohlcvs_minutes=gap_tolerance_ohlcvs_minutes,
+        verbose=False,
+    )
+    df = om.read_ohlcvs_from_cache(coin)
+    if len(df) == 0:
+        return None
+    df.volume = df.volume * df.close  # use quote volume
+    data = df[["timestamp", "high", "low", "close", "volume"]].values
+    assert (np.diff(data[:, 0]) == interval_ms).all(), f"gaps in hlcv data {coin}"
 
-    # Clean up cache directory if empty
-    try:
-        os.rmdir(cache_dir)
-    except OSError:
-        pass
-    mss = {coin: om.get_market_specific_settings(coin) for coin in sorted(valid_coins)}
-    return mss, timestamps, unified_array
+    unified_array = np.memmap(
+        unified_filename, dtype=unified_dtype, mode="r+", shape=tuple(unified_shape)
+    )
+    start_idx = int((data[0, 0] - grid_start_ts) / interval_ms)
+    end_idx = start_idx + len(data)
+    unified_array[start_idx:end_idx, coin_idx, :] = data[:, 1:]
+    if start_idx > 0:
+        unified_array[:start_idx, coin_idx, :3] = data[0, 3]
+    if end_idx < len(unified_array):
+        unified_array[end_idx:, coin_idx, :3] = data[-1, 3]
+    unified_array.flush()
+    return float(data[0, 0]), float(data[-1, 0])
 
 
 async def prepare_hlcvs_combined(config):
@@ -1239,7 +1458,7 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
     pprint.pprint(dict(exchange_volume_ratios_mapped))
 
     # We'll store [high, low, close, volume] in the last dimension
-    unified_array = np.zeros((n_timesteps, n_coins, 4), dtype=np.float64)
+    unified_array = np.zeros((n_timesteps, n_coins, 4), dtype=get_hlcvs_dtype(config))
 
     # For each coin i, reindex its DataFrame onto the full timestamps
     for i, coin in enumerate(valid_coins):
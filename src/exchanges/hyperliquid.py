@@ -405,6 +405,7 @@ class HyperliquidBot(Passivbot):
                             f"caught {elm['error']} {symbol}. Upping min_cost from {self.min_costs[symbol]} to {new_min_cost}"
                         )
                         self.min_costs[symbol] = new_min_cost
+                        self.batch_exchange_params.pop(symbol, None)
                         any_adjusted = True
         return any_adjusted
 
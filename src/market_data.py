@@ -0,0 +1,403 @@
+import os
+import math
+import asyncio
+import argparse
+import logging
+import threading
+import traceback
+from multiprocessing.managers import BaseManager
+from ohlcv_buffer import OHLCVBuffer
+from candle_cache import CandleCache
+from procedures import utc_ms, make_get_filepath
+from pure_funcs import get_template_live_config, symbol_to_coin
+
+
+def get_authkey_filepath(socket_path):
+    """
+    The service writes a random authkey to this file, readable only by its user, on start;
+    clients on the host must read it to connect.
+    """
+    return f"{socket_path}.key"
+
+
+class MarketDataManager(BaseManager):
+    pass
+
+
+class MarketData:
+    """
+    1m candles and tickers shared by the market data service with the bots on the host. Bots
+    subscribe to the symbols they need every few seconds; symbols not subscribed to by any bot
+    for subscription_timeout_ms are dropped. Methods are called from the manager's server
+    threads and from the service's event loop, so all access goes through lock.
+    """
+
+    def __init__(self, buffer_size, subscription_timeout_ms=1000 * 60 * 5):
+        self.buffer_size = buffer_size
+        self.subscription_timeout_ms = subscription_timeout_ms
+        self.lock = threading.Lock()
+        self.ohlcvs_1m = {}
+        self.tickers = {}
+        self.subscriptions = {}  # {client_id: (symbols, realtime_symbols, timestamp)}
+
+    def subscribe(self, client_id, symbols, realtime_symbols):
+        """
+        Candles of symbols are kept up to date by REST; those of realtime_symbols are also
+        watched by websocket.
+        """
+        with self.lock:
+            self.subscriptions[client_id] = (set(symbols), set(realtime_symbols), utc_ms())
+
+    def get_subscribed_symbols(self):
+        """Returns (symbols, realtime_symbols) subscribed to by any client."""
+        with self.lock:
+            now = utc_ms()
+            for client_id in list(self.subscriptions):
+                if now - self.subscriptions[client_id][2] > self.subscription_timeout_ms:
+                    del self.subscriptions[client_id]
+            symbols, realtime_symbols = set(), set()
+            for client_symbols, client_realtime_symbols, _ in self.subscriptions.values():
+                symbols |= client_symbols | client_realtime_symbols
+                realtime_symbols |= client_realtime_symbols
+            for symbol in set(self.ohlcvs_1m) - symbols:
+                del self.ohlcvs_1m[symbol]
+            return symbols, realtime_symbols
+
+    def update_ohlcvs_1m(self, symbol, candles):
+        with self.lock:
+            if symbol not in self.ohlcvs_1m:
+                self.ohlcvs_1m[symbol] = OHLCVBuffer(self.buffer_size)
+            self.ohlcvs_1m[symbol].update(candles)
+
+    def get_ohlcvs_1m(self, start_tss):
+        """
+        Takes {symbol: start_ts} and returns {symbol: candles from start_ts on} of the symbols
+        which have candles.
+        """
+        with self.lock:
+            return {
+                symbol: self.ohlcvs_1m[symbol].to_array(start_ts)
+                for symbol, start_ts in start_tss.items()
+                if symbol in self.ohlcvs_1m and self.ohlcvs_1m[symbol]
+            }
+
+    def get_last_ts(self, symbol):
+        with self.lock:
+            if symbol in self.ohlcvs_1m and self.ohlcvs_1m[symbol]:
+                return self.ohlcvs_1m[symbol].last_ts
+            return None
+
+    def get_all_ohlcvs_1m(self, symbol):
+        with self.lock:
+            return self.ohlcvs_1m[symbol].to_array()
+
+    def set_tickers(self, tickers):
+        with self.lock:
+            self.tickers = tickers
+
+    def get_tickers(self):
+        with self.lock:
+            return self.tickers
+
+
+class ExchangeFeed:
+    """Market data from an exchange, fetched through the sessions of a bot instance."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.exchange = bot.exchange
+
+    async def init(self):
+        await self.bot.determine_utc_offset(verbose=True)
+
+    def get_exchange_time(self):
+        return self.bot.get_exchange_time()
+
+    async def fetch_ohlcvs_1m(self, symbol, limit=None):
+        return await self.bot.fetch_ohlcvs_1m(symbol, limit=limit)
+
+    async def watch_ohlcv(self, symbol):
+        return await self.bot.ccp.watch_ohlcv(symbol)
+
+    async def fetch_tickers(self):
+        await self.bot.update_tickers()
+        return self.bot.tickers
+
+    async def close(self):
+        await self.bot.cca.close()
+        await self.bot.ccp.close()
+
+
+class LocalFeed:
+    """
+    Stand-in for ExchangeFeed which makes up deterministic candles, for running the service and
+    bots against it without network access. Prices of each symbol follow a sum of sines of the
+    minute, phase shifted by a hash of the symbol.
+    """
+
+    def __init__(self, symbols=None, watch_interval=1.0):
+        self.exchange = "local"
+        self.symbols = symbols or [f"{coin}/USDT:USDT" for coin in ["BTC", "ETH", "SOL"]]
+        self.watch_interval = watch_interval
+
+    async def init(self):
+        pass
+
+    def get_exchange_time(self):
+        return utc_ms()
+
+    def calc_close(self, symbol, minute):
+        phase = sum(map(ord, symbol)) % 100
+        return 100.0 * (1.0 + 0.01 * math.sin(minute / 37 + phase) + 0.005 * math.sin(minute / 5.3))
+
+    def make_candle(self, symbol, minute):
+        open_, close = self.calc_close(symbol, minute - 1), self.calc_close(symbol, minute)
+        volume = 1000.0 * (1.5 + math.sin(minute / 11 + len(symbol)))
+        return [
+            float(minute * 60000),
+            open_,
+            max(open_, close) * 1.001,
+            min(open_, close) * 0.999,
+            close,
+            volume,
+        ]
+
+    async def fetch_ohlcvs_1m(self, symbol, limit=None):
+        now_minute = int(self.get_exchange_time() // 60000)
+        limit = 1000 if limit is None else limit
+        return [self.make_candle(symbol, m) for m in range(now_minute - limit + 1, now_minute + 1)]
+
+    async def watch_ohlcv(self, symbol):
+        await asyncio.sleep(self.watch_interval)
+        return [self.make_candle(symbol, int(self.get_exchange_time() // 60000))]
+
+    async def fetch_tickers(self):
+        tickers = {}
+        for symbol in self.symbols:
+            last = self.make_candle(symbol, int(self.get_exchange_time() // 60000))[4]
+            tickers[symbol] = {"symbol": symbol, "last": last, "bid": last, "ask": last}
+        return tickers
+
+    async def close(self):
+        pass
+
+
+class MarketDataService:
+    """
+    Maintains 1m candles and tickers of one exchange for all bots on the host, and serves them
+    as a MarketData on a Unix socket. Candles are fetched by REST when a symbol is first
+    subscribed to and then every update_after_minutes, at most max_n_concurrent_updates
+    symbols at a time; candles of realtime symbols are also watched by websocket. Candles are
+    read from and written to the bots' candle caches in cache_dirpath, if given.
+    """
+
+    def __init__(
+        self,
+        feed,
+        socket_path,
+        buffer_size,
+        update_after_minutes=10.0,
+        tickers_interval_seconds=60.0,
+        cache_dirpath=None,
+        max_n_concurrent_updates=3,
+    ):
+        self.feed = feed
+        self.socket_path = socket_path
+        self.market_data = MarketData(buffer_size)
+        self.update_after_ms = 1000 * 60 * update_after_minutes
+        self.tickers_interval_ms = 1000 * tickers_interval_seconds
+        self.cache_dirpath = cache_dirpath
+        self.max_n_concurrent_updates = max_n_concurrent_updates
+        self.update_timestamps = {}
+        self.watch_tasks = {}
+        self.candle_caches = {}
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # left over from a service which didn't exit cleanly
+        authkey = os.urandom(32)
+        authkey_filepath = get_authkey_filepath(self.socket_path)
+        tmp_filepath = f"{authkey_filepath}.tmp"
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        with open(os.open(tmp_filepath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+            f.write(authkey)
+        os.replace(tmp_filepath, authkey_filepath)
+        MarketDataManager.register("get_market_data", callable=lambda: self.market_data)
+        # clients can run code in this process, so the socket, too, is for the service's user only
+        prev_umask = os.umask(0o177)
+        try:
+            self.server = MarketDataManager(address=self.socket_path, authkey=authkey).get_server()
+        finally:
+            os.umask(prev_umask)
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Serving {self.feed.exchange} market data on {self.socket_path}")
+
+    def get_candle_cache(self, symbol):
+        if symbol not in self.candle_caches:
+            coin = symbol_to_coin(symbol)
+            self.candle_caches[symbol] = CandleCache(
+                os.path.join(self.cache_dirpath, coin),
+                self.market_data.buffer_size,
+                legacy_filepath=os.path.join(self.cache_dirpath, f"{coin}.npy"),
+            )
+        return self.candle_caches[symbol]
+
+    async def update_ohlcvs_1m_single(self, symbol):
+        try:
+            if symbol not in self.update_timestamps and self.cache_dirpath is not None:
+                self.market_data.update_ohlcvs_1m(symbol, self.get_candle_cache(symbol).read())
+            last_ts = self.market_data.get_last_ts(symbol)
+            limit = None
+            if last_ts is not None:
+                now_minute = self.feed.get_exchange_time() // 60000 * 60000
+                limit = min(999, max(3, int(round((now_minute - last_ts) / 60000)) + 5))
+                if limit >= 999:
+                    limit = None
+            candles = await self.feed.fetch_ohlcvs_1m(symbol, limit=limit)
+            if len(candles) > 0:
+                self.market_data.update_ohlcvs_1m(symbol, candles)
+                if self.cache_dirpath is not None:
+                    self.get_candle_cache(symbol).write(candles)
+        except Exception as e:
+            logging.error(f"error updating ohlcvs_1m for {symbol} {e}")
+            traceback.print_exc()
+        self.update_timestamps[symbol] = utc_ms()
+
+    async def watch_ohlcv_1m_single(self, symbol):
+        while True:
+            try:
+                candles = await self.feed.watch_ohlcv(symbol)
+                self.market_data.update_ohlcvs_1m(symbol, candles)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"exception watch_ohlcv_1m_single {symbol} {e}")
+                await asyncio.sleep(1)
+
+    def update_watch_tasks(self, realtime_symbols):
+        for symbol in realtime_symbols - set(self.watch_tasks):
+            self.watch_tasks[symbol] = asyncio.create_task(self.watch_ohlcv_1m_single(symbol))
+        for symbol in set(self.watch_tasks) - realtime_symbols:
+            self.watch_tasks.pop(symbol).cancel()
+
+    async def update_tickers(self):
+        try:
+            self.market_data.set_tickers(await self.feed.fetch_tickers())
+        except Exception as e:
+            logging.error(f"error updating tickers {e}")
+
+    async def run(self):
+        await self.feed.init()
+        self.serve()
+        prev_tickers_ts = 0
+        prev_n_symbols = 0
+        while True:
+            symbols, realtime_symbols = self.market_data.get_subscribed_symbols()
+            if len(symbols) != prev_n_symbols:
+                logging.info(f"{len(symbols)} symbols subscribed, {len(realtime_symbols)} realtime")
+                prev_n_symbols = len(symbols)
+            self.update_watch_tasks(realtime_symbols)
+            for symbol in set(self.update_timestamps) - symbols:
+                del self.update_timestamps[symbol]
+            now = utc_ms()
+            symbols_too_old = sorted(
+                (self.update_timestamps.get(symbol, 0), symbol)
+                for symbol in symbols
+                if now - self.update_timestamps.get(symbol, 0) > self.update_after_ms
+            )
+            to_update = [symbol for _, symbol in symbols_too_old[: self.max_n_concurrent_updates]]
+            if to_update:
+                await asyncio.gather(*[self.update_ohlcvs_1m_single(s) for s in to_update])
+            if now - prev_tickers_ts > self.tickers_interval_ms:
+                await self.update_tickers()
+                prev_tickers_ts = now
+            await asyncio.sleep(1.0)
+
+    async def close(self):
+        for task in self.watch_tasks.values():
+            task.cancel()
+        await self.feed.close()
+        for filepath in [self.socket_path, get_authkey_filepath(self.socket_path)]:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+
+def connect_market_data(socket_path):
+    """Returns a proxy of the MarketData served on socket_path."""
+    with open(get_authkey_filepath(socket_path), "rb") as f:
+        authkey = f.read()
+    MarketDataManager.register("get_market_data")
+    manager = MarketDataManager(address=socket_path, authkey=authkey)
+    manager.connect()
+    return manager.get_market_data()
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        prog="market_data",
+        description="maintain 1m candles and tickers of one exchange for all bots on this host",
+    )
+    parser.add_argument(
+        "user", type=str, nargs="?", default=None, help="user from api-keys.json, for its exchange"
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        required=False,
+        default=None,
+        help="Unix socket path to serve on, set as live.market_data_socket in the bots' configs. "
+        "Default is caches/{exchange}/market_data.sock",
+    )
+    parser.add_argument(
+        "--local_feed",
+        action="store_true",
+        help="serve made up candles instead of the exchange's, for testing without network",
+    )
+    template = get_template_live_config("v7")
+    parser.add_argument(
+        "--ohlcvs_1m_rolling_window_days",
+        type=float,
+        default=template["live"]["ohlcvs_1m_rolling_window_days"],
+        help="days of candles to keep; set to the largest of the bots' values",
+    )
+    parser.add_argument(
+        "--ohlcvs_1m_update_after_minutes",
+        type=float,
+        default=template["live"]["ohlcvs_1m_update_after_minutes"],
+        help="minutes after which a symbol's candles are fetched again by REST",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+    if args.local_feed:
+        feed = LocalFeed()
+        cache_dirpath = None
+    else:
+        if args.user is None:
+            parser.error("user is required unless --local_feed is given")
+        from passivbot import setup_bot
+
+        template["live"]["user"] = args.user
+        feed = ExchangeFeed(setup_bot(template))
+        cache_dirpath = make_get_filepath(f"caches/{feed.exchange}/ohlcvs_1m/")
+    socket_path = args.socket or make_get_filepath(f"caches/{feed.exchange}/market_data.sock")
+    service = MarketDataService(
+        feed,
+        socket_path,
+        int(args.ohlcvs_1m_rolling_window_days * 60 * 24) + 1,
+        update_after_minutes=args.ohlcvs_1m_update_after_minutes,
+        cache_dirpath=cache_dirpath,
+    )
+    try:
+        await service.run()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,222 @@
+import numpy as np
+
+MINUTE_MS = 60000
+
+
+def calc_volume_contribs(rows):
+    """Quote volume, close * volume, of each row."""
+    return rows[:, 4] * rows[:, 5]
+
+
+def calc_noisiness_contribs(rows):
+    """(high - low) / close of each row, 0.0 where close is 0.0."""
+    return np.divide(
+        rows[:, 2] - rows[:, 3], rows[:, 4], out=np.zeros(len(rows)), where=rows[:, 4] != 0.0
+    )
+
+
+class OHLCVBuffer:
+    """
+    The latest `capacity` minutes of 1m candles [timestamp, open, high, low, close, volume] of one
+    symbol, with no gaps. Minute m is stored at row m % capacity of a fixed array, so appending a
+    candle or overwriting the current one is O(1), and the oldest minutes drop out as new ones
+    are appended. Missing minutes are filled with candles of the previous close and zero volume.
+
+    Cumulative sums of quote volume and noisiness are kept alongside, so their sums over the
+    latest n minutes are O(1) for any n.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.data = np.zeros((self.capacity, 6))
+        self.cum_volume = np.zeros(self.capacity)
+        self.cum_noisiness = np.zeros(self.capacity)
+        # cumulative sums of the minutes which have dropped out
+        self.cum_volume_offset = 0.0
+        self.cum_noisiness_offset = 0.0
+        self.first_minute = 0
+        self.last_minute = -1
+
+    def __len__(self):
+        return self.last_minute - self.first_minute + 1
+
+    def __bool__(self):
+        return len(self) > 0
+
+    @property
+    def first_ts(self):
+        return self.first_minute * MINUTE_MS
+
+    @property
+    def last_ts(self):
+        return self.last_minute * MINUTE_MS
+
+    def ring_idxs(self, first_minute, last_minute):
+        return np.arange(first_minute, last_minute + 1) % self.capacity
+
+    def first(self):
+        return self.data[self.first_minute % self.capacity].copy()
+
+    def last(self):
+        return self.data[self.last_minute % self.capacity].copy()
+
+    def to_array(self, start_ts=None):
+        """Candles from start_ts on, oldest first, as a new (n, 6) array."""
+        first_minute = self.first_minute
+        if start_ts is not None:
+            first_minute = max(first_minute, -(-int(start_ts) // MINUTE_MS))
+        if first_minute > self.last_minute:
+            return np.empty((0, 6))
+        return self.data[self.ring_idxs(first_minute, self.last_minute)]
+
+    def drop_until(self, first_minute):
+        """Drops the minutes before first_minute."""
+        first_minute = min(first_minute, self.last_minute + 1)
+        if first_minute <= self.first_minute:
+            return
+        idx = (first_minute - 1) % self.capacity
+        self.cum_volume_offset = self.cum_volume[idx]
+        self.cum_noisiness_offset = self.cum_noisiness[idx]
+        self.first_minute = first_minute
+
+    def trim(self, min_ts):
+        """Drops the candles older than min_ts."""
+        self.drop_until(-(-int(min_ts) // MINUTE_MS))
+
+    def load(self, rows):
+        """
+        Replaces the contents with rows, given in any order; of rows of the same minute, the last
+        one is kept.
+        """
+        rows = np.asarray(rows, dtype=float).reshape(-1, 6)
+        if len(rows) == 0:
+            self.first_minute, self.last_minute = 0, -1
+            return
+        minutes = (rows[:, 0] // MINUTE_MS).astype(np.int64)
+        order = np.argsort(minutes, kind="stable")
+        minutes, rows = minutes[order], rows[order]
+        is_last_of_minute = np.append(minutes[1:] != minutes[:-1], True)
+        minutes, rows = minutes[is_last_of_minute], rows[is_last_of_minute]
+        last_minute = int(minutes[-1])
+        first_minute = max(int(minutes[0]), last_minute - self.capacity + 1)
+        n_dropped = int(np.searchsorted(minutes, first_minute))
+        if n_dropped > 0:
+            if minutes[n_dropped] != first_minute:
+                # keep the close of the last dropped candle for the gap it leaves
+                close = rows[n_dropped - 1, 4]
+                gap_row = [[float(first_minute * MINUTE_MS), close, close, close, close, 0.0]]
+                minutes = np.concatenate([[first_minute], minutes[n_dropped:]])
+                rows = np.concatenate([gap_row, rows[n_dropped:]])
+            else:
+                minutes, rows = minutes[n_dropped:], rows[n_dropped:]
+
+        n = last_minute - first_minute + 1
+        positions = minutes - first_minute
+        present = np.zeros(n, dtype=bool)
+        present[positions] = True
+        # index into rows of the latest present candle at or before each minute
+        prev_row_idxs = np.cumsum(present) - 1
+        filled = np.repeat(rows[prev_row_idxs, 4:5], 6, axis=1)
+        filled[:, 0] = (np.arange(first_minute, last_minute + 1) * MINUTE_MS).astype(float)
+        filled[:, 5] = 0.0
+        filled[positions] = rows
+
+        idxs = self.ring_idxs(first_minute, last_minute)
+        self.data[idxs] = filled
+        self.cum_volume[idxs] = np.cumsum(calc_volume_contribs(filled))
+        self.cum_noisiness[idxs] = np.cumsum(calc_noisiness_contribs(filled))
+        self.cum_volume_offset = self.cum_noisiness_offset = 0.0
+        self.first_minute, self.last_minute = first_minute, last_minute
+
+    def update(self, rows):
+        """Inserts or overwrites candles, given in any order."""
+        rows = np.asarray(rows, dtype=float).reshape(-1, 6)
+        if len(rows) == 0:
+            return
+        min_minute = int(rows[:, 0].min() // MINUTE_MS)
+        max_minute = int(rows[:, 0].max() // MINUTE_MS)
+        if (
+            not self
+            or len(rows) > self.capacity // 2
+            or (
+                min_minute < self.first_minute
+                and max(max_minute, self.last_minute) - min_minute < self.capacity
+            )
+        ):
+            # bulk load, or older candles which still fit: merge and rebuild
+            self.load(np.concatenate([self.to_array(), rows]) if self else rows)
+            return
+        for row in rows[np.argsort(rows[:, 0], kind="stable")]:
+            self.upsert(row)
+
+    def upsert(self, row):
+        """Appends a candle, or overwrites the candle of the same minute."""
+        row = np.asarray(row, dtype=float)
+        minute = int(row[0] // MINUTE_MS)
+        if not self:
+            self.load(row[None, :])
+        elif minute - self.last_minute >= self.capacity:
+            # every candle drops out; the buffer starts with a gap filled from the last close
+            close = self.data[self.last_minute % self.capacity, 4]
+            gap_ts = float((minute - self.capacity + 1) * MINUTE_MS)
+            self.load([[gap_ts, close, close, close, close, 0.0], row])
+        elif minute > self.last_minute:
+            prev = self.last_minute % self.capacity
+            self.drop_until(minute - self.capacity + 1)
+            gap_idxs = self.ring_idxs(self.last_minute + 1, minute - 1)
+            if len(gap_idxs) > 0:
+                self.data[gap_idxs, 1:5] = self.data[prev, 4]
+                self.data[gap_idxs, 5] = 0.0
+                self.data[gap_idxs, 0] = (
+                    np.arange(self.last_minute + 1, minute) * MINUTE_MS
+                ).astype(float)
+                self.cum_volume[gap_idxs] = self.cum_volume[prev]
+                self.cum_noisiness[gap_idxs] = self.cum_noisiness[prev]
+            idx = minute % self.capacity
+            self.data[idx] = row
+            self.cum_volume[idx] = self.cum_volume[prev] + calc_volume_contribs(row[None, :])[0]
+            self.cum_noisiness[idx] = (
+                self.cum_noisiness[prev] + calc_noisiness_contribs(row[None, :])[0]
+            )
+            self.last_minute = minute
+        elif minute >= self.first_minute:
+            idx = minute % self.capacity
+            old = self.data[idx : idx + 1]
+            delta_volume = calc_volume_contribs(row[None, :])[0] - calc_volume_contribs(old)[0]
+            delta_noisiness = (
+                calc_noisiness_contribs(row[None, :])[0] - calc_noisiness_contribs(old)[0]
+            )
+            self.data[idx] = row
+            if delta_volume != 0.0 or delta_noisiness != 0.0:
+                idxs = self.ring_idxs(minute, self.last_minute)
+                self.cum_volume[idxs] += delta_volume
+                self.cum_noisiness[idxs] += delta_noisiness
+        elif self.last_minute - minute < self.capacity:
+            self.load(np.concatenate([self.to_array(), row[None, :]]))
+        # candles too old to fit are ignored
+
+    def fill_until(self, ts):
+        """Appends candles of the last close up to and including the minute of ts."""
+        minute = int(ts // MINUTE_MS)
+        if self and minute > self.last_minute:
+            close = self.data[self.last_minute % self.capacity, 4]
+            self.upsert([float(minute * MINUTE_MS), close, close, close, close, 0.0])
+
+    def window_sum(self, cum, offset, n):
+        n = min(int(n), len(self))
+        if n <= 0:
+            return 0.0
+        start_minute = self.last_minute - n
+        start = cum[start_minute % self.capacity] if start_minute >= self.first_minute else offset
+        return float(cum[self.last_minute % self.capacity] - start)
+
+    def sum_volume(self, n):
+        """Sum of quote volume over the latest n minutes."""
+        return self.window_sum(self.cum_volume, self.cum_volume_offset, n)
+
+    def mean_noisiness(self, n):
+        """Mean of (high - low) / close over the latest n minutes."""
+        n = min(int(n), len(self))
+        if n <= 0:
+            return 0.0
+        return self.window_sum(self.cum_noisiness, self.cum_noisiness_offset, n) / n
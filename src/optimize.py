@@ -7,10 +7,17 @@ import argparse
 import multiprocessing
 import subprocess
 import mmap
+import queue
+import threading
 from multiprocessing import Queue, Process
-from collections import defaultdict
+from multiprocessing.managers import BaseManager, DictProxy
+from collections import defaultdict, OrderedDict
 from backtest import (
     prepare_hlcvs_mss,
+    build_forager_index,
+    dump_coin_major_hlcvs,
+    get_memmap_filename,
+    get_cache_hash,
     prep_backtest_args,
     expand_analysis,
 )
@@ -35,6 +42,7 @@ from procedures import (
 )
 from downloader import add_all_eligible_coins_to_config
 from copy import deepcopy
+from functools import partial
 from main import manage_rust_compilation
 import numpy as np
 from uuid import uuid4
@@ -46,57 +54,36 @@ from deap import base, creator, tools, algorithms
 from contextlib import contextmanager
 import tempfile
 import time
+import pickle
+import random
 import fcntl
 from tqdm import tqdm
-import dictdiffer
+from results_store import ResultsWriter, is_results_store
+from pareto import pareto_front_mask
 
 
-def make_json_serializable(obj):
-    """
-    Recursively convert tuples in the object to lists to make it JSON serializable.
-    """
-    if isinstance(obj, dict):
-        return {k: make_json_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, tuple):
-        return [make_json_serializable(e) for e in obj]
-    elif isinstance(obj, list):
-        return [make_json_serializable(e) for e in obj]
-    else:
-        return obj
-
-
-def results_writer_process(queue: Queue, results_filename: str, compress=True):
+def results_writer_process(results_queue: Queue, results_filename: str, compress=True):
     """
     Manager process that handles writing results to file.
     Runs in a separate process and receives results through a queue.
-    Applies diffing to the entire data dictionary.
+    Results are appended to a columnar store (see results_store.py) in chunks, flushed whenever
+    the queue has been idle for a while so that little is lost if the optimizer is killed.
     """
-    prev_data = None  # Initialize previous data as None
     try:
+        writer = ResultsWriter(results_filename, compress=compress)
         while True:
-            data = queue.get()
+            try:
+                data = results_queue.get(timeout=10.0)
+            except queue.Empty:
+                writer.flush()
+                continue
             if data == "DONE":  # Sentinel value to signal shutdown
                 break
             try:
-                if prev_data is None or not compress:
-                    # First data entry or compression disabled, write full data
-                    output_data = data
-                else:
-                    # Compute diff of the entire data dictionary
-                    diff = list(dictdiffer.diff(prev_data, data))
-                    for i in range(len(diff)):
-                        if diff[i][0] == "change":
-                            diff[i] = [diff[i][1], diff[i][2][1]]
-                    output_data = {"diff": make_json_serializable(diff)}
-
-                prev_data = data
-
-                # Write to disk
-                with open(results_filename, "a") as f:
-                    json.dump(denumpyize(output_data), f)
-                    f.write("\n")
+                writer.append(data)
             except Exception as e:
                 logging.error(f"Error writing results: {e}")
+        writer.flush()
     except Exception as e:
         logging.error(f"Results writer process error: {e}")
 
@@ -128,6 +115,35 @@ def create_shared_memory_file(hlcvs):
     return shared_memory_file
 
 
+def create_shared_memory_files(hlcvs, exchange, temp_files):
+    """
+    Returns (hlcvs file, forager index file, coin-major hlcvs file) for the Rust engine to map.
+    hlcvs memory-mapped from the cache is used in place; files created here are appended to
+    temp_files for removal.
+    """
+    forager_index = build_forager_index(hlcvs)
+    shared_memory_file = get_memmap_filename(hlcvs)
+    coin_major_nbytes = hlcvs.nbytes // hlcvs.shape[2] * 3
+    required_space = (forager_index.nbytes + coin_major_nbytes) * 1.1  # Add 10% buffer
+    if shared_memory_file is None:
+        required_space += hlcvs.nbytes * 1.1
+    check_disk_space(tempfile.gettempdir(), required_space)
+    if shared_memory_file:
+        logging.info(f"Using memory-mapped hlcvs cache for {exchange}: {shared_memory_file}")
+    else:
+        logging.info(f"Starting to create shared memory file for {exchange}...")
+        shared_memory_file = create_shared_memory_file(hlcvs)
+        temp_files.append(shared_memory_file)
+        logging.info(f"Finished creating shared memory file for {exchange}: {shared_memory_file}")
+    forager_index_file = create_shared_memory_file(forager_index)
+    temp_files.append(forager_index_file)
+    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+        coin_major_file = temp_file.name
+    temp_files.append(coin_major_file)
+    dump_coin_major_hlcvs(hlcvs, coin_major_file)
+    return shared_memory_file, forager_index_file, coin_major_file
+
+
 def check_disk_space(path, required_space):
     total, used, free = shutil.disk_usage(path)
     logging.info(
@@ -219,6 +235,27 @@ def cxSimulatedBinaryBoundedWrapper(ind1, ind2, eta, low, up):
     return ind1, ind2
 
 
+class FastParetoFront(tools.ParetoFront):
+    """
+    tools.ParetoFront whose update finds the non-dominated individuals among the front and the
+    new population with one pareto_front_mask call, instead of comparing each new individual
+    with every member of the front in Python.
+    """
+
+    def update(self, population):
+        candidates = list(self) + list(population)
+        n_members = len(self)
+        mask = pareto_front_mask(-np.array([ind.fitness.wvalues for ind in candidates]))
+        for i in reversed(range(n_members)):
+            if not mask[i]:
+                self.remove(i)
+        seen = {tuple(member) for member in self}
+        for ind, keep in zip(candidates[n_members:], mask[n_members:]):
+            if keep and tuple(ind) not in seen:
+                seen.add(tuple(ind))
+                self.insert(ind)
+
+
 def individual_to_config(individual, template=None):
     if template is None:
         template = get_template_live_config("v7")
@@ -280,10 +317,124 @@ def managed_mmap(filename, dtype, shape):
             del mmap
 
 
+class EvaluationCache:
+    """
+    LRU cache of analyses keyed by the hash of a candidate's bot config, persisted to a jsonl
+    file so that repeated or resumed optimize runs over the same data skip known candidates.
+    Analyses are cached rather than fitness, which is recomputed with the current limits and
+    scoring. maxsize 0 disables the cache.
+    """
+
+    def __init__(self, filepath, maxsize):
+        self.filepath = filepath
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        if maxsize > 0 and os.path.exists(filepath):
+            self.load()
+
+    def load(self):
+        n_lines = 0
+        with open(self.filepath) as f:
+            for line in f:
+                try:
+                    key, analyses = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by an interrupted run
+                self.entries[key] = analyses
+                self.entries.move_to_end(key)
+                n_lines += 1
+        self.evict()
+        if n_lines > len(self.entries) * 2:
+            # drop evicted and duplicate entries from the file
+            tmp_filepath = f"{self.filepath}.tmp"
+            with open(tmp_filepath, "w") as f:
+                for item in self.entries.items():
+                    f.write(json.dumps(item) + "\n")
+            os.replace(tmp_filepath, self.filepath)
+        logging.info(f"Loaded {len(self.entries)} cached evaluations from {self.filepath}")
+
+    def evict(self):
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, analyses_by_key):
+        if self.maxsize <= 0:
+            return
+        with open(self.filepath, "a") as f:
+            for item in analyses_by_key.items():
+                f.write(json.dumps(item) + "\n")
+        self.entries.update(analyses_by_key)
+        for key in analyses_by_key:
+            self.entries.move_to_end(key)
+        self.evict()
+
+
+# added to the fitness of truncated backtests; far above the penalty of any complete backtest
+TRUNCATED_FITNESS_OFFSET = 1e15
+
+
+def get_early_termination_params(config):
+    """
+    Returns the backtest params which make the Rust engine stop a backtest once a metric exceeds
+    early_termination_factor times its lower bound in optimize.limits.
+    """
+    factor = config["optimize"]["early_termination_factor"]
+    if factor <= 0.0:
+        return {}
+    limits = config["optimize"]["limits"]
+    return {
+        f"abort_{key}": limits[f"lower_bound_{key}"] * factor
+        for key in ["drawdown_worst", "equity_balance_diff_neg_max", "position_held_hours_max"]
+    }
+
+
+def rank_below(fitnesses, eliminated):
+    """
+    Assigns fitnesses to configs eliminated during screening, given as a list of {key: fitness}
+    per round, such that configs eliminated in a round rank worse than every config which
+    survived it, while keeping their relative order within the round.
+    Returns {key: fitness}.
+    """
+    ranked = {}
+    for round_fitnesses in reversed(eliminated):
+        if not round_fitnesses:
+            continue
+        mins = np.min(list(round_fitnesses.values()), axis=0)
+        if fitnesses:
+            # strictly above the worst survivor in each objective, not tied with it
+            floor = np.max(fitnesses, axis=0)
+            floor = floor + np.abs(floor) * 1e-9 + 1e-12
+        else:
+            floor = mins
+        fitnesses = []
+        for key, fitness in round_fitnesses.items():
+            ranked[key] = tuple(float(x) for x in floor + (np.array(fitness) - mins))
+            fitnesses.append(ranked[key])
+    return ranked
+
+
 class Evaluator:
-    def __init__(self, shared_memory_files, hlcvs_shapes, hlcvs_dtypes, config, msss, results_queue):
+    def __init__(
+        self,
+        shared_memory_files,
+        hlcvs_shapes,
+        hlcvs_dtypes,
+        config,
+        msss,
+        results_queue,
+        forager_index_files=None,
+        coin_major_files=None,
+    ):
         logging.info("Initializing Evaluator...")
         self.shared_memory_files = shared_memory_files
+        self.forager_index_files = forager_index_files or {}
+        self.coin_major_files = coin_major_files or {}
         self.hlcvs_shapes = hlcvs_shapes
         self.hlcvs_dtypes = hlcvs_dtypes
         self.msss = msss
@@ -304,14 +455,98 @@ class Evaluator:
             _, self.exchange_params[exchange], self.backtest_params[exchange] = prep_backtest_args(
                 config, self.msss[exchange], exchange
             )
+            self.backtest_params[exchange].update(get_early_termination_params(config))
             logging.info(f"mmap_context entered successfully for {exchange}.")
 
         self.config = config
         logging.info("Evaluator initialization complete.")
         self.results_queue = results_queue
 
+    def calc_cache_key(self, config):
+        """
+        Key of config in the evaluation cache: the hash of its bot params rounded to
+        optimize.round_to_n_significant_digits, so that configs differing only beyond that
+        precision share one backtest. The configs themselves are backtested unrounded.
+        """
+        n_digits = self.config["optimize"]["round_to_n_significant_digits"]
+        rounded = {
+            pside: {
+                key: pbr.round_dynamic(value, n_digits) if isinstance(value, float) else value
+                for key, value in config["bot"][pside].items()
+            }
+            for pside in config["bot"]
+        }
+        return calc_hash(rounded)
+
     def evaluate(self, individual):
         config = individual_to_config(individual, template=self.config)
+        return self.finalize_evaluation(config, self.run_backtests(config))
+
+    def evaluate_population(self, individuals, map_configs, cache):
+        """
+        Evaluates individuals, backtesting with map_configs (a function mapping a list of configs
+        and a fidelity to a list of analyses) only those whose cache key (see calc_cache_key) is
+        neither in the population twice nor in cache, an EvaluationCache.
+        With optimize.screening_fidelities set, new configs are screened first; see screen_configs.
+        """
+        configs = [
+            individual_to_config(individual, template=self.config) for individual in individuals
+        ]
+        keys = [self.calc_cache_key(config) for config in configs]
+        analyses = {key: cached for key in keys if (cached := cache.get(key)) is not None}
+        to_backtest = {key: config for key, config in zip(keys, configs) if key not in analyses}
+        to_backtest, eliminated = self.screen_configs(to_backtest, map_configs)
+        if to_backtest:
+            new_analyses = dict(zip(to_backtest, map_configs(list(to_backtest.values()), 1.0)))
+            cache.put(new_analyses)
+            analyses.update(new_analyses)
+        fitnesses = {
+            key: self.finalize_evaluation(config, analyses[key])
+            for config, key in zip(configs, keys)
+            if key in analyses
+        }
+        fitnesses.update(rank_below(list(fitnesses.values()), eliminated))
+        return [fitnesses[key] for key in keys]
+
+    def screen_configs(self, configs_by_key, map_configs):
+        """
+        Successive halving: backtests configs over the last fraction of the date range given by
+        each of optimize.screening_fidelities in turn, keeping the top
+        optimize.screening_keep_fraction of them by NSGA-II selection after each round.
+        Returns the configs which survived all rounds and, for each round, the fitnesses of the
+        configs eliminated in it.
+        """
+        eliminated = []
+        keep_fraction = self.config["optimize"]["screening_keep_fraction"]
+        for fidelity in self.config["optimize"]["screening_fidelities"]:
+            n_keep = max(1, int(np.ceil(len(configs_by_key) * keep_fraction)))
+            if n_keep >= len(configs_by_key):
+                break
+            results = map_configs(list(configs_by_key.values()), fidelity)
+            candidates = []
+            for key, analyses in zip(configs_by_key, results):
+                candidate = creator.Individual([key])
+                candidate.fitness.values = self.calc_fitness(self.combine_analyses(analyses))
+                candidates.append(candidate)
+            kept = {candidate[0] for candidate in tools.selNSGA2(candidates, n_keep)}
+            eliminated.append(
+                {
+                    candidate[0]: candidate.fitness.values
+                    for candidate in candidates
+                    if candidate[0] not in kept
+                }
+            )
+            configs_by_key = {key: configs_by_key[key] for key in configs_by_key if key in kept}
+        return configs_by_key, eliminated
+
+    def get_first_timestep(self, exchange, fidelity):
+        """First timestep of the last fraction fidelity of the exchange's date range."""
+        n_timesteps = self.hlcvs_shapes[exchange][0]
+        if fidelity >= 1.0:
+            return 0
+        return n_timesteps - max(2, int(round(n_timesteps * fidelity)))
+
+    def run_backtests(self, config, fidelity=1.0):
         analyses = {}
         for exchange in self.exchanges:
             bot_params, _, _ = prep_backtest_args(
@@ -328,9 +563,69 @@ class Evaluator:
                 bot_params,
                 self.exchange_params[exchange],
                 self.backtest_params[exchange],
+                return_fills=False,
+                return_equities=False,
+                forager_index_file=self.forager_index_files.get(exchange),
+                coin_major_file=self.coin_major_files.get(exchange),
+                first_timestep=self.get_first_timestep(exchange, fidelity),
             )
             analyses[exchange] = expand_analysis(analysis, fills, config)
+        return analyses
+
+    def run_backtests_batch(self, configs, fidelity=1.0):
+        """
+        Backtests configs with one pbr.run_backtest_batch call per exchange.
+        The Rust side maps the shared memory file once and runs the backtests on
+        n_cpus threads, returning only the analyses.
+        With fidelity < 1.0, only the last fraction fidelity of the date range is backtested.
+        """
+        analyses = [{} for _ in configs]
+        for exchange in self.exchanges:
+            bot_params_list = [
+                prep_backtest_args(
+                    config,
+                    [],
+                    exchange,
+                    exchange_params=self.exchange_params[exchange],
+                    backtest_params=self.backtest_params[exchange],
+                )[0]
+                for config in configs
+            ]
+            batch_analyses = pbr.run_backtest_batch(
+                self.shared_memory_files[exchange],
+                self.shared_hlcvs_np[exchange].shape,
+                self.shared_hlcvs_np[exchange].dtype.str,
+                bot_params_list,
+                self.exchange_params[exchange],
+                self.backtest_params[exchange],
+                self.config["optimize"]["n_cpus"],
+                forager_index_file=self.forager_index_files.get(exchange),
+                coin_major_file=self.coin_major_files.get(exchange),
+                first_timestep=self.get_first_timestep(exchange, fidelity),
+            )
+            for i, analysis in enumerate(batch_analyses):
+                analyses[i][exchange] = expand_analysis(analysis, [], configs[i])
+        return analyses
+
+    def get_data_hash(self):
+        """
+        Hash of everything besides the bot config which determines the analyses: the backtest
+        data and the exchange and backtest params.
+        """
+        return calc_hash(
+            denumpyize(
+                {
+                    exchange: [
+                        get_cache_hash(self.config, exchange),
+                        self.exchange_params[exchange],
+                        self.backtest_params[exchange],
+                    ]
+                    for exchange in self.exchanges
+                }
+            )
+        )
 
+    def finalize_evaluation(self, config, analyses):
         analyses_combined = self.combine_analyses(analyses)
         w_0, w_1 = self.calc_fitness(analyses_combined)
         analyses_combined.update({"w_0": w_0, "w_1": w_1})
@@ -362,10 +657,7 @@ class Evaluator:
                     analyses_combined[f"{key}_max"] = np.max(values)
                     analyses_combined[f"{key}_std"] = np.std(values)
                 except Exception as e:
-                    print("\n\n debug\n\n")
-                    print("values", values)
-                    print(e)
-                    traceback.print_exc()
+                    logging.error(f"error combining analyses of {key}: {values} {e}")
                     raise
         return analyses_combined
 
@@ -391,7 +683,11 @@ class Evaluator:
                 - self.config["optimize"]["limits"][f"lower_bound_{key}"]
             ) * 10**i
             i -= 1
-        if (
+        if analyses_combined["truncated_max"]:
+            # metrics of a truncated backtest cover only the part simulated before the abort;
+            # rank it below every complete backtest, whichever limit triggered the abort
+            w_0 = w_1 = TRUNCATED_FITNESS_OFFSET + modifier
+        elif (
             analyses_combined["drawdown_worst_max"] >= 1.0
             or analyses_combined["equity_balance_diff_neg_max_max"] >= 1.0
         ):
@@ -432,6 +728,112 @@ class Evaluator:
                 )
 
 
+class WorkerManager(BaseManager):
+    pass
+
+
+def parse_worker_address(address):
+    """Parses "host:port" into a (host, port) tuple for WorkerManager."""
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class WorkerTaskQueue:
+    """
+    Queue of (batch_id, index, config, fidelity) tasks for optimize workers, recording when each
+    task was taken. Tasks of earlier batches, or already answered, are skipped.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batch_id = None
+        self.taken_ts = {}
+        self.done = set()
+
+    def start_batch(self, batch_id):
+        with self.lock:
+            self.batch_id = batch_id
+            self.taken_ts = {}
+            self.done = set()
+
+    def put(self, task):
+        self.queue.put(task)
+
+    def get(self):
+        """Called by workers; blocks until a task is available."""
+        while True:
+            task = self.queue.get()
+            with self.lock:
+                if task[0] == self.batch_id and task[1] not in self.done:
+                    self.taken_ts[task[1]] = time.time()
+                    return task
+
+    def set_done(self, i):
+        with self.lock:
+            self.done.add(i)
+            self.taken_ts.pop(i, None)
+
+    def pop_timed_out(self, timeout):
+        """Indices of tasks taken more than timeout seconds ago and not answered yet."""
+        now = time.time()
+        with self.lock:
+            timed_out = [i for i, ts in self.taken_ts.items() if now - ts > timeout]
+            for i in timed_out:
+                del self.taken_ts[i]
+        return timed_out
+
+
+class WorkerCoordinator:
+    """
+    Hands out backtests to optimize_worker.py processes, on this or other hosts, over a
+    WorkerManager served on address. Workers fetch setup (the config and the cache hash and
+    shape of each exchange's hlcvs) once, then take (batch_id, index, config, fidelity) tasks
+    one at a time and return a (batch_id, index, analyses) result per task. A task left
+    unanswered task_timeout seconds after a worker took it, e.g. because the worker died, is
+    handed out again.
+    """
+
+    def __init__(self, address, authkey, setup, task_timeout=1800.0):
+        self.tasks = WorkerTaskQueue()
+        self.results = queue.Queue()
+        self.setup = setup
+        self.task_timeout = task_timeout
+        self.n_batches = 0
+        WorkerManager.register("get_tasks", callable=lambda: self.tasks)
+        WorkerManager.register("get_results", callable=lambda: self.results)
+        WorkerManager.register("get_setup", callable=lambda: self.setup, proxytype=DictProxy)
+        self.server = WorkerManager(
+            address=parse_worker_address(address), authkey=authkey.encode()
+        ).get_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Serving optimize workers on {address}")
+
+    def map_configs(self, configs, fidelity):
+        batch_id = self.n_batches
+        self.n_batches += 1
+        self.tasks.start_batch(batch_id)
+        for i, config in enumerate(configs):
+            self.tasks.put((batch_id, i, config, fidelity))
+        analyses = {}
+        while len(analyses) < len(configs):
+            try:
+                result_batch_id, i, result = self.results.get(timeout=1.0)
+            except queue.Empty:
+                timed_out = self.tasks.pop_timed_out(self.task_timeout)
+                if timed_out:
+                    logging.info(f"Resubmitting {len(timed_out)} timed out tasks")
+                    for i in timed_out:
+                        self.tasks.put((batch_id, i, configs[i], fidelity))
+                continue
+            if isinstance(result, str):
+                raise RuntimeError(f"optimize worker failed:\n{result}")
+            if result_batch_id == batch_id:
+                analyses[i] = result
+                self.tasks.set_done(i)
+        return [analyses[i] for i in range(len(configs))]
+
+
 def add_extra_options(parser):
     parser.add_argument(
         "-t",
@@ -442,12 +844,44 @@ def add_extra_options(parser):
         default=None,
         help="Start with given live configs. Single json file or dir with multiple json files",
     )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        required=False,
+        dest="resume",
+        default=None,
+        help="Resume an interrupted optimization from its checkpoint file",
+    )
+    parser.add_argument(
+        "--serve_workers",
+        type=str,
+        required=False,
+        dest="serve_workers",
+        default=None,
+        help="Backtest on optimize_worker.py processes connecting to host:port instead of locally",
+    )
+    parser.add_argument(
+        "--worker_authkey",
+        type=str,
+        required=False,
+        dest="worker_authkey",
+        default=None,
+        help="Key workers must present to connect. Random if omitted",
+    )
+    parser.add_argument(
+        "--worker_task_timeout",
+        type=float,
+        required=False,
+        dest="worker_task_timeout",
+        default=1800.0,
+        help="Seconds after which a backtest taken by a worker with no result is handed out again",
+    )
 
 
 def extract_configs(path):
     cfgs = []
     if os.path.exists(path):
-        if path.endswith("_all_results.txt"):
+        if path.endswith("_all_results.txt") or is_results_store(path):
             logging.info(f"Skipping {path}")
             return []
         if path.endswith(".json"):
@@ -470,7 +904,7 @@ def extract_configs(path):
 def get_starting_configs(starting_configs: str):
     if starting_configs is None:
         return []
-    if os.path.isdir(starting_configs):
+    if os.path.isdir(starting_configs) and not is_results_store(starting_configs):
         return flatten(
             [
                 get_starting_configs(os.path.join(starting_configs, f))
@@ -498,6 +932,102 @@ def configs_to_individuals(cfgs, param_bounds):
     return list(inds.values())
 
 
+def dump_checkpoint(filepath, generation, population, halloffame, logbook, config):
+    """
+    Writes the optimizer's state after generation to filepath, atomically, so that an interrupted
+    optimization can be resumed where it left off. Individuals are pickled separately, so that
+    the checkpoint can be loaded before deap.creator has made their classes. The population is
+    pickled as a whole, keeping individuals which appear in it more than once shared, as
+    selNSGA2 stores crowding distances on them.
+    """
+    checkpoint = {
+        "generation": generation,
+        "population_size": len(population),
+        "population": pickle.dumps(population, protocol=pickle.HIGHEST_PROTOCOL),
+        "halloffame": pickle.dumps(list(halloffame), protocol=pickle.HIGHEST_PROTOCOL),
+        "logbook": logbook,
+        "random_state": random.getstate(),
+        "np_random_state": np.random.get_state(),
+        "config": config,
+        "results_filename": config["results_filename"],
+    }
+    tmp_filepath = f"{filepath}.tmp"
+    with open(tmp_filepath, "wb") as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filepath, filepath)
+
+
+def load_checkpoint(filepath):
+    with open(filepath, "rb") as f:
+        return pickle.load(f)
+
+
+def ea_mu_plus_lambda(
+    population,
+    toolbox,
+    mu,
+    lambda_,
+    cxpb,
+    mutpb,
+    ngen,
+    stats,
+    halloffame,
+    config,
+    checkpoint_filepath,
+    checkpoint=None,
+):
+    """
+    DEAP's algorithms.eaMuPlusLambda, dumping a checkpoint after every generation.
+    Given a checkpoint, restores its population, hall of fame, logbook and random state and
+    continues with the next generation.
+    """
+    if checkpoint is None:
+        logbook = tools.Logbook()
+        logbook.header = ["gen", "nevals"] + (stats.fields if stats else [])
+
+        # Evaluate the individuals with an invalid fitness
+        invalid_ind = [ind for ind in population if not ind.fitness.valid]
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+        halloffame.update(population)
+
+        record = stats.compile(population)
+        logbook.record(gen=0, nevals=len(invalid_ind), **record)
+        print(logbook.stream)
+        start_gen = 1
+        dump_checkpoint(checkpoint_filepath, 0, population, halloffame, logbook, config)
+    else:
+        population = pickle.loads(checkpoint["population"])
+        halloffame.update(pickle.loads(checkpoint["halloffame"]))
+        logbook = checkpoint["logbook"]
+        random.setstate(checkpoint["random_state"])
+        np.random.set_state(checkpoint["np_random_state"])
+        start_gen = checkpoint["generation"] + 1
+        logging.info(f"Resuming from generation {start_gen} of {ngen}")
+
+    for gen in range(start_gen, ngen + 1):
+        # Vary the population
+        offspring = algorithms.varOr(population, toolbox, lambda_, cxpb, mutpb)
+
+        # Evaluate the individuals with an invalid fitness
+        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+        halloffame.update(offspring)
+
+        # Select the next generation population
+        population[:] = toolbox.select(population + offspring, mu)
+
+        record = stats.compile(population)
+        logbook.record(gen=gen, nevals=len(invalid_ind), **record)
+        print(logbook.stream)
+        dump_checkpoint(checkpoint_filepath, gen, population, halloffame, logbook, config)
+
+    return population, logbook
+
+
 async def main():
     manage_rust_compilation()
     parser = argparse.ArgumentParser(prog="optimize", description="run optimizer")
@@ -523,7 +1053,12 @@ async def main():
         level=logging.INFO,
         datefmt="%Y-%m-%dT%H:%M:%S",
     )
-    if args.config_path is None:
+    checkpoint = None
+    if args.resume is not None:
+        logging.info(f"resuming optimization from checkpoint {args.resume}")
+        checkpoint = load_checkpoint(args.resume)
+        config = deepcopy(checkpoint["config"])
+    elif args.config_path is None:
         logging.info(f"loading default template config configs/template.json")
         config = load_config("configs/template.json", verbose=False)
     else:
@@ -532,12 +1067,16 @@ async def main():
     old_config = deepcopy(config)
     update_config_with_args(config, args)
     config = format_config(config, verbose=False)
+    checkpoint_config = deepcopy(config)
     await add_all_eligible_coins_to_config(config)
 
     try:
         # Prepare data for each exchange
         hlcvs_dict = {}
         shared_memory_files = {}
+        forager_index_files = {}
+        coin_major_files = {}
+        temp_files = []
         hlcvs_shapes = {}
         hlcvs_dtypes = {}
         msss = {}
@@ -555,12 +1094,11 @@ async def main():
             hlcvs_shapes[exchange] = hlcvs.shape
             hlcvs_dtypes[exchange] = hlcvs.dtype
             msss[exchange] = mss
-            required_space = hlcvs.nbytes * 1.1  # Add 10% buffer
-            check_disk_space(tempfile.gettempdir(), required_space)
-            logging.info(f"Starting to create shared memory file for {exchange}...")
-            shared_memory_file = create_shared_memory_file(hlcvs)
-            shared_memory_files[exchange] = shared_memory_file
-            logging.info(f"Finished creating shared memory file for {exchange}: {shared_memory_file}")
+            (
+                shared_memory_files[exchange],
+                forager_index_files[exchange],
+                coin_major_files[exchange],
+            ) = create_shared_memory_files(hlcvs, exchange, temp_files)
         else:
             tasks = {}
             for exchange in config["backtest"]["exchanges"]:
@@ -572,14 +1110,11 @@ async def main():
                 hlcvs_shapes[exchange] = hlcvs.shape
                 hlcvs_dtypes[exchange] = hlcvs.dtype
                 msss[exchange] = mss
-                required_space = hlcvs.nbytes * 1.1  # Add 10% buffer
-                check_disk_space(tempfile.gettempdir(), required_space)
-                logging.info(f"Starting to create shared memory file for {exchange}...")
-                shared_memory_file = create_shared_memory_file(hlcvs)
-                shared_memory_files[exchange] = shared_memory_file
-                logging.info(
-                    f"Finished creating shared memory file for {exchange}: {shared_memory_file}"
-                )
+                (
+                    shared_memory_files[exchange],
+                    forager_index_files[exchange],
+                    coin_major_files[exchange],
+                ) = create_shared_memory_files(hlcvs, exchange, temp_files)
 
         exchanges = config["backtest"]["exchanges"]
         exchanges_fname = "combined" if config["backtest"]["combine_ohlcvs"] else "_".join(exchanges)
@@ -596,9 +1131,18 @@ async def main():
                 / (1000 * 60 * 60 * 24)
             )
         )
-        config["results_filename"] = make_get_filepath(
-            f"optimize_results/{date_fname}_{exchanges_fname}_{n_days}days_{coins_fname}_{hash_snippet}_all_results.txt"
-        )
+        if checkpoint is None:
+            config["results_filename"] = make_get_filepath(
+                f"optimize_results/{date_fname}_{exchanges_fname}_{n_days}days_{coins_fname}_{hash_snippet}_all_results"
+            )
+            checkpoint_filepath = config["results_filename"].replace(
+                "_all_results", "_checkpoint.pkl"
+            )
+        else:
+            # keep appending to the interrupted run's results
+            config["results_filename"] = checkpoint["results_filename"]
+            checkpoint_filepath = args.resume
+        checkpoint_config["results_filename"] = config["results_filename"]
         # Create results queue and start manager process
         manager = multiprocessing.Manager()
         results_queue = manager.Queue()
@@ -611,7 +1155,14 @@ async def main():
 
         # Initialize evaluator with results queue
         evaluator = Evaluator(
-            shared_memory_files, hlcvs_shapes, hlcvs_dtypes, config, msss, results_queue
+            shared_memory_files,
+            hlcvs_shapes,
+            hlcvs_dtypes,
+            config,
+            msss,
+            results_queue,
+            forager_index_files=forager_index_files,
+            coin_major_files=coin_major_files,
         )
 
         logging.info(f"Finished initializing evaluator...")
@@ -660,39 +1211,82 @@ async def main():
         toolbox.register("select", tools.selNSGA2)
 
         # Parallelization setup
-        logging.info(f"Initializing multiprocessing pool. N cpus: {config['optimize']['n_cpus']}")
-        pool = multiprocessing.Pool(processes=config["optimize"]["n_cpus"])
-        toolbox.register("map", pool.map)
-        logging.info(f"Finished initializing multiprocessing pool.")
-
-        # Create initial population
-        logging.info(f"Creating initial population...")
-
-        bounds = [(low, high) for low, high in param_bounds.values()]
-        starting_individuals = configs_to_individuals(
-            get_starting_configs(args.starting_configs), param_bounds
+        if args.serve_workers is not None:
+            worker_authkey = args.worker_authkey or uuid4().hex
+            setup = {
+                "config": config,
+                "cache_hashes": {ex: get_cache_hash(config, ex) for ex in hlcvs_shapes},
+                "hlcvs_shapes": hlcvs_shapes,
+            }
+            coordinator = WorkerCoordinator(
+                args.serve_workers, worker_authkey, setup, task_timeout=args.worker_task_timeout
+            )
+            logging.info(
+                f"Start workers with: python3 src/optimize_worker.py {args.serve_workers} "
+                f"--authkey {worker_authkey}"
+            )
+            map_configs = coordinator.map_configs
+        elif config["optimize"]["batch_evaluate"]:
+            logging.info(
+                f"Evaluating populations in batches. N threads: {config['optimize']['n_cpus']}"
+            )
+            map_configs = evaluator.run_backtests_batch
+        else:
+            logging.info(
+                f"Initializing multiprocessing pool. N cpus: {config['optimize']['n_cpus']}"
+            )
+            pool = multiprocessing.Pool(processes=config["optimize"]["n_cpus"])
+            map_configs = lambda configs, fidelity: pool.map(
+                partial(evaluator.run_backtests, fidelity=fidelity), configs
+            )
+            logging.info(f"Finished initializing multiprocessing pool.")
+        evaluation_cache = EvaluationCache(
+            make_get_filepath(f"caches/optimize_evaluations/{evaluator.get_data_hash()}.jsonl"),
+            config["optimize"]["evaluation_cache_size"],
+        )
+        toolbox.register(
+            "map",
+            lambda _, individuals: evaluator.evaluate_population(
+                individuals, map_configs, evaluation_cache
+            ),
         )
-        if (nstart := len(starting_individuals)) > (popsize := config["optimize"]["population_size"]):
-            logging.info(f"Number of starting configs greater than population size.")
-            logging.info(f"Increasing population size: {popsize} -> {nstart}")
-            config["optimize"]["population_size"] = nstart
-
-        population = toolbox.population(n=config["optimize"]["population_size"])
-        if starting_individuals:
-            bounds = [(low, high) for low, high in param_bounds.values()]
-            for i in range(len(starting_individuals)):
-                adjusted = [
-                    max(min(x, bounds[z][1]), bounds[z][0])
-                    for z, x in enumerate(starting_individuals[i])
-                ]
-                population[i] = creator.Individual(adjusted)
 
-            for i in range(len(starting_individuals), len(population) // 2):
-                mutant = deepcopy(population[np.random.choice(range(len(starting_individuals)))])
-                toolbox.mutate(mutant)
-                population[i] = mutant
+        if checkpoint is not None:
+            population = []
+            config["optimize"]["population_size"] = checkpoint["population_size"]
+        else:
+            # Create initial population
+            logging.info(f"Creating initial population...")
 
-        logging.info(f"Initial population size: {len(population)}")
+            bounds = [(low, high) for low, high in param_bounds.values()]
+            starting_individuals = configs_to_individuals(
+                get_starting_configs(args.starting_configs), param_bounds
+            )
+            if (nstart := len(starting_individuals)) > (
+                popsize := config["optimize"]["population_size"]
+            ):
+                logging.info(f"Number of starting configs greater than population size.")
+                logging.info(f"Increasing population size: {popsize} -> {nstart}")
+                config["optimize"]["population_size"] = nstart
+
+            population = toolbox.population(n=config["optimize"]["population_size"])
+            if starting_individuals:
+                bounds = [(low, high) for low, high in param_bounds.values()]
+                for i in range(len(starting_individuals)):
+                    adjusted = [
+                        max(min(x, bounds[z][1]), bounds[z][0])
+                        for z, x in enumerate(starting_individuals[i])
+                    ]
+                    population[i] = creator.Individual(adjusted)
+
+                for i in range(len(starting_individuals), len(population) // 2):
+                    mutant = deepcopy(
+                        population[np.random.choice(range(len(starting_individuals)))]
+                    )
+                    toolbox.mutate(mutant)
+                    population[i] = mutant
+
+            logging.info(f"Initial population size: {len(population)}")
 
         # Set up statistics and hall of fame
         stats = tools.Statistics(lambda ind: ind.fitness.values)
@@ -701,24 +1295,24 @@ async def main():
         stats.register("min", np.min, axis=0)
         stats.register("max", np.max, axis=0)
 
-        logbook = tools.Logbook()
-        logbook.header = "gen", "evals", "std", "min", "avg", "max"
-
-        hof = tools.ParetoFront()
+        hof = FastParetoFront()
 
         # Run the optimization
         logging.info(f"Starting optimize...")
-        population, logbook = algorithms.eaMuPlusLambda(
+        logging.info(f"Checkpoints are written to {checkpoint_filepath}")
+        population, logbook = ea_mu_plus_lambda(
             population,
             toolbox,
             mu=config["optimize"]["population_size"],
             lambda_=config["optimize"]["population_size"],
             cxpb=config["optimize"]["crossover_probability"],
             mutpb=config["optimize"]["mutation_probability"],
-            ngen=max(1, int(config["optimize"]["iters"] / len(population))),
+            ngen=max(1, int(config["optimize"]["iters"] / config["optimize"]["population_size"])),
             stats=stats,
             halloffame=hof,
-            verbose=True,
+            config=checkpoint_config,
+            checkpoint_filepath=checkpoint_filepath,
+            checkpoint=checkpoint,
         )
 
         # Print statistics
@@ -752,7 +1346,7 @@ async def main():
             pool.join()
 
         # Remove shared memory files
-        for shared_memory_file in shared_memory_files.values():
+        for shared_memory_file in temp_files:
             if shared_memory_file and os.path.exists(shared_memory_file):
                 logging.info(f"Removing shared memory file: {shared_memory_file}")
                 try:
@@ -0,0 +1,131 @@
+import os
+import sys
+import asyncio
+import argparse
+import logging
+import threading
+import traceback
+from multiprocessing.managers import DictProxy
+from backtest import prepare_hlcvs_mss, get_cache_hash
+from optimize import (
+    Evaluator,
+    WorkerManager,
+    parse_worker_address,
+    create_shared_memory_files,
+)
+from main import manage_rust_compilation
+
+
+def serve_tasks(tasks, results, run_backtests_batch, n_cpus):
+    """
+    Backtests tasks from tasks on n_cpus threads, one task at a time per thread, putting the
+    analyses of each, or the traceback of a failed backtest, to results as soon as it is done.
+    The Rust backtest releases the GIL, so the threads run in parallel.
+    """
+    threads = [
+        threading.Thread(
+            target=serve_tasks_thread, args=(tasks, results, run_backtests_batch), daemon=True
+        )
+        for _ in range(n_cpus)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def serve_tasks_thread(tasks, results, run_backtests_batch):
+    try:
+        while True:
+            batch_id, i, config, fidelity = tasks.get()
+            try:
+                analysis = run_backtests_batch([config], fidelity)[0]
+            except Exception:
+                analysis = traceback.format_exc()
+            results.put((batch_id, i, analysis))
+    except (EOFError, ConnectionError):
+        pass  # coordinator closed the connection
+
+
+async def prepare_evaluator(setup, n_cpus, temp_files):
+    """
+    Loads the coordinator's hlcvs from the local cache, downloading them if missing, and returns
+    an Evaluator over them.
+    """
+    config = setup["config"]
+    config["optimize"]["n_cpus"] = n_cpus
+    shared_memory_files, forager_index_files, coin_major_files = {}, {}, {}
+    hlcvs_shapes, hlcvs_dtypes, msss = {}, {}, {}
+    for exchange, cache_hash in setup["cache_hashes"].items():
+        if get_cache_hash(config, exchange) != cache_hash:
+            raise Exception(f"{exchange} cache hash mismatch. Check end_date of the coordinator")
+        coins, hlcvs, mss, _, _ = await prepare_hlcvs_mss(config, exchange)
+        if tuple(hlcvs.shape) != tuple(setup["hlcvs_shapes"][exchange]):
+            raise Exception(
+                f"{exchange} hlcvs shape {hlcvs.shape} differs from coordinator's "
+                f"{setup['hlcvs_shapes'][exchange]}"
+            )
+        hlcvs_shapes[exchange] = hlcvs.shape
+        hlcvs_dtypes[exchange] = hlcvs.dtype
+        msss[exchange] = mss
+        (
+            shared_memory_files[exchange],
+            forager_index_files[exchange],
+            coin_major_files[exchange],
+        ) = create_shared_memory_files(hlcvs, exchange, temp_files)
+    return Evaluator(
+        shared_memory_files,
+        hlcvs_shapes,
+        hlcvs_dtypes,
+        config,
+        msss,
+        None,
+        forager_index_files=forager_index_files,
+        coin_major_files=coin_major_files,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        prog="optimize_worker",
+        description="run backtests for an optimize.py started with --serve_workers",
+    )
+    parser.add_argument("address", type=str, help="host:port of the coordinator")
+    parser.add_argument("--authkey", type=str, required=True, help="coordinator's worker authkey")
+    parser.add_argument(
+        "--n_cpus", type=int, default=os.cpu_count(), help="number of backtests to run at once"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+    manage_rust_compilation()
+    WorkerManager.register("get_tasks")
+    WorkerManager.register("get_results")
+    WorkerManager.register("get_setup", proxytype=DictProxy)
+    manager = WorkerManager(
+        address=parse_worker_address(args.address), authkey=args.authkey.encode()
+    )
+    manager.connect()
+    logging.info(f"Connected to coordinator {args.address}")
+    temp_files = []
+    try:
+        evaluator = await prepare_evaluator(manager.get_setup().copy(), args.n_cpus, temp_files)
+        logging.info(f"Serving backtests on {args.n_cpus} threads")
+        serve_tasks(
+            manager.get_tasks(), manager.get_results(), evaluator.run_backtests_batch, args.n_cpus
+        )
+        logging.info("Coordinator closed the connection. Exiting.")
+    except (EOFError, ConnectionError):
+        logging.info("Coordinator closed the connection. Exiting.")
+    finally:
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.unlink(temp_file)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Non-dominated sorting of candidates by objectives to be minimized, given as an (n, k) array.
+Negate objectives which are to be maximized. A candidate dominates another if it is no worse in
+every objective and better in at least one; candidates with equal objectives don't dominate each
+other, so duplicates of a non-dominated point are all kept.
+"""
+
+import numpy as np
+
+
+def pareto_front_mask_2d(objectives):
+    """Sweep in lexicographic order, O(n log n)."""
+    order = np.lexsort((objectives[:, 1], objectives[:, 0]))
+    w0, w1 = objectives[order, 0], objectives[order, 1]
+    group_starts = np.searchsorted(w0, w0, side="left")
+    # lowest w1 among points with strictly lower w0
+    prev_min_w1 = np.concatenate([[np.inf], np.minimum.accumulate(w1)])[group_starts]
+    dominated = (prev_min_w1 <= w1) | (w1 > w1[group_starts])
+    mask = np.zeros(len(objectives), dtype=bool)
+    mask[order[~dominated]] = True
+    return mask
+
+
+def pareto_front_mask_kd(objectives, block_size=256):
+    """
+    Visits candidates in order of increasing sum of objectives, which a dominating candidate
+    always precedes, comparing each block of candidates with the front found so far and with
+    each other.
+    """
+    order = np.argsort(objectives.sum(axis=1), kind="stable")
+    front = np.empty((0, objectives.shape[1]))
+    front_idxs = []
+    for start in range(0, len(order), block_size):
+        idxs = order[start : start + block_size]
+        idxs = idxs[~dominated_by_any(objectives[idxs], front)]
+        # the rest may be dominated by candidates earlier in the same block
+        block = objectives[idxs]
+        idxs = idxs[~dominated_by_any(block, block)]
+        front = np.concatenate([front, objectives[idxs]])
+        front_idxs.extend(idxs)
+    mask = np.zeros(len(objectives), dtype=bool)
+    mask[front_idxs] = True
+    return mask
+
+
+def dominated_by_any(points, front):
+    """Mask of points dominated by at least one row of front."""
+    if len(front) == 0:
+        return np.zeros(len(points), dtype=bool)
+    no_worse = np.all(front[None, :, :] <= points[:, None, :], axis=2)
+    better = np.any(front[None, :, :] < points[:, None, :], axis=2)
+    return np.any(no_worse & better, axis=1)
+
+
+def pareto_front_mask(objectives):
+    """Mask of the non-dominated rows of objectives."""
+    objectives = np.asarray(objectives, dtype=float)
+    if len(objectives) == 0:
+        return np.zeros(0, dtype=bool)
+    if objectives.shape[1] == 2:
+        return pareto_front_mask_2d(objectives)
+    return pareto_front_mask_kd(objectives)
+
+
+def crowding_distances(objectives):
+    """
+    NSGA-II crowding distance of each row within its front: the sum over objectives of the
+    normalized distance between its neighbours along that objective. Boundary rows get inf.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    n, k = objectives.shape
+    distances = np.zeros(n)
+    if n <= 2:
+        distances[:] = np.inf
+        return distances
+    for j in range(k):
+        order = np.argsort(objectives[:, j], kind="stable")
+        values = objectives[order, j]
+        distances[order[0]] = distances[order[-1]] = np.inf
+        span = values[-1] - values[0]
+        if span > 0.0:
+            distances[order[1:-1]] += (values[2:] - values[:-2]) / span
+    return distances
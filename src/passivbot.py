@@ -19,14 +19,15 @@ from prettytable import PrettyTable
 from uuid import uuid4
 from copy import deepcopy
 from collections import defaultdict
-from sortedcontainers import SortedDict
+from ohlcv_buffer import OHLCVBuffer
+from market_data import connect_market_data
+from candle_cache import CandleCache
 
 from procedures import (
     load_broker_code,
     load_user_info,
     utc_ms,
     make_get_filepath,
-    get_file_mod_utc,
     get_first_timestamps_unified,
     load_config,
     add_arguments_recursively,
@@ -64,6 +65,8 @@ from pure_funcs import (
     get_template_live_config,
     flatten,
     log_dict_changes,
+    get_empty_trailing_prices,
+    update_trailing_prices,
 )
 
 
@@ -128,9 +131,18 @@ class Passivbot:
         self.c_mults = {}
         self.max_leverage = {}
         self.live_configs = {}
+        # per symbol rows of pbr.calc_ideal_orders_batch's exchange and bot params,
+        # built on first use and dropped on market and config changes
+        self.batch_exchange_params = {}
+        self.batch_bot_params = {}
+        self.batch_wel_idx = list(pbr.BATCH_BOT_PARAM_KEYS).index("wallet_exposure_limit")
         self.PB_modes = {"long": {}, "short": {}}
         self.pnls_cache_filepath = make_get_filepath(f"caches/{self.exchange}/{self.user}_pnls.json")
         self.ohlcvs_1m_cache_dirpath = make_get_filepath(f"caches/{self.exchange}/ohlcvs_1m/")
+        self.live_state_cache_filepath = make_get_filepath(
+            f"caches/{self.exchange}/{self.user}_live_state.json"
+        )
+        self.live_state_dump_ts = 0
         self.previous_REST_update_ts = 0
         self.recent_fill = False
         self.execution_delay_millis = max(
@@ -144,14 +156,22 @@ class Passivbot:
         self.emas = {"long": {}, "short": {}}
         self.ema_alphas = {"long": {}, "short": {}}
         self.upd_minute_emas = {}
+        self.ema_checkpoints = {}
+        self.trailing_states = {}
+        self.position_change_fallbacks = defaultdict(dict)
         self.ineligible_symbols_with_pos = set()
         self.ohlcvs_1m_update_after_minutes = config["live"]["ohlcvs_1m_update_after_minutes"]
         self.ohlcvs_1m_rolling_window_days = config["live"]["ohlcvs_1m_rolling_window_days"]
+        self.ohlcvs_1m_buffer_size = int(self.ohlcvs_1m_rolling_window_days * 60 * 24) + 1
         self.n_symbols_missing_ohlcvs_1m = 1000
         self.ohlcvs_1m_update_timestamps = {}
         self.max_n_concurrent_ohlcvs_1m_updates = 3
         self.stop_signal_received = False
         self.ohlcvs_1m_update_timestamps_WS = {}
+        self.candle_caches = {}
+        self.ohlcvs_1m_updates_in_progress = set()
+        self.market_data_socket = config["live"]["market_data_socket"]
+        self.market_data = None
         self.PB_mode_stop = {
             "long": "graceful_stop" if self.config["live"]["auto_gs"] else "manual",
             "short": "graceful_stop" if self.config["live"]["auto_gs"] else "manual",
@@ -167,6 +187,7 @@ class Passivbot:
         logging.info(f"Starting data maintainers...")
         await self.start_data_maintainers()
         await self.wait_for_ohlcvs_1m_to_update()
+        self.load_live_state()
         logging.info(f"starting websocket...")
         self.previous_REST_update_ts = utc_ms()
         await self.prepare_for_execution()
@@ -207,6 +228,7 @@ class Passivbot:
                 elif len(syms_) > 0:
                     logging.info(f"{line}: {','.join(sorted(set([s for s in syms_])))}")
         self.set_market_specific_settings()
+        self.batch_exchange_params = {}
         # for prettier printing
         self.max_len_symbol = max([len(s) for s in self.markets_dict])
         self.sym_padding = max(self.sym_padding, self.max_len_symbol + 1)
@@ -451,6 +473,7 @@ class Passivbot:
                     logging.error(
                         f"failed to load config {self.flags[symbol].live_config_path} for {symbol} {e}. Using default config."
                     )
+        self.batch_bot_params = {}
         self.set_wallet_exposure_limits()
 
     def pad_sym(self, symbol):
@@ -502,11 +525,16 @@ class Passivbot:
         for symbol in self.positions:
             for pside in ["long", "short"]:
                 if self.has_position(pside, symbol) and self.is_trailing(symbol, pside):
-                    last_position_changes[symbol][pside] = utc_ms() - 1000 * 60 * 60 * 24 * 7
+                    # while no fill is found, keep the fallback fixed, so trailing data can be
+                    # updated incrementally instead of being rebuilt every cycle
+                    last_position_changes[symbol][pside] = self.position_change_fallbacks[
+                        symbol
+                    ].setdefault(pside, utc_ms() - 1000 * 60 * 60 * 24 * 7)
                     for fill in self.pnls[::-1]:
                         try:
                             if fill["symbol"] == symbol and fill["position_side"] == pside:
                                 last_position_changes[symbol][pside] = fill["timestamp"]
+                                del self.position_change_fallbacks[symbol][pside]
                                 break
                         except Exception as e:
                             logging.error(
@@ -529,15 +557,15 @@ class Passivbot:
                 prev_print_ts = utc_ms()
             await asyncio.sleep(0.1)
 
-    def get_ohlcvs_1m_filepath(self, symbol):
-        try:
-            return self.ohlcvs_1m_filepaths[symbol]
-        except:
-            if not hasattr(self, "filepath"):
-                self.ohlcvs_1m_filepaths = {}
-            filepath = f"{self.ohlcvs_1m_cache_dirpath}{symbol_to_coin(symbol)}.npy"
-            self.ohlcvs_1m_filepaths[symbol] = filepath
-            return filepath
+    def get_candle_cache(self, symbol):
+        if symbol not in self.candle_caches:
+            coin = symbol_to_coin(symbol)
+            self.candle_caches[symbol] = CandleCache(
+                f"{self.ohlcvs_1m_cache_dirpath}{coin}/",
+                self.ohlcvs_1m_buffer_size,
+                legacy_filepath=f"{self.ohlcvs_1m_cache_dirpath}{coin}.npy",
+            )
+        return self.candle_caches[symbol]
 
     def trim_ohlcvs_1m(self, symbol):
         try:
@@ -548,23 +576,17 @@ class Passivbot:
             age_limit = (
                 self.get_exchange_time() - 1000 * 60 * 60 * 24 * self.ohlcvs_1m_rolling_window_days
             )
-            for i in range(len(self.ohlcvs_1m[symbol])):
-                ts = self.ohlcvs_1m[symbol].peekitem(0)[0]
-                if ts < age_limit:
-                    del self.ohlcvs_1m[symbol][ts]
-                else:
-                    break
+            self.ohlcvs_1m[symbol].trim(age_limit)
             return True
         except Exception as e:
             logging.error(f"error with {get_function_name()} {symbol} {e}")
             traceback.print_exc()
             return False
 
-    def dump_ohlcvs_1m_to_cache(self, symbol):
+    def dump_ohlcvs_1m_to_cache(self, symbol, candles):
         try:
             self.trim_ohlcvs_1m(symbol)
-            to_dump = np.array([x for x in self.ohlcvs_1m[symbol].values()])
-            np.save(self.get_ohlcvs_1m_filepath(symbol), to_dump)
+            self.get_candle_cache(symbol).write(candles)
             return True
         except Exception as e:
             logging.error(f"error with {get_function_name()} for {symbol}: {e}")
@@ -572,24 +594,21 @@ class Passivbot:
             return False
 
     def update_trailing_data(self):
+        # trailing prices of settled candles, older than ohlcvs_1m_update_after_minutes, are kept
+        # in self.trailing_states and only updated with newly settled candles; they are reset
+        # when the position changes. The recent candles, which may still be corrected by late
+        # updates or replace gap fills, are applied on top of them every cycle.
         if not hasattr(self, "trailing_prices"):
             self.trailing_prices = {}
         last_position_changes = self.get_last_position_changes()
         symbols = set(self.trailing_prices) | set(last_position_changes) | set(self.active_symbols)
+        current_minute = self.get_exchange_time() // 60000 * 60000
+        settled_until = current_minute - 60000 * max(1, self.ohlcvs_1m_update_after_minutes)
+        trailing_states = defaultdict(dict)
         for symbol in symbols:
             self.trailing_prices[symbol] = {
-                "long": {
-                    "max_since_open": 0.0,
-                    "min_since_max": np.inf,
-                    "min_since_open": np.inf,
-                    "max_since_min": 0.0,
-                },
-                "short": {
-                    "max_since_open": 0.0,
-                    "min_since_max": np.inf,
-                    "min_since_open": np.inf,
-                    "max_since_min": 0.0,
-                },
+                "long": get_empty_trailing_prices(),
+                "short": get_empty_trailing_prices(),
             }
             if symbol not in last_position_changes:
                 continue
@@ -597,24 +616,21 @@ class Passivbot:
                 if symbol not in self.ohlcvs_1m:
                     logging.info(f"debug: {symbol} missing from self.ohlcvs_1m")
                     continue
-                for ts in self.ohlcvs_1m[symbol]:
-                    if ts <= last_position_changes[symbol][pside]:
-                        continue
-                    x = self.ohlcvs_1m[symbol][ts]
-                    if x[2] > self.trailing_prices[symbol][pside]["max_since_open"]:
-                        self.trailing_prices[symbol][pside]["max_since_open"] = x[2]
-                        self.trailing_prices[symbol][pside]["min_since_max"] = x[4]
-                    else:
-                        self.trailing_prices[symbol][pside]["min_since_max"] = min(
-                            self.trailing_prices[symbol][pside]["min_since_max"], x[3]
-                        )
-                    if x[3] < self.trailing_prices[symbol][pside]["min_since_open"]:
-                        self.trailing_prices[symbol][pside]["min_since_open"] = x[3]
-                        self.trailing_prices[symbol][pside]["max_since_min"] = x[4]
-                    else:
-                        self.trailing_prices[symbol][pside]["max_since_min"] = max(
-                            self.trailing_prices[symbol][pside]["max_since_min"], x[2]
-                        )
+                since = last_position_changes[symbol][pside]
+                state = self.trailing_states.get(symbol, {}).get(pside)
+                if state is None or state["since"] != since:
+                    state = {"since": since, "upd_minute": 0, "prices": get_empty_trailing_prices()}
+                start_ts = max(since + 1, state["upd_minute"] + 60000)
+                ohlcvs = self.ohlcvs_1m[symbol].to_array(start_ts)
+                settled = ohlcvs[ohlcvs[:, 0] < settled_until]
+                if len(settled) > 0:
+                    update_trailing_prices(state["prices"], settled)
+                    state["upd_minute"] = int(settled[-1, 0])
+                trailing_states[symbol][pside] = state
+                self.trailing_prices[symbol][pside] = update_trailing_prices(
+                    dict(state["prices"]), ohlcvs[len(settled) :]
+                )
+        self.trailing_states = trailing_states
 
     def format_symbol(self, symbol: str) -> str:
         try:
@@ -713,6 +729,15 @@ class Passivbot:
     async def update_tickers(self):
         if not hasattr(self, "tickers"):
             self.tickers = {}
+        if self.market_data is not None:
+            try:
+                loop = asyncio.get_running_loop()
+                tickers = await loop.run_in_executor(None, self.market_data.get_tickers)
+                if tickers:
+                    self.tickers = tickers
+                    return
+            except Exception as e:
+                logging.error(f"error getting tickers from market data service {e}")
         tickers = None
         try:
             tickers = await self.cca.fetch_tickers()
@@ -876,10 +901,14 @@ class Passivbot:
 
     def set_wallet_exposure_limits(self):
         for symbol in self.live_configs:
-            for pside in ["long", "short"]:
+            for j, pside in enumerate(["long", "short"]):
                 self.live_configs[symbol][pside]["wallet_exposure_limit"] = (
                     self.get_wallet_exposure_limit(pside, symbol)
                 )
+                if symbol in self.batch_bot_params:
+                    self.batch_bot_params[symbol][j, self.batch_wel_idx] = self.live_configs[
+                        symbol
+                    ][pside]["wallet_exposure_limit"]
 
     def get_wallet_exposure_limit(self, pside, symbol):
         if (
@@ -990,9 +1019,9 @@ class Passivbot:
 
     def handle_ohlcv_1m_update(self, symbol, upd):
         if symbol not in self.ohlcvs_1m:
-            self.ohlcvs_1m[symbol] = SortedDict()
+            self.ohlcvs_1m[symbol] = OHLCVBuffer(self.ohlcvs_1m_buffer_size)
         for elm in upd:
-            self.ohlcvs_1m[symbol][int(elm[0])] = elm
+            self.ohlcvs_1m[symbol].upsert(elm)
             self.ohlcvs_1m_update_timestamps_WS[symbol] = utc_ms()
 
     def calc_upnl_sum(self):
@@ -1208,7 +1237,7 @@ class Passivbot:
                 logging.error(f"Error fetching last price from tickers")
         try:
             if symbol in self.ohlcvs_1m and self.ohlcvs_1m[symbol]:
-                res = self.ohlcvs_1m[symbol].peekitem(-1)[1][4]
+                res = self.ohlcvs_1m[symbol].last()[4]
                 if res is None:
                     logging.info(f"debug get_last_price {symbol} price from ohlcvs_1m is null")
                     return null_replace
@@ -1322,6 +1351,7 @@ class Passivbot:
 
     def calc_ideal_orders(self):
         ideal_orders = {symbol: [] for symbol in self.active_symbols}
+        batch_pairs = set()
         for pside in self.PB_modes:
             for symbol in self.PB_modes[pside]:
                 if self.PB_modes[pside][symbol] == "panic":
@@ -1343,52 +1373,9 @@ class Passivbot:
                 elif self.PB_modes[pside][symbol] == "manual":
                     pass
                 else:
-                    entries = getattr(pbr, f"calc_entries_{pside}_py")(
-                        self.qty_steps[symbol],
-                        self.price_steps[symbol],
-                        self.min_qtys[symbol],
-                        self.min_costs[symbol],
-                        self.c_mults[symbol],
-                        self.live_configs[symbol][pside]["entry_grid_double_down_factor"],
-                        self.live_configs[symbol][pside]["entry_grid_spacing_weight"],
-                        self.live_configs[symbol][pside]["entry_grid_spacing_pct"],
-                        self.live_configs[symbol][pside]["entry_initial_ema_dist"],
-                        self.live_configs[symbol][pside]["entry_initial_qty_pct"],
-                        self.live_configs[symbol][pside]["entry_trailing_grid_ratio"],
-                        self.live_configs[symbol][pside]["entry_trailing_retracement_pct"],
-                        self.live_configs[symbol][pside]["entry_trailing_threshold_pct"],
-                        self.live_configs[symbol][pside]["wallet_exposure_limit"],
-                        self.balance,
-                        self.positions[symbol][pside]["size"],
-                        self.positions[symbol][pside]["price"],
-                        self.trailing_prices[symbol][pside]["min_since_open"],
-                        self.trailing_prices[symbol][pside]["max_since_min"],
-                        self.emas[pside][symbol].min(),
-                        self.get_last_price(symbol),
-                    )
-                    closes = getattr(pbr, f"calc_closes_{pside}_py")(
-                        self.qty_steps[symbol],
-                        self.price_steps[symbol],
-                        self.min_qtys[symbol],
-                        self.min_costs[symbol],
-                        self.c_mults[symbol],
-                        self.live_configs[symbol][pside]["close_grid_markup_range"],
-                        self.live_configs[symbol][pside]["close_grid_min_markup"],
-                        self.live_configs[symbol][pside]["close_grid_qty_pct"],
-                        self.live_configs[symbol][pside]["close_trailing_grid_ratio"],
-                        self.live_configs[symbol][pside]["close_trailing_qty_pct"],
-                        self.live_configs[symbol][pside]["close_trailing_retracement_pct"],
-                        self.live_configs[symbol][pside]["close_trailing_threshold_pct"],
-                        bool(self.live_configs[symbol][pside]["enforce_exposure_limit"]),
-                        self.live_configs[symbol][pside]["wallet_exposure_limit"],
-                        self.balance,
-                        self.positions[symbol][pside]["size"],
-                        self.positions[symbol][pside]["price"],
-                        self.trailing_prices[symbol][pside]["max_since_open"],
-                        self.trailing_prices[symbol][pside]["min_since_max"],
-                        self.get_last_price(symbol),
-                    )
-                    ideal_orders[symbol] += entries + closes
+                    batch_pairs.add((symbol, pside))
+        for symbol, orders in self.calc_entries_closes_batch(batch_pairs).items():
+            ideal_orders[symbol] += orders
 
         unstucking_symbol, unstucking_close = self.calc_unstucking_close(ideal_orders)
         if unstucking_close[0] != 0.0:
@@ -1457,6 +1444,71 @@ class Passivbot:
                         order["qty"] = pos_size_abs
         return ideal_orders_f
 
+    def get_batch_exchange_params(self, symbol):
+        if symbol not in self.batch_exchange_params:
+            self.batch_exchange_params[symbol] = np.array(
+                [
+                    self.qty_steps[symbol],
+                    self.price_steps[symbol],
+                    self.min_qtys[symbol],
+                    self.min_costs[symbol],
+                    self.c_mults[symbol],
+                ],
+                dtype=float,
+            )
+        return self.batch_exchange_params[symbol]
+
+    def get_batch_bot_params(self, symbol):
+        if symbol not in self.batch_bot_params:
+            self.batch_bot_params[symbol] = np.array(
+                [
+                    [self.live_configs[symbol][pside][key] for key in pbr.BATCH_BOT_PARAM_KEYS]
+                    for pside in ["long", "short"]
+                ],
+                dtype=float,
+            )
+        return self.batch_bot_params[symbol]
+
+    def calc_entries_closes_batch(self, pairs):
+        """
+        Entries and closes of the given (symbol, pside) pairs, computed in one
+        pbr.calc_ideal_orders_batch call. Exchange and bot params come from the per symbol
+        rows cached in batch_exchange_params and batch_bot_params; only the state is
+        gathered each call.
+        Returns {symbol: [(qty, price, order_type), ...]}, long orders before short.
+        """
+        symbols = sorted({symbol for symbol, _ in pairs})
+        if not symbols:
+            return {}
+        exchange_params = np.stack([self.get_batch_exchange_params(s) for s in symbols])
+        bot_params = np.stack([self.get_batch_bot_params(s) for s in symbols])
+        state = np.zeros((len(symbols), 2, len(pbr.BATCH_STATE_KEYS)))
+        active = np.zeros((len(symbols), 2), dtype=bool)
+        for i, symbol in enumerate(symbols):
+            for j, pside in enumerate(["long", "short"]):
+                if (symbol, pside) not in pairs:
+                    continue
+                active[i, j] = True
+                position = self.positions[symbol][pside]
+                trailing_prices = self.trailing_prices[symbol][pside]
+                state[i, j] = (
+                    position["size"],
+                    position["price"],
+                    trailing_prices["min_since_open"],
+                    trailing_prices["max_since_min"],
+                    trailing_prices["max_since_open"],
+                    trailing_prices["min_since_max"],
+                    self.emas[pside][symbol].min(),
+                    self.get_last_price(symbol),
+                )
+        orders = pbr.calc_ideal_orders_batch(
+            exchange_params, bot_params, state, active, float(self.balance)
+        )
+        orders_by_symbol = defaultdict(list)
+        for i, qty, price, order_type in orders.tolist():
+            orders_by_symbol[symbols[int(i)]].append((qty, price, pbr.ORDER_TYPES[int(order_type)]))
+        return orders_by_symbol
+
     def calc_unstucking_close(self, ideal_orders):
         if len(self.pnls) == 0:
             return "", (0.0, 0.0, "")
@@ -1742,32 +1794,32 @@ class Passivbot:
     def fill_gaps_ohlcvs_1m_single(self, symbol):
         if symbol not in self.ohlcvs_1m or not self.ohlcvs_1m[symbol]:
             return
-        now_minute = int(self.get_exchange_time() // 60000 * 60000)
-        last_ts, last_ohlcv_1m = self.ohlcvs_1m[symbol].peekitem(-1)
-        if now_minute > last_ts:
-            self.ohlcvs_1m[symbol][now_minute] = [float(now_minute)] + [last_ohlcv_1m[4]] * 4 + [0.0]
-        n_ohlcvs_1m = len(self.ohlcvs_1m[symbol])
-        range_ms = self.ohlcvs_1m[symbol].peekitem(-1)[0] - self.ohlcvs_1m[symbol].peekitem(0)[0]
-        ideal_n_ohlcvs_1m = int((range_ms) / 60000) + 1
-        if ideal_n_ohlcvs_1m > n_ohlcvs_1m:
-            ts = self.ohlcvs_1m[symbol].peekitem(0)[0]
-            last_ts = self.ohlcvs_1m[symbol].peekitem(-1)[0]
-            while ts < last_ts:
-                ts += 60000
-                if ts not in self.ohlcvs_1m[symbol]:
-                    self.ohlcvs_1m[symbol][ts] = (
-                        [float(ts)] + [self.ohlcvs_1m[symbol][ts - 60000][4]] * 4 + [0.0]
-                    )
+        # gaps between candles are filled on insertion; only extend up to the current minute
+        self.ohlcvs_1m[symbol].fill_until(self.get_exchange_time())
 
     def init_EMAs_single(self, symbol):
-        first_ts, first_ohlcv = self.ohlcvs_1m[symbol].peekitem(0)
+        first_ts = self.ohlcvs_1m[symbol].first_ts
+        first_ohlcv = self.ohlcvs_1m[symbol].first()
+        checkpoint = self.ema_checkpoints.pop(symbol, None)
+        if checkpoint is not None and not (
+            first_ts - 60000 <= checkpoint["upd_minute"] <= self.ohlcvs_1m[symbol].last_ts
+        ):
+            checkpoint = None  # candles between the checkpoint and now are missing
         for pside in ["long", "short"]:
-            self.emas[pside][symbol] = np.repeat(first_ohlcv[4], 3)
             lc = self.live_configs[symbol][pside]
             es = [lc["ema_span_0"], lc["ema_span_1"], (lc["ema_span_0"] * lc["ema_span_1"]) ** 0.5]
             ema_spans = numpyize(sorted(es))
             self.ema_alphas[pside][symbol] = (a := (2.0 / (ema_spans + 1)), 1.0 - a)
-        self.upd_minute_emas[symbol] = first_ts
+            if checkpoint is not None and np.allclose(checkpoint[pside]["spans"], ema_spans):
+                self.emas[pside][symbol] = numpyize(checkpoint[pside]["emas"])
+            else:
+                checkpoint = None
+        if checkpoint is None:
+            for pside in ["long", "short"]:
+                self.emas[pside][symbol] = np.repeat(first_ohlcv[4], 3)
+            self.upd_minute_emas[symbol] = first_ts
+        else:
+            self.upd_minute_emas[symbol] = checkpoint["upd_minute"]
 
     async def update_EMAs(self):
         for symbol in self.get_symbols_approved_or_has_pos():
@@ -1780,31 +1832,82 @@ class Passivbot:
                         logging.error(f"timeout 5 secs waiting for ohlcvs_1m update for {symbol}")
                         break
             self.update_EMAs_single(symbol)
+        if utc_ms() - self.live_state_dump_ts > 1000 * 60:
+            self.dump_live_state()
 
     def update_EMAs_single(self, symbol):
+        # EMAs are only updated with closed candles, so each candle is applied once
         try:
             if symbol not in self.ohlcvs_1m or not self.ohlcvs_1m[symbol]:
                 return
             self.fill_gaps_ohlcvs_1m_single(symbol)
             if symbol not in self.emas["long"]:
                 self.init_EMAs_single(symbol)
-            last_ts, last_ohlcv_1m = self.ohlcvs_1m[symbol].peekitem(-1)
-            mn = 60000
-            for ts in range(self.upd_minute_emas[symbol] + mn, last_ts + mn, mn):
+            current_minute = self.get_exchange_time() // 60000 * 60000
+            ohlcvs = self.ohlcvs_1m[symbol].to_array(self.upd_minute_emas[symbol] + 60000)
+            closed = ohlcvs[ohlcvs[:, 0] < current_minute]
+            for close in closed[:, 4]:
                 for pside in ["long", "short"]:
                     self.emas[pside][symbol] = calc_ema(
                         self.ema_alphas[pside][symbol][0],
                         self.ema_alphas[pside][symbol][1],
                         self.emas[pside][symbol],
-                        self.ohlcvs_1m[symbol][ts][4],
+                        close,
                     )
-            self.upd_minute_emas[symbol] = last_ts
+            if len(closed) > 0:
+                self.upd_minute_emas[symbol] = int(closed[-1, 0])
             return True
         except Exception as e:
             logging.error(f"error with {get_function_name()} for {symbol}: {e}")
             traceback.print_exc()
             return False
 
+    def dump_live_state(self):
+        # checkpoint of EMAs and trailing prices, so a restart needn't replay all cached candles
+        try:
+            live_state = {
+                "emas": {
+                    symbol: {
+                        "upd_minute": self.upd_minute_emas[symbol],
+                        **{
+                            pside: {
+                                "spans": list(2.0 / self.ema_alphas[pside][symbol][0] - 1.0),
+                                "emas": list(self.emas[pside][symbol]),
+                            }
+                            for pside in ["long", "short"]
+                        },
+                    }
+                    for symbol in self.emas["long"]
+                },
+                "trailing_states": {k: dict(v) for k, v in self.trailing_states.items()},
+                "position_change_fallbacks": {
+                    k: dict(v) for k, v in self.position_change_fallbacks.items()
+                },
+            }
+            tmp_filepath = f"{self.live_state_cache_filepath}.tmp"
+            with open(tmp_filepath, "w") as f:
+                json.dump(denumpyize(live_state), f)
+            os.replace(tmp_filepath, self.live_state_cache_filepath)
+            self.live_state_dump_ts = utc_ms()
+            return True
+        except Exception as e:
+            logging.error(f"error dumping live state to {self.live_state_cache_filepath} {e}")
+            return False
+
+    def load_live_state(self):
+        if not os.path.exists(self.live_state_cache_filepath):
+            return
+        try:
+            with open(self.live_state_cache_filepath) as f:
+                live_state = json.load(f)
+            self.ema_checkpoints = live_state["emas"]
+            self.trailing_states = defaultdict(dict, live_state["trailing_states"])
+            for symbol, fallbacks in live_state["position_change_fallbacks"].items():
+                self.position_change_fallbacks[symbol].update(fallbacks)
+            logging.info(f"loaded EMAs and trailing prices from {self.live_state_cache_filepath}")
+        except Exception as e:
+            logging.error(f"error loading {self.live_state_cache_filepath} {e}")
+
     def get_symbols_with_pos(self, pside=None):
         # returns symbols that have position
         if pside is None:
@@ -1828,13 +1931,9 @@ class Passivbot:
         last_update_tss = []
         for symbol in symbols:
             try:
-                filepath = self.get_ohlcvs_1m_filepath(symbol)
-                if os.path.exists(filepath):
-                    last_update_tss.append((get_file_mod_utc(filepath), symbol))
-                else:
-                    last_update_tss.append((0.0, symbol))
+                last_update_tss.append((self.get_candle_cache(symbol).get_last_write_ts(), symbol))
             except Exception as e:
-                logging.info(f"debug error with get_file_mod_utc for {symbol} {e}")
+                logging.info(f"debug error with get_last_write_ts for {symbol} {e}")
                 last_update_tss.append((0.0, symbol))
         return last_update_tss
 
@@ -1878,15 +1977,66 @@ class Passivbot:
         # maintains REST hourly_cycle and ohlcv_1m
         if hasattr(self, "maintainers"):
             self.stop_data_maintainers()
-        self.maintainers = {
-            k: asyncio.create_task(getattr(self, k)())
-            for k in [
+        if self.market_data_socket:
+            # candles and tickers come from a market data service shared with other bots
+            keys = ["maintain_hourly_cycle", "maintain_market_data", "watch_orders"]
+        else:
+            keys = [
                 "maintain_hourly_cycle",
                 "maintain_ohlcvs_1m_REST",
                 "watch_ohlcvs_1m",
                 "watch_orders",
             ]
+        self.maintainers = {k: asyncio.create_task(getattr(self, k)()) for k in keys}
+
+    async def maintain_market_data(self):
+        if not hasattr(self, "ohlcvs_1m"):
+            self.ohlcvs_1m = {}
+        client_id = f"{self.user}_{uuid4().hex[:8]}"
+        logging.info(f"starting {get_function_name()}")
+        # calls to the service are blocking round trips; they run in the default executor so as
+        # not to hold up order and websocket handling
+        loop = asyncio.get_running_loop()
+        while not self.stop_signal_received:
+            try:
+                if self.market_data is None:
+                    self.market_data = await loop.run_in_executor(
+                        None, connect_market_data, self.market_data_socket
+                    )
+                    logging.info(f"connected to market data service {self.market_data_socket}")
+                symbols = self.get_symbols_approved_or_has_pos()
+                await loop.run_in_executor(
+                    None, self.market_data.subscribe, client_id, symbols, set(self.active_symbols)
+                )
+                await self.update_ohlcvs_1m_from_market_data(symbols)
+                self.n_symbols_missing_ohlcvs_1m = len(
+                    [s for s in symbols if s not in self.ohlcvs_1m or not self.ohlcvs_1m[s]]
+                )
+                await asyncio.sleep(1)
+            except Exception as e:
+                logging.error(f"error with {get_function_name()} {e}")
+                self.market_data = None
+                await asyncio.sleep(5)
+
+    async def update_ohlcvs_1m_from_market_data(self, symbols, chunk_size=20):
+        # gets candles from the latest one held on; the latest one may have changed since.
+        # Candles are fetched in the default executor and applied on the event loop.
+        start_tss = {
+            s: self.ohlcvs_1m[s].last_ts if s in self.ohlcvs_1m and self.ohlcvs_1m[s] else 0
+            for s in sorted(symbols)
         }
+        items = list(start_tss.items())
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(items), chunk_size):
+            fetched = await loop.run_in_executor(
+                None, self.market_data.get_ohlcvs_1m, dict(items[i : i + chunk_size])
+            )
+            for symbol, candles in fetched.items():
+                if symbol not in self.ohlcvs_1m:
+                    self.ohlcvs_1m[symbol] = OHLCVBuffer(self.ohlcvs_1m_buffer_size)
+                self.ohlcvs_1m[symbol].update(candles)
+                self.ohlcvs_1m_update_timestamps[symbol] = utc_ms()
+                self.ohlcvs_1m_update_timestamps_WS[symbol] = utc_ms()
 
     async def watch_ohlcvs_1m(self):
         if not hasattr(self, "ohlcvs_1m"):
@@ -1950,8 +2100,7 @@ class Passivbot:
         n = int(round(self.config["bot"][pside]["filter_rolling_window"]))
         for symbol in eligible_symbols:
             if symbol in self.ohlcvs_1m and self.ohlcvs_1m[symbol]:
-                ohlcvs_1m = [v for v in self.ohlcvs_1m[symbol].values()[-n:]]
-                noisiness[symbol] = np.mean([(x[2] - x[3]) / x[4] for x in ohlcvs_1m])
+                noisiness[symbol] = self.ohlcvs_1m[symbol].mean_noisiness(n)
             else:
                 noisiness[symbol] = 0.0
         return noisiness
@@ -1962,13 +2111,8 @@ class Passivbot:
         if symbols is None:
             symbols = self.get_symbols_approved_or_has_pos(pside)
         for symbol in symbols:
-            if (
-                symbol in self.ohlcvs_1m
-                and self.ohlcvs_1m[symbol]
-                and len(self.ohlcvs_1m[symbol]) > 0
-            ):
-                ohlcvs_1m = [v for v in self.ohlcvs_1m[symbol].values()[-n:]]
-                volumes[symbol] = sum([x[4] * x[5] for x in ohlcvs_1m])
+            if symbol in self.ohlcvs_1m and self.ohlcvs_1m[symbol]:
+                volumes[symbol] = self.ohlcvs_1m[symbol].sum_volume(n)
             else:
                 volumes[symbol] = 0.0
         return volumes
@@ -2057,125 +2201,65 @@ class Passivbot:
                 await self.restart_bot_on_too_many_errors()
 
     async def update_ohlcvs_1m_single_from_exchange(self, symbol):
-        filepath = self.get_ohlcvs_1m_filepath(symbol)
-        if self.lock_exists(filepath):
+        if symbol in self.ohlcvs_1m_updates_in_progress:
             return
         try:
-            self.create_lock_file(filepath)
+            self.ohlcvs_1m_updates_in_progress.add(symbol)
             ms_to_min = 1000 * 60
             if symbol in self.ohlcvs_1m and self.ohlcvs_1m[symbol]:
-                last_ts = self.ohlcvs_1m[symbol].peekitem(-1)[0]
+                last_ts = self.ohlcvs_1m[symbol].last_ts
                 now_minute = self.get_exchange_time() // ms_to_min * ms_to_min
                 limit = min(999, max(3, int(round((now_minute - last_ts) / ms_to_min)) + 5))
                 if limit >= 999:
                     limit = None
             else:
-                self.ohlcvs_1m[symbol] = SortedDict()
+                self.ohlcvs_1m[symbol] = OHLCVBuffer(self.ohlcvs_1m_buffer_size)
                 limit = None
             candles = await self.fetch_ohlcvs_1m(symbol, limit=limit)
-            for x in candles:
-                self.ohlcvs_1m[symbol][int(x[0])] = x
-            self.dump_ohlcvs_1m_to_cache(symbol)
-            self.ohlcvs_1m_update_timestamps[symbol] = or_default(
-                get_file_mod_utc, filepath, default=0.0
-            )
+            if len(candles) > 0:
+                self.ohlcvs_1m[symbol].update(candles)
+                self.dump_ohlcvs_1m_to_cache(symbol, candles)
+            self.ohlcvs_1m_update_timestamps[symbol] = utc_ms()
         finally:
-            self.remove_lock_file(filepath)
+            self.ohlcvs_1m_updates_in_progress.discard(symbol)
 
     async def update_ohlcvs_1m_single_from_disk(self, symbol):
-        filepath = self.get_ohlcvs_1m_filepath(symbol)
-        if not os.path.exists(filepath):
-            return
-        if self.lock_exists(filepath):
-            return
+        # loads only the segments written by other instances since the last read
         try:
-            self.create_lock_file(filepath)
-            if symbol not in self.ohlcvs_1m:
-                self.ohlcvs_1m[symbol] = SortedDict()
-            data = np.load(filepath)
-            for x in data:
-                self.ohlcvs_1m[symbol][int(x[0])] = x
-            self.ohlcvs_1m_update_timestamps[symbol] = or_default(
-                get_file_mod_utc, filepath, default=0.0
-            )
+            cache = self.get_candle_cache(symbol)
+            candles = cache.read()
+            if len(candles) > 0:
+                if symbol not in self.ohlcvs_1m:
+                    self.ohlcvs_1m[symbol] = OHLCVBuffer(self.ohlcvs_1m_buffer_size)
+                self.ohlcvs_1m[symbol].update(candles)
+            self.ohlcvs_1m_update_timestamps[symbol] = cache.get_last_write_ts()
         except Exception as e:
             logging.error(f"error with update_ohlcvs_1m_single_from_disk {symbol} {e}")
             traceback.print_exc()
-            try:
-                os.remove(filepath)
-            except Exception as e0:
-                logging.error(f"failed to remove corrupted ohlcvs_1m file for {symbol} {e0}")
-        finally:
-            self.remove_lock_file(filepath)
 
     async def update_ohlcvs_1m_single(self, symbol, max_age_ms=None):
+        if self.market_data_socket:
+            if self.market_data is not None:
+                try:
+                    await self.update_ohlcvs_1m_from_market_data([symbol])
+                except Exception as e:
+                    logging.error(f"error getting ohlcvs_1m from market data service {e}")
+            return
         if max_age_ms is None:
             max_age_ms = self.ohlcvs_1m_max_age_ms
-        self.lock_timeout_ms = 5000.0
         try:
             if not (symbol in self.active_symbols or symbol in self.eligible_symbols):
                 return
-            filepath = self.get_ohlcvs_1m_filepath(symbol)
-            if self.lock_exists(filepath):
-                # is being updated by other instance
-                if self.get_lock_age_ms(filepath) > self.lock_timeout_ms:
-                    # other instance took too long to finish; assume it crashed
-                    self.remove_lock_file(filepath)
-                    await self.update_ohlcvs_1m_single_from_exchange(symbol)
-            elif os.path.exists(filepath):
-                mod_ts = or_default(get_file_mod_utc, filepath, default=0.0)
-                if utc_ms() - mod_ts > max_age_ms:
-                    await self.update_ohlcvs_1m_single_from_exchange(symbol)
-                else:
-                    if (
-                        symbol not in self.ohlcvs_1m_update_timestamps
-                        or self.ohlcvs_1m_update_timestamps[symbol] != mod_ts
-                    ):
-                        # was updated by other instance
-                        await self.update_ohlcvs_1m_single_from_disk(symbol)
-            else:
+            if utc_ms() - self.get_candle_cache(symbol).get_last_write_ts() > max_age_ms:
                 await self.update_ohlcvs_1m_single_from_exchange(symbol)
+            else:
+                # fresh enough; pick up segments written by other instances
+                await self.update_ohlcvs_1m_single_from_disk(symbol)
         except Exception as e:
             logging.error(f"error with {get_function_name()} {e}")
             traceback.print_exc()
             await self.restart_bot_on_too_many_errors()
 
-    def create_lock_file(self, filepath):
-        try:
-            open(f"{filepath}.lock", "w").close()
-            return True
-        except Exception as e:
-            logging.error(f"error with {get_function_name()} {e}")
-            traceback.print_exc()
-            return False
-
-    def lock_exists(self, filepath):
-        try:
-            return os.path.exists(f"{filepath}.lock")
-        except Exception as e:
-            logging.error(f"error with {get_function_name()} {e}")
-            traceback.print_exc()
-            return False
-
-    def get_lock_age_ms(self, filepath):
-        try:
-            if self.lock_exists(filepath):
-                return utc_ms() - get_file_mod_utc(f"{filepath}.lock")
-        except Exception as e:
-            logging.error(f"error with {get_function_name()} {e}")
-            traceback.print_exc()
-        return utc_ms()
-
-    def remove_lock_file(self, filepath):
-        try:
-            if self.lock_exists(filepath):
-                os.remove(f"{filepath}.lock")
-                return True
-        except Exception as e:
-            logging.error(f"error with {get_function_name()} {e}")
-            traceback.print_exc()
-        return False
-
     async def close(self):
         logging.info(f"Stopped data maintainers: {self.stop_data_maintainers()}")
         await self.cca.close()
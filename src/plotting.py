@@ -11,6 +11,7 @@ from prettytable import PrettyTable
 
 from procedures import dump_live_config, make_get_filepath
 from pure_funcs import denumpyize, ts_to_date
+from pareto import pareto_front_mask
 import passivbot_rust as pbr
 
 
@@ -506,34 +507,9 @@ def plot_pareto_front(df, metrics, minimize=(True, True)):
     x = df[metric1].values
     y = df[metric2].values
 
-    # Function to identify Pareto optimal points
-    def is_pareto_efficient(costs):
-        is_efficient = np.ones(costs.shape[0], dtype=bool)
-        for i, c in enumerate(costs):
-            if is_efficient[i]:
-                # Keep any point with at least one better coordinate than this one
-                if minimize[0] and minimize[1]:
-                    is_efficient[is_efficient] = np.any(costs[is_efficient] < c, axis=1)
-                elif not minimize[0] and minimize[1]:
-                    costs_comp = costs.copy()
-                    costs_comp[:, 0] = -costs_comp[:, 0]
-                    is_efficient[is_efficient] = np.any(
-                        costs_comp[is_efficient] < costs_comp[i], axis=1
-                    )
-                elif minimize[0] and not minimize[1]:
-                    costs_comp = costs.copy()
-                    costs_comp[:, 1] = -costs_comp[:, 1]
-                    is_efficient[is_efficient] = np.any(
-                        costs_comp[is_efficient] < costs_comp[i], axis=1
-                    )
-                else:  # not minimize[0] and not minimize[1]
-                    is_efficient[is_efficient] = np.any(-costs[is_efficient] < -c, axis=1)
-                is_efficient[i] = True
-        return is_efficient
-
     # Find Pareto optimal points
     costs = np.column_stack((x, y))
-    pareto_mask = is_pareto_efficient(costs)
+    pareto_mask = pareto_front_mask(costs * np.where(minimize, 1.0, -1.0))
 
     # Create the plot
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -507,10 +507,12 @@ def get_template_live_config(passivbot_mode="v7"):
             "backtest": {
                 "base_dir": "backtests",
                 "combine_ohlcvs": True,
+                "compact_hlcvs": False,
                 "compress_cache": True,
                 "end_date": "now",
                 "exchanges": ["binance", "bybit", "gateio", "bitget"],
                 "gap_tolerance_ohlcvs_minutes": 120.0,
+                "max_concurrent_ohlcv_fetches": 8,
                 "start_date": "2021-04-01",
                 "starting_balance": 100000.0,
             },
@@ -583,6 +585,7 @@ def get_template_live_config(passivbot_mode="v7"):
                 "forced_mode_short": "",
                 "ignored_coins": [],
                 "leverage": 10.0,
+                "market_data_socket": "",
                 "market_orders_allowed": True,
                 "max_n_cancellations_per_batch": 5,
                 "max_n_creations_per_batch": 3,
@@ -648,8 +651,11 @@ def get_template_live_config(passivbot_mode="v7"):
                     "short_unstuck_loss_allowance_pct": [0.001, 0.05],
                     "short_unstuck_threshold": [0.4, 0.95],
                 },
+                "batch_evaluate": False,
                 "compress_results_file": True,
                 "crossover_probability": 0.7,
+                "early_termination_factor": 0.0,
+                "evaluation_cache_size": 100000,
                 "iters": 30000,
                 "limits": {
                     "lower_bound_drawdown_worst": 0.25,
@@ -664,7 +670,10 @@ def get_template_live_config(passivbot_mode="v7"):
                 "mutation_probability": 0.2,
                 "n_cpus": 5,
                 "population_size": 500,
+                "round_to_n_significant_digits": 5,
                 "scoring": ["adg", "sharpe_ratio"],
+                "screening_fidelities": [],
+                "screening_keep_fraction": 0.33,
             },
         }
     elif passivbot_mode == "multi_hjson":
@@ -1617,6 +1626,34 @@ def get_empty_analysis():
     }
 
 
+def get_empty_trailing_prices():
+    return {
+        "max_since_open": 0.0,
+        "min_since_max": np.inf,
+        "min_since_open": np.inf,
+        "max_since_min": 0.0,
+    }
+
+
+def update_trailing_prices(trailing_prices: dict, ohlcvs: np.ndarray):
+    """
+    updates trailing_prices in place with 1m candles [timestamp, open, high, low, close, volume],
+    oldest first
+    """
+    for x in ohlcvs:
+        if x[2] > trailing_prices["max_since_open"]:
+            trailing_prices["max_since_open"] = x[2]
+            trailing_prices["min_since_max"] = x[4]
+        else:
+            trailing_prices["min_since_max"] = min(trailing_prices["min_since_max"], x[3])
+        if x[3] < trailing_prices["min_since_open"]:
+            trailing_prices["min_since_open"] = x[3]
+            trailing_prices["max_since_min"] = x[4]
+        else:
+            trailing_prices["max_since_min"] = max(trailing_prices["max_since_min"], x[2])
+    return trailing_prices
+
+
 def calc_pprice_from_fills(coin_balance, fills, n_fills_limit=100):
     # assumes fills are sorted old to new
     if coin_balance == 0.0 or len(fills) == 0:
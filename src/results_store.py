@@ -0,0 +1,192 @@
+import os
+import json
+import zlib
+import numbers
+import numpy as np
+from copy import deepcopy
+from pure_funcs import denumpyize
+
+# sections of an optimizer result which vary between candidates; everything else is constant
+COLUMN_SECTIONS = ["bot", "analyses_combined", "analyses"]
+
+
+def is_results_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+
+def flatten_numeric(d, prefix=""):
+    """Returns {dotted key path: value} of the numeric leaves of nested dict d."""
+    flat = {}
+    for key, value in d.items():
+        if isinstance(value, dict):
+            flat.update(flatten_numeric(value, f"{prefix}{key}."))
+        elif isinstance(value, (numbers.Number, np.bool_)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def get_column_type(value):
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    return "int" if isinstance(value, int) else "float"
+
+
+def set_by_path(d, path, value):
+    *parents, key = path.split(".")
+    for parent in parents:
+        d = d[parent]
+    d[key] = value
+
+
+class ResultsWriter:
+    """
+    Appends optimizer results to a columnar store, a directory holding:
+    - meta.json: column names and types, and the parts of the first result which are constant
+      between candidates, i.e. everything but the numeric leaves of COLUMN_SECTIONS.
+    - data.bin: chunks of rows, each stored column after column as float64, zlib-compressed
+      per column if compress.
+    - index.jsonl: offset, number of rows and column sizes of each chunk, appended after the
+      chunk is written, so that chunks of an interrupted write are ignored.
+    Appending to an existing store, e.g. when resuming an optimization, keeps its columns.
+    """
+
+    def __init__(self, path, compress=True, chunk_size=1000):
+        self.path = path
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.columns = None
+        if is_results_store(path):
+            self.columns = json.load(open(os.path.join(path, "meta.json")))["columns"]
+            index_path = os.path.join(path, "index.jsonl")
+            if os.path.exists(index_path) and os.path.getsize(index_path) > 0:
+                with open(index_path, "rb+") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")  # terminate the line of an interrupted write
+
+    def write_meta(self, data):
+        os.makedirs(self.path, exist_ok=True)
+        flat = {
+            key: value
+            for section in COLUMN_SECTIONS
+            for key, value in flatten_numeric(data[section], f"{section}.").items()
+        }
+        self.columns = list(flat)
+        template = deepcopy(data)
+        for key in self.columns:
+            set_by_path(template, key, None)
+        meta = {
+            "version": 1,
+            "columns": self.columns,
+            "column_types": [get_column_type(value) for value in flat.values()],
+            "template": denumpyize(template),
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def append(self, data):
+        if self.columns is None:
+            self.write_meta(data)
+        flat = {
+            key: value
+            for section in COLUMN_SECTIONS
+            for key, value in flatten_numeric(data[section], f"{section}.").items()
+        }
+        self.rows.append([float(flat.get(key, np.nan)) for key in self.columns])
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        chunk = np.array(self.rows, dtype="<f8").T
+        blobs = [np.ascontiguousarray(column).tobytes() for column in chunk]
+        if self.compress:
+            blobs = [zlib.compress(blob, 1) for blob in blobs]
+        with open(os.path.join(self.path, "data.bin"), "ab") as f:
+            offset = f.tell()
+            for blob in blobs:
+                f.write(blob)
+        with open(os.path.join(self.path, "index.jsonl"), "a") as f:
+            entry = {
+                "offset": offset,
+                "n_rows": len(self.rows),
+                "sizes": [len(blob) for blob in blobs],
+                "compressed": self.compress,
+            }
+            f.write(json.dumps(entry) + "\n")
+        self.rows = []
+
+
+class ResultsStore:
+    """Reads a store written by ResultsWriter, loading only the columns or rows asked for."""
+
+    def __init__(self, path):
+        self.path = path
+        meta = json.load(open(os.path.join(path, "meta.json")))
+        self.columns = meta["columns"]
+        self.column_types = meta["column_types"]
+        self.template = meta["template"]
+        self.chunks = []
+        index_path = os.path.join(path, "index.jsonl")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    try:
+                        self.chunks.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # line of an interrupted write
+        self.chunk_starts = np.cumsum([0] + [chunk["n_rows"] for chunk in self.chunks])
+
+    def __len__(self):
+        return int(self.chunk_starts[-1])
+
+    def read_chunk_columns(self, f, chunk, column_idxs):
+        column_offsets = chunk["offset"] + np.cumsum([0] + chunk["sizes"])
+        columns = []
+        for i in column_idxs:
+            f.seek(column_offsets[i])
+            blob = f.read(chunk["sizes"][i])
+            if chunk["compressed"]:
+                blob = zlib.decompress(blob)
+            columns.append(np.frombuffer(blob, dtype="<f8"))
+        return columns
+
+    def read_columns(self, names):
+        """Returns {name: np.ndarray} of the given columns over all rows."""
+        column_idxs = [self.columns.index(name) for name in names]
+        parts = [[] for _ in names]
+        with open(os.path.join(self.path, "data.bin"), "rb") as f:
+            for chunk in self.chunks:
+                for part, column in zip(parts, self.read_chunk_columns(f, chunk, column_idxs)):
+                    part.append(column)
+        return {
+            name: np.concatenate(part) if part else np.empty(0) for name, part in zip(names, parts)
+        }
+
+    def read_entries(self, indices):
+        """Returns the full results at the given row indices, in the same order."""
+        chunk_rows = {}
+        entries = []
+        all_column_idxs = list(range(len(self.columns)))
+        with open(os.path.join(self.path, "data.bin"), "rb") as f:
+            for index in indices:
+                chunk_idx = int(np.searchsorted(self.chunk_starts, index, side="right")) - 1
+                if chunk_idx not in chunk_rows:
+                    chunk_rows[chunk_idx] = self.read_chunk_columns(
+                        f, self.chunks[chunk_idx], all_column_idxs
+                    )
+                row = index - self.chunk_starts[chunk_idx]
+                entry = deepcopy(self.template)
+                for key, type_, column in zip(
+                    self.columns, self.column_types, chunk_rows[chunk_idx]
+                ):
+                    value = float(column[row])
+                    if type_ == "bool":
+                        value = bool(value)
+                    elif type_ == "int" and np.isfinite(value):
+                        value = int(value)
+                    set_by_path(entry, key, value)
+                entries.append(entry)
+        return entries
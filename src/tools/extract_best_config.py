@@ -5,6 +5,7 @@ import argparse
 import traceback
 from copy import deepcopy
 
+import numpy as np
 import pandas as pd
 import dictdiffer
 from tqdm import tqdm
@@ -18,6 +19,8 @@ from pure_funcs import (
     flatten_dict,
 )
 from procedures import make_get_filepath, dump_config, format_config
+from results_store import ResultsStore, is_results_store
+from pareto import crowding_distances, pareto_front_mask
 
 
 def data_generator(all_results_filename: str, verbose: bool = False):
@@ -69,74 +72,6 @@ def data_generator(all_results_filename: str, verbose: bool = False):
                 pbar.close()
 
 
-def calc_dist(p0: tuple, p1: tuple) -> float:
-    """
-    Calculate the Euclidean distance between two 2D points.
-
-    :param p0: The first point (x0, y0).
-    :param p1: The second point (x1, y1).
-    :return: The Euclidean distance between p0 and p1.
-    """
-    return ((p0[0] - p1[0]) ** 2 + (p0[1] - p1[1]) ** 2) ** 0.5
-
-
-def dominates_d(x: tuple, y: tuple, higher_is_better: list) -> bool:
-    """
-    Determine if x dominates y in a Pareto sense, given a list indicating
-    whether higher or lower is better for each objective.
-
-    :param x: Tuple of objective values (e.g. (w0, w1)) for candidate x.
-    :param y: Tuple of objective values (e.g. (w0, w1)) for candidate y.
-    :param higher_is_better: List of booleans. If True at index i, a higher value
-                             of x[i] is better. If False, a lower value is better.
-    :return: True if x strictly dominates y in at least one objective and is not
-             worse in any objective.
-    """
-    better_in_one = False
-    for xi, yi, hib in zip(x, y, higher_is_better):
-        if hib:
-            if xi > yi:
-                better_in_one = True
-            elif xi < yi:
-                return False
-        else:
-            if xi < yi:
-                better_in_one = True
-            elif xi > yi:
-                return False
-    return better_in_one
-
-
-def update_pareto_front(
-    new_index: int, new_obj: tuple, current_front: list, objectives_dict: dict, higher_is_better: list
-) -> list:
-    """
-    Given a new candidate with certain objective values, update the current Pareto
-    front indices accordingly.
-
-    :param new_index: Index of the new candidate.
-    :param new_obj: Tuple of objective values for the new candidate.
-    :param current_front: List of indices representing the current Pareto front.
-    :param objectives_dict: Dictionary mapping index -> (objective tuple).
-    :param higher_is_better: List of booleans indicating if higher is better.
-    :return: The updated Pareto front list of indices.
-    """
-    # If the new candidate is dominated by any on the front, return as is
-    for idx in current_front:
-        existing_obj = objectives_dict[idx]
-        if dominates_d(existing_obj, new_obj, higher_is_better):
-            return current_front
-
-    # Otherwise, remove those that are dominated by the new candidate
-    new_front = []
-    for idx in current_front:
-        existing_obj = objectives_dict[idx]
-        if not dominates_d(new_obj, existing_obj, higher_is_better):
-            new_front.append(idx)
-    new_front.append(new_index)
-    return new_front
-
-
 def gprint(verbose: bool):
     """
     Provide a 'conditional' print function based on verbosity.
@@ -147,40 +82,18 @@ def gprint(verbose: bool):
     return print if verbose else (lambda *args, **kwargs: None)
 
 
-def process_single(file_location: str, verbose: bool = False):
+def iter_entries_jsonl(file_location: str, verbose: bool = False):
     """
-    Process a single file of results. Collect and track Pareto-optimal objectives,
-    then select the 'best' entry by minimizing Euclidean distance to (0,0) in
-    normalized objective space.
+    Iterate over the entries of a JSON lines results file, as written by optimizers
+    before the columnar results store, which have both objectives.
 
     :param file_location: Path to a single results file.
-    :param verbose: Whether to print additional info for debugging.
-    :return: The best candidate dictionary (or None if no candidates found).
+    :param verbose: Whether to show progress.
+    :yield: Tuples (entry, analysis key, (w0, w1)).
     """
-    print_ = gprint(verbose)
     analysis_prefix = None
     analysis_key = None
 
-    # Dictionaries keyed by incremental index: index -> (w0, w1)
-    all_objectives = {}
-    filtered_objectives = {}
-
-    # Indices of the current Pareto front
-    all_pareto = []
-    filtered_pareto = []
-
-    # Map from index -> full entry for retrieval
-    index_to_entry = {}
-    index = 0
-
-    # Track min/max across w0, w1 for normalization
-    all_min_w0 = all_max_w0 = None
-    all_min_w1 = all_max_w1 = None
-    filtered_min_w0 = filtered_max_w0 = None
-    filtered_min_w1 = filtered_max_w1 = None
-
-    higher_is_better = [False, False]  # We want to minimize w0, w1
-
     # Read the file line-by-line (with incremental diffs if present)
     for x in data_generator(file_location, verbose=verbose):
         if not x:
@@ -212,95 +125,102 @@ def process_single(file_location: str, verbose: bool = False):
             w1 = float(flat_x[w1_key])
         except:
             continue
+        yield x, analysis_key, (w0, w1)
 
-        # Update overall min/max
-        if all_min_w0 is None or w0 < all_min_w0:
-            all_min_w0 = w0
-        if all_max_w0 is None or w0 > all_max_w0:
-            all_max_w0 = w0
-        if all_min_w1 is None or w1 < all_min_w1:
-            all_min_w1 = w1
-        if all_max_w1 is None or w1 > all_max_w1:
-            all_max_w1 = w1
-
-        # Determine if it meets the "filtered" condition (both <= 0)
-        is_filtered = w0 <= 0.0 and w1 <= 0.0
-        if is_filtered:
-            # Update filtered min/max
-            if filtered_min_w0 is None or w0 < filtered_min_w0:
-                filtered_min_w0 = w0
-            if filtered_max_w0 is None or w0 > filtered_max_w0:
-                filtered_max_w0 = w0
-            if filtered_min_w1 is None or w1 < filtered_min_w1:
-                filtered_min_w1 = w1
-            if filtered_max_w1 is None or w1 > filtered_max_w1:
-                filtered_max_w1 = w1
-
-        # Update all_objectives and Pareto front
-        all_objectives[index] = (w0, w1)
-        old_all_pareto = all_pareto.copy()
-        all_pareto = update_pareto_front(
-            index, (w0, w1), all_pareto, all_objectives, higher_is_better
-        )
-        # If it's newly added to the Pareto front, store a deep copy
-        if index not in old_all_pareto and index in all_pareto:
-            index_to_entry[index] = deepcopy(x)
-
-        # Update filtered_objectives and filtered Pareto front
-        if is_filtered:
-            filtered_objectives[index] = (w0, w1)
-            old_filtered_pareto = filtered_pareto.copy()
-            filtered_pareto = update_pareto_front(
-                index, (w0, w1), filtered_pareto, filtered_objectives, higher_is_better
-            )
-            if index not in old_filtered_pareto and index in filtered_pareto:
-                index_to_entry[index] = deepcopy(x)
-
-        index += 1
 
-    print_("Processing...")
+def load_objectives_jsonl(file_location: str, verbose: bool = False):
+    """
+    Read the objectives of all entries of a JSON lines results file. Entries are
+    read again, in a second pass, only for the indices asked for.
+
+    :param file_location: Path to a single results file.
+    :param verbose: Whether to show progress.
+    :return: Tuple (objectives array of shape (n, 2), analysis key,
+             function loading the entries at given indices).
+    """
+    analysis_key = "analyses_combined"
+    objectives = []
+    for _, analysis_key, objs in iter_entries_jsonl(file_location, verbose=verbose):
+        objectives.append(objs)
 
-    # Decide which Pareto front to pick from
-    if len(filtered_pareto) > 0:
-        candidates_indices = filtered_pareto
-        min_w0, max_w0 = filtered_min_w0, filtered_max_w0
-        min_w1, max_w1 = filtered_min_w1, filtered_max_w1
-        candidates_objectives = filtered_objectives
+    def load_entries(indices):
+        wanted = set(indices)
+        entries = {}
+        for i, (x, _, _) in enumerate(iter_entries_jsonl(file_location)):
+            if i in wanted:
+                entries[i] = x
+        return [entries[i] for i in indices]
+
+    return np.array(objectives, dtype=float).reshape(-1, 2), analysis_key, load_entries
+
+
+def load_objectives_store(file_location: str):
+    """
+    Read the objective columns of a columnar results store.
+
+    :param file_location: Path to a results store directory.
+    :return: Tuple (objectives array of shape (n, 2), analysis key,
+             function loading the entries at given indices).
+    """
+    store = ResultsStore(file_location)
+    columns = store.read_columns(["analyses_combined.w_0", "analyses_combined.w_1"])
+    objectives = np.stack(
+        [columns["analyses_combined.w_0"], columns["analyses_combined.w_1"]], axis=1
+    )
+    return objectives, "analyses_combined", store.read_entries
+
+
+def select_pareto_indices(objectives: np.ndarray) -> np.ndarray:
+    """
+    Find the Pareto front of the candidates with both objectives <= 0, or of all
+    candidates if there are none, sorted by Euclidean distance to (0, 0) in
+    objective space normalized over the same candidates.
+
+    :param objectives: Array of shape (n, 2) of objectives to minimize.
+    :return: Indices of the Pareto front, best first.
+    """
+    indices = np.flatnonzero(~np.isnan(objectives).any(axis=1))
+    filtered = indices[(objectives[indices] <= 0.0).all(axis=1)]
+    if len(filtered) > 0:
+        indices = filtered
+    if len(indices) == 0:
+        return indices
+    candidates = objectives[indices]
+    front = np.flatnonzero(pareto_front_mask(candidates))
+    mins = candidates.min(axis=0)
+    ranges = candidates.max(axis=0) - mins
+    ranges[ranges == 0.0] = 1.0
+    distances = (((candidates[front] - mins) / ranges) ** 2).sum(axis=1) ** 0.5
+    return indices[front[np.argsort(distances, kind="stable")]]
+
+
+def process_single(file_location: str, verbose: bool = False):
+    """
+    Process a single file of results. Find the Pareto-optimal objectives, then
+    select the 'best' entry by minimizing Euclidean distance to (0,0) in
+    normalized objective space.
+
+    :param file_location: Path to a single results file or results store.
+    :param verbose: Whether to print additional info for debugging.
+    :return: The best candidate dictionary (or None if no candidates found).
+    """
+    print_ = gprint(verbose)
+    if is_results_store(file_location):
+        objectives, analysis_key, load_entries = load_objectives_store(file_location)
     else:
-        candidates_indices = all_pareto
-        min_w0, max_w0 = all_min_w0, all_max_w0
-        min_w1, max_w1 = all_min_w1, all_max_w1
-        candidates_objectives = all_objectives
+        objectives, analysis_key, load_entries = load_objectives_jsonl(file_location, verbose)
 
-    if not candidates_indices:
+    print_("Processing...")
+    pareto_indices = select_pareto_indices(objectives)
+    if len(pareto_indices) == 0:
         print_("No candidates found.")
         return None
 
-    # Normalize distances and find the point closest to (0, 0)
-    range_w0 = max_w0 - min_w0 if max_w0 != min_w0 else 1.0
-    range_w1 = max_w1 - min_w1 if max_w1 != min_w1 else 1.0
-
-    distances = []
-    for idx in candidates_indices:
-        w0, w1 = candidates_objectives[idx]
-        norm_w0 = (w0 - min_w0) / range_w0
-        norm_w1 = (w1 - min_w1) / range_w1
-        dist = calc_dist((norm_w0, norm_w1), (0.0, 0.0))
-        distances.append((idx, dist))
-
-    # Sort by distance ascending
-    distances.sort(key=lambda x: x[1])
-    best_idx = distances[0][0]
-
-    # Retrieve the best entry from index_to_entry
-    best_entry = index_to_entry.get(best_idx)
-    if best_entry is None:
-        print_("Best entry not found.")
-        return None
-
-    # Build a list of Pareto entries sorted by distance
-    pareto_entries = [index_to_entry.get(idx[0]) for idx in distances]
-    pareto_entries = [e for e in pareto_entries if e is not None]
+    # Pareto entries sorted by distance, with their crowding distances within the front
+    pareto_entries = load_entries(pareto_indices)
+    crowding = crowding_distances(objectives[pareto_indices])
+    best_entry = pareto_entries[0]
+    index = len(objectives)
 
     # Create a DataFrame to show relevant 'analyses_combined' columns
     pdf = pd.DataFrame([x["analyses_combined"] for x in pareto_entries])
@@ -309,6 +229,7 @@ def process_single(file_location: str, verbose: bool = False):
     pdf.columns = [
         x[:-5].replace("equity_balance", "eqbal").replace("position", "pos") for x in selected_columns
     ]
+    pdf["crowding"] = crowding
 
     n_cols = 10
     print_("n pareto members", len(pdf))
@@ -339,7 +260,10 @@ def process_single(file_location: str, verbose: bool = False):
     print_(file_location)
 
     # Determine output paths
-    full_path = file_location.replace("_all_results.txt", "") + ".json"
+    full_path = (
+        file_location.rstrip("/").replace("_all_results.txt", "").replace("_all_results", "")
+        + ".json"
+    )
     base_path = os.path.split(full_path)[0]
     full_path = make_get_filepath(full_path.replace(base_path, base_path + "_analysis/"))
 
@@ -351,7 +275,8 @@ def process_single(file_location: str, verbose: bool = False):
 
     # Write all Pareto entries to a file
     with open(full_path.replace(".json", "_pareto.txt"), "w") as f:
-        for x in pareto_entries:
+        for x, crowding_distance in zip(pareto_entries, crowding):
+            x["crowding_distance"] = float(crowding_distance)
             f.write(json.dumps(x) + "\n")
 
     # Dump the best config to disk
@@ -368,7 +293,7 @@ def main(args):
         - file_location: Path to file or directory.
         - verbose: Boolean indicating verbosity.
     """
-    if os.path.isdir(args.file_location):
+    if os.path.isdir(args.file_location) and not is_results_store(args.file_location):
         # Process every file in the directory in reverse-sorted order
         for fname in sorted(os.listdir(args.file_location), reverse=True):
             fpath = os.path.join(args.file_location, fname)